@@ -0,0 +1,27 @@
+"""
+gunicorn settings, loaded from the project root (see Procfile).
+
+Workers record Prometheus metrics to files in PROMETHEUS_MULTIPROC_DIR so
+/metrics can report for all of them (see src/metrics.py). The variable is
+set here, in the master, so every worker inherits it before importing the
+app.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'devlegal-metrics'))
+
+def on_starting(server):
+    # Files left by a previous run would be added to this run's counters
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (pool connections in use etc.)
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
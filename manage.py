@@ -1,3 +1,4 @@
+import click
 from flask.cli import FlaskGroup
 from src import create_app
 from src.models import db
@@ -38,5 +39,80 @@ def init_db():
     db.create_all()
     print("Database tables created")
 
+@cli.command("render-posts")
+def render_posts():
+    """Store rendered HTML for markdown posts that have none or an outdated one"""
+    from src.models.blog import render_stale_posts
+    print(f"Rendered {render_stale_posts()} posts")
+
+@cli.command("dedupe-news-links")
+def dedupe_news_links():
+    """Collapse news links with the same normalized URL"""
+    from src.models.news_link import collapse_duplicate_links
+    
+    # The url_hash column and its unique index come from `flask db upgrade`
+    # (revision 9a6d3b1c7e58), which also collapses the duplicates it finds
+    removed = collapse_duplicate_links()
+    print(f"Removed {removed} duplicate news links")
+
+@cli.command("reconcile-documents")
+def reconcile_documents_command():
+    """Rebuild the document catalog from the files actually stored"""
+    from src.documents import reconcile_documents
+    added, updated, removed = reconcile_documents()
+    print(f"Documents catalog: {added} added, {updated} updated, {removed} removed")
+
+@cli.command("check-indexes")
+@click.option('--database-url', default=None,
+              help='Scratch database to use instead of a temporary SQLite file')
+def check_indexes(database_url):
+    """EXPLAIN the hot routes' queries and fail if an expected index is unused"""
+    from src.query_plans import check_index_usage
+    failures = check_index_usage(database_url=database_url)
+    if failures:
+        raise SystemExit(1)
+
+@cli.command("check-query-counts")
+@click.option('--database-url', default=None,
+              help='Scratch database to use instead of a temporary SQLite file')
+def check_query_counts(database_url):
+    """Request the hot routes and fail if one runs more queries than its budget"""
+    from src.query_stats import check_query_budgets
+    failures = check_query_budgets(database_url=database_url)
+    if failures:
+        raise SystemExit(1)
+
+@cli.command("reindex-search")
+def reindex_search():
+    """Create the full-text search index if it is missing and rebuild it from the posts table"""
+    from src.search import get_search_backend
+    backend = get_search_backend()
+    with db.engine.begin() as connection:
+        backend.ensure_schema(connection)
+        backend.rebuild(connection)
+    print(f"Search index rebuilt ({backend.name})")
+
+@cli.command("bench-search")
+@click.option('--size', 'sizes', multiple=True, type=int, default=[10000, 100000],
+              help='Number of posts to generate (repeatable)')
+@click.option('--query', 'queries', multiple=True,
+              default=['copyright', 'open source license', 'privacy breach lawsuit', 'w123'],
+              help='Search phrase to time (repeatable)')
+@click.option('--database-url', default=None,
+              help='Scratch database to use instead of a temporary SQLite file')
+def bench_search(sizes, queries, database_url):
+    """Benchmark the ilike scan against the full-text search backends"""
+    from src.benchmarks import bench_search as run
+    run(sizes, queries, database_url=database_url)
+
+@cli.command("bench-extract")
+@click.option('--links', 'sizes', multiple=True, type=int, default=[100, 1000, 10000, 50000],
+              help='Number of links in the synthetic response (repeatable)')
+@click.option('--repeat', default=5, type=int, help='Timed runs per size')
+def bench_extract(sizes, repeat):
+    """Benchmark URL/date extraction on large synthetic LLM responses"""
+    from src.benchmarks import bench_extract as run
+    run(sizes, repeat=repeat)
+
 if __name__ == '__main__':
     cli()
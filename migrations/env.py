@@ -1,59 +1,113 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from src import create_app
-from src.models import db
-from src.models.user import User
-from werkzeug.security import generate_password_hash
-import os
-
-# Create a minimal Flask app for migrations
-app = create_app()
-
-# Initialize migrations directory
-@app.cli.command("init")
-def init():
-    """Initialize migrations directory"""
-    from flask_migrate import init as migrate_init
-    migrate_init()
-    print("Migrations directory initialized")
-
-# Create a migration
-@app.cli.command("migrate")
-def migrate():
-    """Create a migration"""
-    from flask_migrate import migrate as migrate_migrate
-    migrate_migrate(message="Initial migration")
-    print("Migration created")
-
-# Apply migrations
-@app.cli.command("upgrade")
-def upgrade():
-    """Apply migrations"""
-    from flask_migrate import upgrade as migrate_upgrade
-    migrate_upgrade()
-    print("Migrations applied")
-
-# Create admin user
-@app.cli.command("create-admin")
-def create_admin():
-    """Create admin user"""
-    username = os.environ.get('ADMIN_USERNAME', 'admin')
-    password = os.environ.get('ADMIN_PASSWORD', 'devlegal2025')
-    
-    with app.app_context():
-        # Check if user already exists
-        user = User.query.filter_by(username=username).first()
-        if user:
-            print(f"Admin user '{username}' already exists")
-            return
-        
-        # Create new admin user
-        user = User(
-            username=username,
-            password_hash=generate_password_hash(password),
-            is_admin=True
+import logging
+from logging.config import fileConfig
+
+from flask import current_app
+
+from alembic import context
+
+# this is the Alembic Config object, which provides
+# access to the values within the .ini file in use.
+config = context.config
+
+# Interpret the config file for Python logging.
+# This line sets up loggers basically.
+fileConfig(config.config_file_name)
+logger = logging.getLogger('alembic.env')
+
+
+def get_engine():
+    try:
+        # this works with Flask-SQLAlchemy<3 and Alchemical
+        return current_app.extensions['migrate'].db.get_engine()
+    except (TypeError, AttributeError):
+        # this works with Flask-SQLAlchemy>=3
+        return current_app.extensions['migrate'].db.engine
+
+
+def get_engine_url():
+    try:
+        return get_engine().url.render_as_string(hide_password=False).replace(
+            '%', '%%')
+    except AttributeError:
+        return str(get_engine().url).replace('%', '%%')
+
+
+# add your model's MetaData object here
+# for 'autogenerate' support
+# from myapp import mymodel
+# target_metadata = mymodel.Base.metadata
+config.set_main_option('sqlalchemy.url', get_engine_url())
+target_db = current_app.extensions['migrate'].db
+
+# other values from the config, defined by the needs of env.py,
+# can be acquired:
+# my_important_option = config.get_main_option("my_important_option")
+# ... etc.
+
+
+def get_metadata():
+    if hasattr(target_db, 'metadatas'):
+        return target_db.metadatas[None]
+    return target_db.metadata
+
+
+def run_migrations_offline():
+    """Run migrations in 'offline' mode.
+
+    This configures the context with just a URL
+    and not an Engine, though an Engine is acceptable
+    here as well.  By skipping the Engine creation
+    we don't even need a DBAPI to be available.
+
+    Calls to context.execute() here emit the given string to the
+    script output.
+
+    """
+    url = config.get_main_option("sqlalchemy.url")
+    context.configure(
+        url=url, target_metadata=get_metadata(), literal_binds=True
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Run migrations in 'online' mode.
+
+    In this scenario we need to create an Engine
+    and associate a connection with the context.
+
+    """
+
+    # this callback is used to prevent an auto-migration from being generated
+    # when there are no changes to the schema
+    # reference: http://alembic.zzzcomputing.com/en/latest/cookbook.html
+    def process_revision_directives(context, revision, directives):
+        if getattr(config.cmd_opts, 'autogenerate', False):
+            script = directives[0]
+            if script.upgrade_ops.is_empty():
+                directives[:] = []
+                logger.info('No changes in schema detected.')
+
+    conf_args = current_app.extensions['migrate'].configure_args
+    if conf_args.get("process_revision_directives") is None:
+        conf_args["process_revision_directives"] = process_revision_directives
+
+    connectable = get_engine()
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=get_metadata(),
+            **conf_args
         )
-        
-        db.session.add(user)
-        db.session.commit()
-        
-        print(f"Admin user '{username}' created successfully")
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,70 @@
+"""Add indexes for hot queries and a primary key on post_tags
+
+Revision ID: 3f2c9a1d4b7e
+Revises:
+Create Date: 2026-10-18 12:30:00.000000
+
+First revision: expects the schema the original application created.
+Databases made with `python manage.py init-db` already have the full
+schema; mark them current with `flask db stamp head` instead.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2c9a1d4b7e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (table, index name, columns)
+INDEXES = [
+    ('posts', 'ix_posts_published_created_at', ['published', 'created_at', 'id']),
+    ('posts', 'ix_posts_category_published_created_at', ['category_id', 'published', 'created_at', 'id']),
+    ('comments', 'ix_comments_post_id_approved', ['post_id', 'approved']),
+    ('comments', 'ix_comments_approved_created_at', ['approved', 'created_at']),
+    ('news_links', 'ix_news_links_date_fetched_id', ['date_fetched', 'id']),
+    ('post_tags', 'ix_post_tags_tag_id', ['tag_id']),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # post_tags had no key at all: drop incomplete rows and repeated pairs,
+    # then make the pair the primary key
+    post_tags = sa.table('post_tags', sa.column('post_id'), sa.column('tag_id'))
+    bind.execute(post_tags.delete().where(
+        sa.or_(post_tags.c.post_id.is_(None), post_tags.c.tag_id.is_(None))
+    ))
+    duplicates = bind.execute(
+        sa.select(post_tags.c.post_id, post_tags.c.tag_id)
+        .group_by(post_tags.c.post_id, post_tags.c.tag_id)
+        .having(sa.func.count() > 1)
+    ).all()
+    for post_id, tag_id in duplicates:
+        bind.execute(post_tags.delete().where(
+            sa.and_(post_tags.c.post_id == post_id, post_tags.c.tag_id == tag_id)
+        ))
+        bind.execute(post_tags.insert().values(post_id=post_id, tag_id=tag_id))
+
+    # Batch mode rebuilds the table on SQLite, which can't add a primary key in place
+    with op.batch_alter_table('post_tags') as batch_op:
+        batch_op.alter_column('post_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('tag_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_primary_key('pk_post_tags', ['post_id', 'tag_id'])
+
+    for table, name, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+
+    with op.batch_alter_table('post_tags') as batch_op:
+        batch_op.drop_constraint('pk_post_tags', type_='primary')
+        batch_op.alter_column('post_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('tag_id', existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,42 @@
+"""Add the article_jobs table
+
+Revision ID: 5c1e8f2a9d47
+Revises: e2b94c7a1f30
+Create Date: 2026-10-19 10:00:00.000000
+
+Background article generation requests and their status. Skipped when
+`python manage.py init-db` already created the table.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e8f2a9d47'
+down_revision = 'e2b94c7a1f30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'article_jobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'article_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('link_id', sa.Integer(), sa.ForeignKey('news_links.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('focus_of_article', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('post_id', sa.Integer(), sa.ForeignKey('posts.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_table('article_jobs')
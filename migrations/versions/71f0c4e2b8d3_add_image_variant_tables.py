@@ -0,0 +1,52 @@
+"""Add the uploaded_images and image_variants tables
+
+Revision ID: 71f0c4e2b8d3
+Revises: 9a6d3b1c7e58
+Create Date: 2026-10-19 12:00:00.000000
+
+Uploaded images and the resized/WebP variants generated for them in the
+background.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '71f0c4e2b8d3'
+down_revision = '9a6d3b1c7e58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'uploaded_images',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('path', sa.String(length=255), nullable=False, unique=True),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True)
+    )
+
+    op.create_table(
+        'image_variants',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('image_id', sa.Integer(), sa.ForeignKey('uploaded_images.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('path', sa.String(length=255), nullable=False),
+        sa.Column('format', sa.String(length=10), nullable=False),
+        sa.Column('width', sa.Integer(), nullable=False),
+        sa.Column('height', sa.Integer(), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=True)
+    )
+    op.create_index('ix_image_variants_image_id', 'image_variants', ['image_id'])
+
+
+def downgrade():
+    op.drop_index('ix_image_variants_image_id', table_name='image_variants')
+    op.drop_table('image_variants')
+    op.drop_table('uploaded_images')
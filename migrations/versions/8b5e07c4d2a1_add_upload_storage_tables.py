@@ -0,0 +1,51 @@
+"""Add tables for content-addressed uploads
+
+Revision ID: 8b5e07c4d2a1
+Revises: 3f2c9a1d4b7e
+Create Date: 2026-10-18 16:10:00.000000
+
+upload_blobs/upload_references map upload names to files stored by
+SHA-256. Tables that `python manage.py init-db` already created are skipped.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e07c4d2a1'
+down_revision = '3f2c9a1d4b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'upload_blobs' not in existing:
+        op.create_table(
+            'upload_blobs',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('sha256', sa.String(length=64), nullable=False, unique=True),
+            sa.Column('path', sa.String(length=255), nullable=False),
+            sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True)
+        )
+
+    if 'upload_references' not in existing:
+        op.create_table(
+            'upload_references',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(length=255), nullable=False, unique=True),
+            sa.Column('blob_id', sa.Integer(), sa.ForeignKey('upload_blobs.id'), nullable=False),
+            sa.Column('kind', sa.String(length=20), nullable=False),
+            sa.Column('original_filename', sa.String(length=255), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True)
+        )
+        op.create_index('ix_upload_references_blob_id', 'upload_references', ['blob_id'])
+
+
+def downgrade():
+    op.drop_index('ix_upload_references_blob_id', table_name='upload_references')
+    op.drop_table('upload_references')
+    op.drop_table('upload_blobs')
@@ -0,0 +1,116 @@
+"""Add news_links.url_hash and make it unique
+
+Revision ID: 9a6d3b1c7e58
+Revises: 5c1e8f2a9d47
+Create Date: 2026-10-19 10:30:00.000000
+
+Adds the column, fills it with the hash of each link's normalized URL,
+merges links that share a hash into the oldest one (as
+`python manage.py dedupe-news-links` does), then adds the unique index
+that upsert_news_links' ON CONFLICT / ON DUPLICATE KEY relies on.
+
+"""
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a6d3b1c7e58'
+down_revision = '5c1e8f2a9d47'
+branch_labels = None
+depends_on = None
+
+news_links = sa.table(
+    'news_links',
+    sa.column('id', sa.Integer()),
+    sa.column('url', sa.Text()),
+    sa.column('url_hash', sa.String(64)),
+    sa.column('date_of_article', sa.Date()),
+    sa.column('article_written', sa.Boolean()),
+    sa.column('focus_of_article', sa.Text())
+)
+article_jobs = sa.table('article_jobs', sa.column('link_id', sa.Integer()))
+
+# A frozen copy of src.utils.normalize_url/url_hash as of this revision, so
+# later changes there don't change what this revision backfills and merges
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'ref', 'ref_src', 'ref_url', 'cmpid', 'smid', 'sr_share', 'ocid'
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    url = (url or '').strip()
+    if '://' not in url:
+        url = f"https://{url}"
+    parts = urlsplit(url)
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if ':' in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+
+    path = parts.path.rstrip('/') or '/'
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+
+    return urlunsplit((scheme, netloc, path, urlencode(query), ''))
+
+
+def url_hash(url):
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if 'url_hash' not in {column['name'] for column in inspector.get_columns('news_links')}:
+        with op.batch_alter_table('news_links') as batch_op:
+            batch_op.add_column(sa.Column('url_hash', sa.String(length=64), nullable=True))
+
+    groups = {}
+    for row in bind.execute(sa.select(news_links).order_by(news_links.c.id)).mappings():
+        groups.setdefault(url_hash(row['url']), []).append(row)
+
+    for digest, rows in groups.items():
+        keeper, duplicates = rows[0], rows[1:]
+        values = {'url_hash': digest}
+        if duplicates:
+            # The kept link inherits what its duplicates knew
+            values.update(
+                article_written=any(bool(row['article_written']) for row in rows),
+                focus_of_article=next((row['focus_of_article'] for row in rows if row['focus_of_article']), None),
+                date_of_article=next((row['date_of_article'] for row in rows if row['date_of_article']), None)
+            )
+            duplicate_ids = [row['id'] for row in duplicates]
+            bind.execute(article_jobs.update()
+                         .where(article_jobs.c.link_id.in_(duplicate_ids))
+                         .values(link_id=keeper['id']))
+            bind.execute(news_links.delete().where(news_links.c.id.in_(duplicate_ids)))
+        if keeper['url_hash'] != digest or duplicates:
+            bind.execute(news_links.update().where(news_links.c.id == keeper['id']).values(**values))
+
+    existing = {index['name'] for index in inspector.get_indexes('news_links')}
+    existing |= {constraint['name'] for constraint in inspector.get_unique_constraints('news_links')}
+    if 'uq_news_links_url_hash' not in existing:
+        op.create_index('uq_news_links_url_hash', 'news_links', ['url_hash'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_news_links_url_hash', table_name='news_links')
+    with op.batch_alter_table('news_links') as batch_op:
+        batch_op.drop_column('url_hash')
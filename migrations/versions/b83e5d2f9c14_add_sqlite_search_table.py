@@ -0,0 +1,58 @@
+"""Add the SQLite full-text search table
+
+Revision ID: b83e5d2f9c14
+Revises: 71f0c4e2b8d3
+Create Date: 2026-10-19 13:00:00.000000
+
+The FTS5 table behind the sqlite_fts search backend, filled from the
+existing posts. Other databases, and SQLite builds without FTS5, don't
+use it and are left alone.
+
+"""
+import html
+import re
+import sqlite3
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b83e5d2f9c14'
+down_revision = '71f0c4e2b8d3'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of src.search.plain_text as of this revision
+TAG_RE = re.compile(r'<[^>]+>')
+
+
+def plain_text(content):
+    return html.unescape(TAG_RE.sub(' ', content or ''))
+
+
+def fts5_available():
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE fts_probe USING fts5(x)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'sqlite' or not fts5_available():
+        return
+    connection = op.get_bind()
+    op.execute("CREATE VIRTUAL TABLE posts_fts USING fts5(title, body, tokenize = 'porter unicode61')")
+    rows = connection.execute(sa.text("SELECT id, title, content FROM posts")).fetchall()
+    if rows:
+        connection.execute(
+            sa.text("INSERT INTO posts_fts (rowid, title, body) VALUES (:id, :title, :body)"),
+            [{'id': row[0], 'title': row[1], 'body': plain_text(row[2])} for row in rows]
+        )
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TABLE IF EXISTS posts_fts")
@@ -0,0 +1,42 @@
+"""Add the documents catalog table
+
+Revision ID: c41f6a2e9d83
+Revises: 8b5e07c4d2a1
+Create Date: 2026-10-18 17:20:00.000000
+
+Fill it with `python manage.py reconcile-documents`; the document manager
+also builds it on first visit while it is empty.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f6a2e9d83'
+down_revision = '8b5e07c4d2a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'documents' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'documents',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('filename', sa.String(length=255), nullable=False, unique=True),
+        sa.Column('original_name', sa.String(length=255), nullable=False),
+        sa.Column('extension', sa.String(length=20), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('modified_at', sa.DateTime(), nullable=False)
+    )
+    op.create_index('ix_documents_extension', 'documents', ['extension'])
+    op.create_index('ix_documents_modified_at', 'documents', ['modified_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_documents_modified_at', table_name='documents')
+    op.drop_index('ix_documents_extension', table_name='documents')
+    op.drop_table('documents')
@@ -0,0 +1,35 @@
+"""Add stored rendered HTML to posts
+
+Revision ID: d7a3e1f05b62
+Revises: c41f6a2e9d83
+Create Date: 2026-10-19 09:00:00.000000
+
+Both columns start out empty; fill them with `python manage.py
+render-posts`. Until then markdown posts are rendered on every view. Databases created with `python manage.py
+init-db` already have the columns, so they are skipped.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3e1f05b62'
+down_revision = 'c41f6a2e9d83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('posts')}
+    with op.batch_alter_table('posts') as batch_op:
+        if 'rendered_html' not in existing:
+            batch_op.add_column(sa.Column('rendered_html', sa.Text(), nullable=True))
+        if 'rendered_fingerprint' not in existing:
+            batch_op.add_column(sa.Column('rendered_fingerprint', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.drop_column('rendered_fingerprint')
+        batch_op.drop_column('rendered_html')
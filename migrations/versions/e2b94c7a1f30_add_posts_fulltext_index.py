@@ -0,0 +1,40 @@
+"""Add the PostgreSQL full-text index on posts
+
+Revision ID: e2b94c7a1f30
+Revises: d7a3e1f05b62
+Create Date: 2026-10-19 09:30:00.000000
+
+The GIN index behind the postgres search backend. It is built
+CONCURRENTLY, outside the migration transaction, so posts stay writable
+while it builds. Other databases don't use it and are left alone.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b94c7a1f30'
+down_revision = 'd7a3e1f05b62'
+branch_labels = None
+depends_on = None
+
+# Must match PostgresBackend.vector in src/search.py for the planner to use the index
+VECTOR = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(content, ''))"
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_fulltext', 'posts', [sa.text(f"({VECTOR})")],
+                        postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_posts_fulltext', table_name='posts',
+                      postgresql_concurrently=True, if_exists=True)
@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
@@ -33,8 +33,33 @@ def create_app(config=None):
     db.init_app(app)
     login_manager.init_app(app)
     migrate = Migrate(app, db)
+    
+    from src.profiler import init_profiler
+    init_profiler(app)
+    
     init_csrf(app)
     
+    from src.metrics import init_metrics
+    init_metrics(app)
+    
+    from src.view_counter import view_counter
+    view_counter.init_app(app)
+    
+    from src.page_cache import init_page_cache
+    init_page_cache(app)
+    
+    from src.query_stats import init_query_stats
+    init_query_stats(app)
+    
+    from src.jobs import job_queue
+    job_queue.init_app(app)
+    
+    from src.uploads import init_uploads
+    init_uploads(app)
+    
+    from src.images import init_images
+    init_images(app)
+    
     # Register blueprints
     register_blueprints(app) 
     
@@ -78,25 +103,21 @@ def configure_app(app, config=None):
         # Use persistent disk on Render
         app.config['UPLOAD_FOLDER'] = '/opt/render/persistent-uploads'
         app.config['UPLOADS_URL_PATH'] = '/uploads'  # URL path for serving files
-        
-        # Create a route to serve files from persistent disk
-        @app.route('/uploads/<path:filename>')
-        def uploaded_file(filename):
-            return send_from_directory('/opt/render/persistent-uploads', filename)
-        
-        # Handle legacy paths that might be in the database
-        @app.route('/static/uploads/<path:filename>')
-        def legacy_uploaded_file(filename):
-            # First try to serve from persistent disk
-            if os.path.exists(os.path.join('/opt/render/persistent-uploads', filename)):
-                return send_from_directory('/opt/render/persistent-uploads', filename)
-            # Fall back to static folder
-            return send_from_directory(os.path.join(app.static_folder, 'uploads'), filename)
     else:
         # Local development - use static folder
         app.config['UPLOAD_FOLDER'] = os.path.join(app.static_folder, 'uploads')
         app.config['UPLOADS_URL_PATH'] = '/static/uploads'  # URL path for static folder
     
+    # Browser caching of uploads: hashed /uploads/h/<digest>/ URLs are immutable,
+    # plain /uploads/ and /static/uploads/ URLs revalidate after UPLOADS_MAX_AGE.
+    # UPLOADS_SENDFILE hands file bodies to the front server: 'x-accel-redirect'
+    # for nginx (an internal location at UPLOADS_ACCEL_PREFIX aliased to
+    # UPLOAD_FOLDER) or 'x-sendfile' for Apache/lighttpd
+    app.config['UPLOADS_IMMUTABLE_MAX_AGE'] = int(os.environ.get('UPLOADS_IMMUTABLE_MAX_AGE', 31536000))
+    app.config['UPLOADS_MAX_AGE'] = int(os.environ.get('UPLOADS_MAX_AGE', 3600))
+    app.config['UPLOADS_SENDFILE'] = os.environ.get('UPLOADS_SENDFILE', '').lower()
+    app.config['UPLOADS_ACCEL_PREFIX'] = os.environ.get('UPLOADS_ACCEL_PREFIX', '/protected-uploads/')
+    
     # Define allowed file extensions
     app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     
@@ -111,6 +132,100 @@ def configure_app(app, config=None):
     
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    # Upload size limits in bytes. Files are streamed to disk and rejected as
+    # soon as they pass their limit; MAX_CONTENT_LENGTH makes Werkzeug refuse
+    # larger request bodies (413) before reading them
+    app.config['UPLOAD_MAX_IMAGE_BYTES'] = int(os.environ.get('UPLOAD_MAX_IMAGE_BYTES', 10 * 1024 * 1024))
+    app.config['UPLOAD_MAX_DOCUMENT_BYTES'] = int(os.environ.get('UPLOAD_MAX_DOCUMENT_BYTES', 50 * 1024 * 1024))
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 64 * 1024 * 1024))
+    
+    # Responsive image variants (needs Pillow): widths in pixels generated
+    # below each upload's own width, plus encoder quality settings
+    app.config['IMAGE_VARIANTS_ENABLED'] = os.environ.get('IMAGE_VARIANTS_ENABLED', 'true').lower() == 'true'
+    app.config['IMAGE_VARIANT_WIDTHS'] = [int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '480,960,1600').split(',')]
+    app.config['IMAGE_JPEG_QUALITY'] = int(os.environ.get('IMAGE_JPEG_QUALITY', 82))
+    app.config['IMAGE_WEBP_QUALITY'] = int(os.environ.get('IMAGE_WEBP_QUALITY', 80))
+    
+    # Seconds before cached categories/tags are reloaded even without invalidation
+    app.config['TAXONOMY_CACHE_TTL'] = int(os.environ.get('TAXONOMY_CACHE_TTL', 300))
+    
+    # Full-text search: 'auto' picks sqlite_fts/postgres from the database,
+    # falling back to the in-process 'memory' index (also 'ilike')
+    app.config['SEARCH_BACKEND'] = os.environ.get('SEARCH_BACKEND', 'auto')
+    app.config['SEARCH_INDEX_TTL'] = int(os.environ.get('SEARCH_INDEX_TTL', 300))
+    
+    # Buffered post view counts: flush every N seconds or once M views are waiting;
+    # optionally ignore crawlers and repeat views from the same visitor
+    app.config['VIEW_COUNTER_FLUSH_INTERVAL'] = int(os.environ.get('VIEW_COUNTER_FLUSH_INTERVAL', 10))
+    app.config['VIEW_COUNTER_MAX_PENDING'] = int(os.environ.get('VIEW_COUNTER_MAX_PENDING', 500))
+    app.config['VIEW_COUNTER_SKIP_BOTS'] = os.environ.get('VIEW_COUNTER_SKIP_BOTS', '1') == '1'
+    app.config['VIEW_COUNTER_DEDUP_SECONDS'] = int(os.environ.get('VIEW_COUNTER_DEDUP_SECONDS', 0))
+    
+    # Prometheus metrics at /metrics (needs prometheus_client). Scrapes must
+    # send "Authorization: Bearer <METRICS_TOKEN>"; with no token set the
+    # endpoint is a 404 for everything but requests from localhost
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')
+    
+    # On-demand profiling of single requests: logged-in admins send a signed
+    # token from the admin Profiles page in an X-Profile header or switch it
+    # on for their session. Stacks are sampled every
+    # PROFILER_INTERVAL_MS and the newest PROFILER_MAX_PROFILES are kept
+    app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED', '1') == '1'
+    app.config['PROFILER_INTERVAL_MS'] = float(os.environ.get('PROFILER_INTERVAL_MS', 5))
+    app.config['PROFILER_TOKEN_MAX_AGE'] = int(os.environ.get('PROFILER_TOKEN_MAX_AGE', 3600))
+    app.config['PROFILER_MAX_PROFILES'] = int(os.environ.get('PROFILER_MAX_PROFILES', 100))
+    app.config['PROFILER_FOLDER'] = os.environ.get('PROFILER_FOLDER', os.path.join(app.instance_path, 'profiles'))
+    
+    # Per-request SQL instrumentation: a Server-Timing header on every response,
+    # and a warning for requests slower than SLOW_REQUEST_MS, running
+    # SLOW_REQUEST_QUERIES statements or more, or repeating one statement
+    # shape QUERY_REPEAT_THRESHOLD times (a likely N+1)
+    app.config['QUERY_STATS_ENABLED'] = os.environ.get('QUERY_STATS_ENABLED', '1') == '1'
+    app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    app.config['SLOW_REQUEST_QUERIES'] = int(os.environ.get('SLOW_REQUEST_QUERIES', 30))
+    app.config['QUERY_REPEAT_THRESHOLD'] = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5))
+    
+    # Full-page cache for anonymous GETs of public pages. Workers on one host
+    # share invalidations through PAGE_CACHE_STAMP_FILE; separate hosts only
+    # converge after PAGE_CACHE_TTL seconds
+    app.config['PAGE_CACHE_ENABLED'] = os.environ.get('PAGE_CACHE_ENABLED', '1') == '1'
+    app.config['PAGE_CACHE_TTL'] = int(os.environ.get('PAGE_CACHE_TTL', 300))
+    app.config['PAGE_CACHE_STAMP_FILE'] = os.environ.get('PAGE_CACHE_STAMP_FILE',
+                                                         os.path.join(app.instance_path, 'page-cache.stamp'))
+    
+    # Background jobs (article generation): worker threads per process, and how
+    # long a job may stay queued/running before it's reported as interrupted
+    app.config['JOB_QUEUE_CONCURRENCY'] = int(os.environ.get('JOB_QUEUE_CONCURRENCY', 2))
+    app.config['JOB_STALE_SECONDS'] = int(os.environ.get('JOB_STALE_SECONDS', 1800))
+    
+    # Upstream LLM APIs: base URLs (point at a local stand-in for testing),
+    # connect/read timeouts in seconds, retry policy and pool size
+    app.config['OPENAI_API_BASE'] = os.environ.get('OPENAI_API_BASE', 'https://api.openai.com/v1')
+    app.config['PERPLEXITY_API_BASE'] = os.environ.get('PERPLEXITY_API_BASE', 'https://api.perplexity.ai')
+    app.config['LLM_CONNECT_TIMEOUT'] = float(os.environ.get('LLM_CONNECT_TIMEOUT', 10))
+    app.config['OPENAI_REQUEST_TIMEOUT'] = float(os.environ.get('OPENAI_REQUEST_TIMEOUT', 600))
+    app.config['PERPLEXITY_REQUEST_TIMEOUT'] = float(os.environ.get('PERPLEXITY_REQUEST_TIMEOUT', 120))
+    app.config['LLM_MAX_RETRIES'] = int(os.environ.get('LLM_MAX_RETRIES', 3))
+    app.config['LLM_BACKOFF_BASE'] = float(os.environ.get('LLM_BACKOFF_BASE', 1.0))
+    app.config['LLM_BACKOFF_MAX'] = float(os.environ.get('LLM_BACKOFF_MAX', 30))
+    app.config['LLM_POOL_SIZE'] = int(os.environ.get('LLM_POOL_SIZE', 10))
+    
+    # Approved comments shown per chunk on a post page
+    app.config['COMMENTS_PER_PAGE'] = int(os.environ.get('COMMENTS_PER_PAGE', 20))
+    
+    # Seconds the admin dashboard's counts are reused before being recomputed
+    app.config['DASHBOARD_STATS_TTL'] = int(os.environ.get('DASHBOARD_STATS_TTL', 60))
+    
+    # Default page size of the admin document manager
+    app.config['DOCUMENTS_PER_PAGE'] = int(os.environ.get('DOCUMENTS_PER_PAGE', 50))
+    
+    # Default page size of the admin news links list
+    app.config['NEWS_LINKS_PER_PAGE'] = int(os.environ.get('NEWS_LINKS_PER_PAGE', 50))
+    
+    # Perplexity topics queried in parallel by a multi-topic fetch
+    app.config['PERPLEXITY_FETCH_CONCURRENCY'] = int(os.environ.get('PERPLEXITY_FETCH_CONCURRENCY', 5))
+    
     # Override with any provided config
     if config:
         app.config.update(config)
@@ -134,6 +249,11 @@ def register_error_handlers(app):
         from flask import render_template
         return render_template('404.html'), 404
     
+    @app.errorhandler(413)
+    def request_too_large(e):
+        from flask import jsonify
+        return jsonify({'error': e.description}), 413
+    
     @app.errorhandler(500)
     def server_error(e):
         from flask import render_template
@@ -141,11 +261,16 @@ def register_error_handlers(app):
 
 def register_context_processors(app):
     """Register context processors"""
+    from src.cache import taxonomy_cache
+    taxonomy_cache.ttl = app.config['TAXONOMY_CACHE_TTL']
+    
     @app.context_processor
     def inject_categories_and_tags():
-        from src.models.blog import Category, Tag
+        from src.cache import get_cached_categories, get_cached_tags
         from datetime import datetime
         
-        categories = Category.query.all()
-        tags = Tag.query.all()
+        # Served from a process-local cache that the admin category/tag
+        # routes invalidate, so most renders issue no queries here
+        categories = get_cached_categories()
+        tags = get_cached_tags()
         return dict(categories=categories, tags=tags, now=datetime.now())
@@ -0,0 +1,163 @@
+"""
+Benchmarks run from manage.py. Each one builds its own scratch data so it
+never touches the application database.
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORDS = (
+    'copyright patent trademark license open source compliance privacy data '
+    'regulation court ruling lawsuit antitrust software contract liability '
+    'infringement fair use injunction settlement appeal statute agency policy '
+    'platform algorithm model training dataset consent breach security cloud '
+    'startup acquisition merger venture employment export sanction standard '
+    'protocol interoperability encryption biometric consumer protection'
+).split()
+
+def _timed(fn, repeat):
+    """Return (median, max) wall time in milliseconds over repeat calls"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+def _synthetic_posts(count, words_per_post, seed=42):
+    rng = random.Random(seed)
+    filler = [f"w{n}" for n in range(5000)]
+    base = datetime(2024, 1, 1)
+    for i in range(1, count + 1):
+        body = ' '.join(rng.choice(WORDS) if rng.random() < 0.3 else rng.choice(filler)
+                        for _ in range(words_per_post))
+        yield {
+            'id': i,
+            'title': f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} update {i}",
+            'slug': f"bench-post-{i}",
+            'content': f"<p>{body}</p>",
+            'content_format': 'html',
+            'published': rng.random() < 0.9,
+            'comments_enabled': True,
+            'views': 0,
+            'created_at': base + timedelta(minutes=i),
+            'updated_at': base + timedelta(minutes=i),
+        }
+
+def bench_search(sizes, queries, database_url=None, words_per_post=120, repeat=5, echo=print):
+    """
+    Compare the ilike scan against the full-text backends at each size.
+
+    Uses a temporary SQLite file unless database_url points at a scratch
+    PostgreSQL/MySQL database (its posts table is dropped and recreated).
+    """
+    from src import create_app
+    from src.models import db
+    from src.models.blog import Post
+    from src.search import IlikeBackend, SQLiteFTSBackend, PostgresBackend, MemoryBackend
+
+    for size in sizes:
+        scratch_dir = None
+        url = database_url
+        if not url:
+            scratch_dir = tempfile.mkdtemp(prefix='search-bench-')
+            url = f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}"
+
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'SEARCH_BACKEND': 'ilike'})
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+
+            started = time.perf_counter()
+            batch = []
+            for row in _synthetic_posts(size, words_per_post):
+                batch.append(row)
+                if len(batch) == 5000:
+                    db.session.execute(Post.__table__.insert(), batch)
+                    batch = []
+            if batch:
+                db.session.execute(Post.__table__.insert(), batch)
+            db.session.commit()
+            echo(f"\n{size} posts loaded in {time.perf_counter() - started:.1f}s ({url.split(':')[0]})")
+
+            dialect = db.engine.dialect.name
+            backends = [IlikeBackend()]
+            if dialect == 'sqlite' and SQLiteFTSBackend.available():
+                backends.append(SQLiteFTSBackend())
+            elif dialect == 'postgresql':
+                backends.append(PostgresBackend())
+            backends.append(MemoryBackend(ttl=float('inf')))
+
+            echo(f"{'backend':<12} {'index build':>12} {'query':<28} {'median ms':>10} {'max ms':>10} {'hits':>7}")
+            for backend in backends:
+                started = time.perf_counter()
+                with db.engine.begin() as connection:
+                    backend.ensure_schema(connection)
+                if isinstance(backend, MemoryBackend):
+                    backend.rebuild()
+                build = f"{time.perf_counter() - started:.2f}s"
+
+                for query_text in queries:
+                    # Warm up once so the first-call cost isn't in the median
+                    result = backend.search(query_text, 1, 6)
+                    median, worst = _timed(lambda: backend.search(query_text, 1, 6), repeat)
+                    echo(f"{backend.name:<12} {build:>12} {query_text:<28} "
+                         f"{median:>10.2f} {worst:>10.2f} {result.total:>7}")
+                    build = ''
+
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+        if scratch_dir:
+            os.remove(os.path.join(scratch_dir, 'bench.db'))
+            os.rmdir(scratch_dir)
+
+def _synthetic_llm_response(links, seed=42):
+    """Text shaped like an unstructured Perplexity answer with links URLs and dates"""
+    rng = random.Random(seed)
+    layouts = [
+        lambda d: d.strftime('%m-%d-%Y'),
+        lambda d: d.strftime('%Y/%m/%d'),
+        lambda d: d.strftime('%B %d, %Y'),
+        lambda d: d.strftime('%d %b %Y')
+    ]
+    base = datetime(2025, 1, 1)
+    lines = []
+    for i in range(links):
+        published = base + timedelta(days=rng.randrange(365))
+        prose = ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(5, 25)))
+        url = f"https://news{rng.randrange(50)}.example.com/{published:%Y/%m/%d}/story-{i}?utm_source=feed"
+        if rng.random() < 0.5:
+            lines.append(f"{i + 1}. {prose} {url} ({rng.choice(layouts)(published)})")
+        else:
+            lines.append(f"{i + 1}. Published {rng.choice(layouts)(published)}: {prose}\n   {url}")
+    return '\n'.join(lines)
+
+def bench_extract(sizes, repeat=5, echo=print):
+    """
+    Time extract_urls_and_dates on synthetic responses of increasing size.
+
+    Per-link cost should stay flat as the response grows; the scaling column
+    is (time ratio) / (size ratio) against the previous size, so values near
+    1.0 mean linear and values near the size ratio mean quadratic.
+    """
+    from src.link_extractor import extract_urls_and_dates
+
+    echo(f"{'links':>8} {'chars':>11} {'median ms':>10} {'max ms':>10} {'us/link':>9} {'scaling':>8}")
+    previous = None
+    for size in sizes:
+        text = _synthetic_llm_response(size)
+        found = len(extract_urls_and_dates(text))
+        if found != size:
+            echo(f"warning: extracted {found} of {size} links")
+        median, worst = _timed(lambda: extract_urls_and_dates(text), repeat)
+        scaling = ''
+        if previous:
+            scaling = f"{(median / previous[1]) / (size / previous[0]):.2f}"
+        echo(f"{size:>8} {len(text):>11} {median:>10.2f} {worst:>10.2f} "
+             f"{median * 1000 / size:>9.2f} {scaling:>8}")
+        previous = (size, median)
@@ -0,0 +1,154 @@
+import threading
+import time
+from datetime import datetime
+
+class ProcessCache:
+    """
+    Small process-local cache with per-entry TTL expiry and hit/miss counters.
+
+    Each gunicorn worker holds its own copy, so explicit invalidation only
+    reaches the worker that handled the mutation; the TTL bounds how long
+    other workers can serve stale values.
+    """
+
+    def __init__(self, ttl=300, max_entries=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0  # Bumped on every invalidation
+        self._store = {}
+        self._lock = threading.Lock()
+
+    def get_or_set(self, key, loader, ttl=None):
+        """Return the cached value for key, calling loader() on a miss or expiry"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._store.get(key)
+            if entry and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Load outside the lock so a slow query doesn't block other threads
+        value = loader()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self.set(key, value, expires_at=expires_at)
+        return value
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expiry"""
+        with self._lock:
+            entry = self._store.get(key)
+            if entry and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """Store a value, evicting the oldest entries beyond max_entries"""
+        if expires_at is None:
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store.pop(key, None)
+            self._store[key] = (value, expires_at)
+            if self.max_entries is not None:
+                while len(self._store) > self.max_entries:
+                    # Dicts keep insertion order, so the first key is the oldest
+                    del self._store[next(iter(self._store))]
+
+    def invalidate(self, *keys):
+        """Drop the given keys, or everything if no keys are given"""
+        with self._lock:
+            self.generation += 1
+            if not keys:
+                self._store.clear()
+            for key in keys:
+                self._store.pop(key, None)
+
+    def stats(self):
+        """Return hit/miss counters and the number of live entries"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'entries': len(self._store),
+                'ttl': self.ttl
+            }
+
+# Categories and tags injected into every template
+taxonomy_cache = ProcessCache()
+
+# COUNT(*) totals behind paginated post listings
+post_count_cache = ProcessCache(ttl=60)
+
+# Admin dashboard snapshot (totals plus recent posts/comments)
+dashboard_cache = ProcessCache(ttl=60)
+
+def _load_categories():
+    from src.models.blog import Category
+    # Store plain dicts rather than ORM instances, which would be detached
+    # (and possibly expired) once the request that loaded them ends
+    return [
+        {'id': c.id, 'name': c.name, 'slug': c.slug, 'description': c.description}
+        for c in Category.query.order_by(Category.id).all()
+    ]
+
+def _load_tags():
+    from src.models.blog import Tag
+    return [
+        {'id': t.id, 'name': t.name, 'slug': t.slug}
+        for t in Tag.query.order_by(Tag.id).all()
+    ]
+
+def _load_dashboard_stats():
+    from src.models.blog import Post, Comment, dashboard_counts
+    stats = dashboard_counts()
+    stats['recent_posts'] = [
+        {'id': p.id, 'title': p.title, 'slug': p.slug, 'published': p.published,
+         'created_at': p.created_at, 'views': p.views}
+        for p in Post.query.order_by(Post.created_at.desc()).limit(5).all()
+    ]
+    stats['recent_comments'] = [
+        {'id': c.id, 'name': c.name, 'content': c.content, 'approved': c.approved,
+         'created_at': c.created_at}
+        for c in Comment.query.order_by(Comment.created_at.desc()).limit(5).all()
+    ]
+    stats['computed_at'] = datetime.utcnow()
+    return stats
+
+def get_dashboard_stats():
+    """Return the dashboard snapshot, recomputed at most every DASHBOARD_STATS_TTL seconds"""
+    from flask import current_app
+    return dashboard_cache.get_or_set('stats', _load_dashboard_stats,
+                                      ttl=current_app.config['DASHBOARD_STATS_TTL'])
+
+def get_cached_categories():
+    """Return all categories from the process-local cache"""
+    return taxonomy_cache.get_or_set('categories', _load_categories)
+
+def get_cached_tags():
+    """Return all tags from the process-local cache"""
+    return taxonomy_cache.get_or_set('tags', _load_tags)
+
+def invalidate_categories():
+    """Call after any category create/update/delete"""
+    taxonomy_cache.invalidate('categories')
+    dashboard_cache.invalidate()
+
+def invalidate_tags():
+    """Call after any tag create/update/delete"""
+    taxonomy_cache.invalidate('tags')
+    dashboard_cache.invalidate()
+
+def invalidate_post_counts():
+    """Call after a post is created, deleted, published or moved"""
+    post_count_cache.invalidate()
+    dashboard_cache.invalidate()
+
+def invalidate_dashboard_stats():
+    """Call after a comment is added, approved or deleted"""
+    dashboard_cache.invalidate()
@@ -0,0 +1,148 @@
+"""
+Document catalog for the admin document manager: one row per stored
+document, kept current by the upload and delete routes and rebuilt from
+storage by reconcile_documents (`python manage.py reconcile-documents`).
+"""
+import os
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+from src.models import db
+from src.models.document import Document
+from src.models.upload import UploadReference
+
+# Sort keys accepted by the listing
+SORT_COLUMNS = {
+    'modified': Document.modified_at,
+    'name': Document.original_name,
+    'size': Document.size_bytes,
+    'type': Document.extension
+}
+
+MAX_DOCUMENTS_PER_PAGE = 200
+
+def original_name(filename):
+    """Name shown for a stored file: without its <prefix>_ part"""
+    return '_'.join(filename.split('_')[1:]) if '_' in filename else filename
+
+def _entry(filename, original, size_bytes, modified_at):
+    # Whole seconds, so values round-trip through MySQL DATETIME unchanged
+    return {
+        'original_name': original or original_name(filename),
+        'extension': os.path.splitext(filename)[1].lstrip('.').lower(),
+        'size_bytes': size_bytes,
+        'modified_at': modified_at.replace(microsecond=0)
+    }
+
+def record_stored_document(path):
+    """Add or refresh the catalog entry for a document stored by content"""
+    reference = UploadReference.query.filter_by(name=path).options(joinedload(UploadReference.blob)).first()
+    if reference is None:
+        return None
+    filename = path[len('documents/'):]
+    # Same values reconcile_documents derives, so it has nothing to rewrite
+    values = _entry(filename, reference.original_filename, reference.blob.size_bytes, reference.created_at)
+
+    document = Document.query.filter_by(filename=filename).first()
+    if document is None:
+        document = Document(filename=filename)
+        db.session.add(document)
+    for key, value in values.items():
+        setattr(document, key, value)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Recorded by a concurrent upload of the same file
+        db.session.rollback()
+    return document
+
+def forget_document(filename):
+    """Drop the catalog entry for a deleted document"""
+    Document.query.filter_by(filename=filename).delete()
+    db.session.commit()
+
+def _stored_documents():
+    """filename -> catalog values for everything actually stored"""
+    documents_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'documents')
+    os.makedirs(documents_dir, exist_ok=True)
+
+    stored = {}
+    # Files saved before content-addressed storage; scandir's entries avoid a
+    # separate isfile() call per name
+    with os.scandir(documents_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            stats = entry.stat()
+            # UTC, like the upload times of documents stored by content
+            stored[entry.name] = _entry(entry.name, None, stats.st_size, datetime.utcfromtimestamp(stats.st_mtime))
+
+    references = UploadReference.query.filter_by(kind=UploadReference.DOCUMENT).options(joinedload(UploadReference.blob))
+    for reference in references:
+        filename = reference.name[len('documents/'):]
+        stored[filename] = _entry(filename, reference.original_filename, reference.blob.size_bytes, reference.created_at)
+    return stored
+
+def reconcile_documents():
+    """
+    Bring the catalog in line with storage: add missing documents, refresh
+    changed ones and drop entries whose file is gone.
+
+    Returns:
+        tuple: (added, updated, removed)
+    """
+    stored = _stored_documents()
+    catalog = {document.filename: document for document in Document.query.all()}
+    added = updated = removed = 0
+
+    for filename, document in catalog.items():
+        if filename not in stored:
+            db.session.delete(document)
+            removed += 1
+
+    for filename, values in stored.items():
+        document = catalog.get(filename)
+        if document is None:
+            db.session.add(Document(filename=filename, **values))
+            added += 1
+        elif any(getattr(document, key) != value for key, value in values.items()):
+            for key, value in values.items():
+                setattr(document, key, value)
+            updated += 1
+
+    db.session.commit()
+    return added, updated, removed
+
+def list_documents(args, per_page):
+    """
+    One page of the catalog, filtered by q (name contains) and type
+    (extension) and ordered by sort/order.
+
+    Returns:
+        tuple: (pagination, sort, order)
+    """
+    query = Document.query
+    if args.get('q'):
+        # Escape LIKE wildcards so the text matches literally
+        term = args['q'].replace('/', '//').replace('%', '/%').replace('_', '/_')
+        query = query.filter(Document.original_name.ilike(f"%{term}%", escape='/'))
+    if args.get('type'):
+        query = query.filter(Document.extension == args['type'].lower())
+
+    sort = args.get('sort') if args.get('sort') in SORT_COLUMNS else 'modified'
+    order = 'asc' if args.get('order') == 'asc' else 'desc'
+    column = SORT_COLUMNS[sort]
+    if order == 'asc':
+        query = query.order_by(column.asc(), Document.id.asc())
+    else:
+        query = query.order_by(column.desc(), Document.id.desc())
+
+    page = args.get('page', 1, type=int)
+    return query.paginate(page=page, per_page=per_page, error_out=False), sort, order
+
+def document_extensions():
+    """Distinct extensions in the catalog, for the type filter"""
+    return [row[0] for row in db.session.query(Document.extension).distinct().order_by(Document.extension) if row[0]]
@@ -0,0 +1,223 @@
+import os
+
+from flask import current_app
+from sqlalchemy import select
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it uploads are served as they are
+    Image = None
+
+from src.cache import ProcessCache
+from src.models import db
+from src.models.image import UploadedImage, ImageVariant
+from src.models.upload import UploadReference
+from src.page_cache import invalidate_pages, sync_with_page_invalidations
+from src.storage import delete_upload, store_file, temp_file
+from src.uploads import (upload_url, upload_name, resolve_upload, forget_upload,
+                         hashed_upload_url, stored_digests)
+
+# Variant sets for responsive_image, keyed by stored image path. Changes call
+# invalidate_pages() as well, which is how other workers learn to drop theirs
+image_cache = ProcessCache(ttl=300, max_entries=2000)
+
+# Pillow formats we re-encode at smaller widths; anything else only gets WebP
+RESIZABLE_FORMATS = {'JPEG': 'jpeg', 'PNG': 'png'}
+
+def init_images(app):
+    app.add_template_global(responsive_image)
+
+def variants_available():
+    return Image is not None and current_app.config['IMAGE_VARIANTS_ENABLED']
+
+def queue_image_variants(path):
+    """
+    Record an uploaded image and generate its variants on the job queue.
+
+    path is the value stored on posts (e.g. static/uploads/<name>). Uses its
+    own connection so the caller's session and pending changes are untouched.
+    """
+    if not variants_available():
+        return None
+    table = UploadedImage.__table__
+    with db.engine.begin() as connection:
+        existing = connection.execute(select(table.c.id).where(table.c.path == path)).scalar()
+        if existing is not None:
+            # The same file uploaded again under the same name already has its variants
+            return existing
+        image_id = connection.execute(
+            table.insert().values(path=path, status=UploadedImage.QUEUED)
+        ).inserted_primary_key[0]
+
+    from src.jobs import job_queue
+    job_queue.submit(UploadedImage, image_id, generate_variants)
+    return image_id
+
+def _encode(image, fmt):
+    """Encode image to a temporary file for store_file; returns (temp path, size)"""
+    options = {
+        'jpeg': {'quality': current_app.config['IMAGE_JPEG_QUALITY'], 'optimize': True, 'progressive': True},
+        'png': {'optimize': True},
+        'webp': {'quality': current_app.config['IMAGE_WEBP_QUALITY'], 'method': 4}
+    }[fmt]
+    if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    handle, temp_path = temp_file(suffix=f'.{fmt}')
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            image.save(out, format=fmt.upper(), **options)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, os.path.getsize(temp_path)
+
+def _remove_variant(name):
+    """Delete a variant's stored copy; variants written before content-addressed storage are loose files"""
+    if delete_upload(name):
+        return
+    disk_path = safe_join(current_app.config['UPLOAD_FOLDER'], name)
+    if disk_path and os.path.isfile(disk_path):
+        os.remove(disk_path)
+        forget_upload(name)
+
+def generate_variants(image):
+    """
+    Job handler: store resized copies at each IMAGE_VARIANT_WIDTHS width
+    below the original's, plus WebP encodes at every width including the
+    original, and record their dimensions.
+    """
+    source_path = resolve_upload(upload_name(image.path))
+    if source_path is None:
+        raise FileNotFoundError(image.path)
+    stem = os.path.splitext(os.path.basename(image.path))[0]
+    prefix = os.path.dirname(image.path)
+    old_names = {upload_name(variant.path) for variant in image.variants}
+
+    # Stored by content like any upload, so a regenerated variant gets a new name
+    variants = []
+    try:
+        with Image.open(source_path) as opened:
+            source_format = opened.format
+            animated = getattr(opened, 'n_frames', 1) > 1
+            # Phone photos store their rotation in EXIF; bake it in before resizing
+            source = ImageOps.exif_transpose(opened)
+            image.width, image.height = source.size
+
+            if not animated:
+                widths = sorted(w for w in current_app.config['IMAGE_VARIANT_WIDTHS'] if w < image.width)
+                for width in widths + [image.width]:
+                    height = max(1, round(image.height * width / image.width))
+                    resized = source if width == image.width else source.resize((width, height), Image.LANCZOS)
+
+                    formats = ['webp']
+                    if width < image.width and source_format in RESIZABLE_FORMATS:
+                        formats.insert(0, RESIZABLE_FORMATS[source_format])
+                    for fmt in formats:
+                        temp_path, size = _encode(resized, fmt)
+                        name = store_file(temp_path, f"{stem}-{width}w.{fmt}", UploadReference.VARIANT)
+                        variants.append(ImageVariant(
+                            path=f"{prefix}/{name}" if prefix else name,
+                            format=fmt,
+                            width=width,
+                            height=height,
+                            size_bytes=size
+                        ))
+    except Exception:
+        # Don't keep copies no variant row will point at
+        for variant in variants:
+            if upload_name(variant.path) not in old_names:
+                _remove_variant(upload_name(variant.path))
+        raise
+
+    image.variants = variants
+    image.status = UploadedImage.SUCCEEDED
+    db.session.commit()
+    current_app.logger.info(f"Generated {len(image.variants)} variants for {image.path}")
+
+    new_names = {upload_name(variant.path) for variant in variants}
+    for name in old_names - new_names:
+        _remove_variant(name)
+
+    # Pages rendered before the variants existed lack their srcset
+    image_cache.invalidate(image.path)
+    invalidate_pages()
+
+def delete_image(name):
+    """Forget an uploaded image's variant job and delete its variants; name is its upload name"""
+    images = UploadedImage.query.filter(
+        UploadedImage.path.in_([name, f'uploads/{name}', f'static/uploads/{name}'])
+    ).all()
+    if not images:
+        return
+    variant_names = [upload_name(variant.path) for image in images for variant in image.variants]
+    for image in images:
+        db.session.delete(image)
+    db.session.commit()
+
+    for variant_name in variant_names:
+        _remove_variant(variant_name)
+    image_cache.invalidate(*(image.path for image in images))
+    invalidate_pages()
+
+def _load_variants(path):
+    image = UploadedImage.query.filter_by(path=path, status=UploadedImage.SUCCEEDED).first()
+    if image is None:
+        return None
+    variants = [(v.path, v.format, v.width) for v in image.variants]
+    # Plain data, so the cached value doesn't hold a detached ORM object.
+    # Every candidate's digest comes from one query rather than one each.
+    return {
+        'width': image.width,
+        'height': image.height,
+        'variants': variants,
+        'digests': stored_digests(upload_name(p) for p in [path] + [v[0] for v in variants])
+    }
+
+def responsive_image(path, alt='', sizes='100vw', class_=None, src=None):
+    """
+    Template helper: an <img> for an uploaded image, wrapped in a <picture>
+    with WebP and resized srcset candidates once its variants exist.
+
+    src defaults to upload_url(path); variant URLs use the digests cached
+    with the variant list.
+    """
+    info = None
+    if path and '://' not in path:
+        sync_with_page_invalidations(image_cache)
+        info = image_cache.get_or_set(path, lambda: _load_variants(path))
+    if src is None:
+        digest = info['digests'].get(upload_name(path)) if info else None
+        src = hashed_upload_url(path, digest) if digest else upload_url(path)
+
+    attrs = f'src="{escape(src)}" alt="{escape(alt)}"'
+    if class_:
+        attrs += f' class="{escape(class_)}"'
+    if not info:
+        return Markup(f'<img {attrs}>')
+
+    # Known dimensions let the browser reserve space before the image loads
+    attrs += f' width="{info["width"]}" height="{info["height"]}"'
+    if not info['variants']:
+        return Markup(f'<img {attrs}>')
+
+    webp = [(variant_path, width) for variant_path, fmt, width in info['variants'] if fmt == 'webp']
+    fallback = [(variant_path, width) for variant_path, fmt, width in info['variants'] if fmt != 'webp']
+    fallback.append((path, info['width']))
+
+    def srcset(candidates):
+        return escape(', '.join(
+            f"{hashed_upload_url(p, info['digests'].get(upload_name(p)))} {w}w" for p, w in candidates
+        ))
+
+    sizes = escape(sizes)
+    return Markup(
+        f'<picture class="responsive-image">'
+        f'<source type="image/webp" srcset="{srcset(webp)}" sizes="{sizes}">'
+        f'<img {attrs} srcset="{srcset(fallback)}" sizes="{sizes}">'
+        f'</picture>'
+    )
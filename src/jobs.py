@@ -0,0 +1,84 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from src.models import db
+
+class JobQueue:
+    """
+    In-process queue that runs persisted jobs on a bounded thread pool.
+
+    Jobs are rows (e.g. ArticleJob) whose status the handler's worker thread
+    updates, so any gunicorn worker can answer status polls. The pool is
+    created lazily per process so forked workers don't inherit a dead one.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.max_workers = 2
+        self.stale_after = timedelta(minutes=30)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config['JOB_QUEUE_CONCURRENCY']
+        self.stale_after = timedelta(seconds=app.config['JOB_STALE_SECONDS'])
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='job-queue')
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, model, job_id, handler):
+        """Run handler(job) for the model row job_id on the pool"""
+        return self._get_executor().submit(self._run, model, job_id, handler)
+
+    def _run(self, model, job_id, handler):
+        with self.app.app_context():
+            job = db.session.get(model, job_id)
+            if job is None or job.status != model.QUEUED:
+                return
+            try:
+                job.status = model.RUNNING
+                job.started_at = datetime.utcnow()
+                db.session.commit()
+
+                handler(job)
+
+                job.status = model.SUCCEEDED
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Job {model.__tablename__}#{job_id} failed: {e}")
+                self.app.logger.error(traceback.format_exc())
+                job = db.session.get(model, job_id)
+                if job is not None:
+                    job.status = model.FAILED
+                    job.error = str(e)
+                    job.finished_at = datetime.utcnow()
+                    db.session.commit()
+            finally:
+                db.session.remove()
+
+    def expire_stale(self, job):
+        """Mark a job failed if it has been active too long (e.g. its worker died)"""
+        if not job.is_active:
+            return False
+        since = job.started_at or job.created_at
+        if since and datetime.utcnow() - since > self.stale_after:
+            job.status = job.FAILED
+            job.error = 'Job was interrupted before it finished'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return True
+        return False
+
+job_queue = JobQueue()
@@ -0,0 +1,146 @@
+import bisect
+import logging
+import re
+import urllib.parse
+from datetime import date
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Common URL formats including http and https
+URL_PATTERN = r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+(?:/[-\w%!.~\'*,;:=+$/?#[\]@&]+)*'
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+_MONTH_NAMES = '|'.join(MONTHS)
+_MONTH_ABBRS = '|'.join(name[:3] for name in MONTHS)
+_MONTH = rf'{_MONTH_NAMES}|{_MONTH_ABBRS}'
+_MONTH_NUM = r'0?[1-9]|1[0-2]'
+_DAY = r'0?[1-9]|[12]\d|3[01]'
+
+def _date_pattern(year):
+    """One alternative per date layout; the outer group name says which matched"""
+    return '|'.join([
+        # MM-DD-YYYY or MM/DD/YYYY
+        rf'(?P<mdy>(?P<mdy_m>{_MONTH_NUM})(?P<mdy_s>[-/])(?P<mdy_d>{_DAY})(?P=mdy_s)(?P<mdy_y>{year}))',
+        # YYYY-MM-DD or YYYY/MM/DD
+        rf'(?P<ymd>(?P<ymd_y>{year})(?P<ymd_s>[-/])(?P<ymd_m>{_MONTH_NUM})(?P=ymd_s)(?P<ymd_d>{_DAY}))',
+        # Month DD, YYYY or Mon DD, YYYY (e.g., January 1, 2023 or Jan 1 2023)
+        rf'(?P<bdy>(?P<bdy_m>{_MONTH})\s+(?P<bdy_d>{_DAY}),?\s+(?P<bdy_y>{year}))',
+        # DD Month YYYY or DD Mon YYYY (e.g., 1 January 2023)
+        rf'(?P<dby>(?P<dby_d>{_DAY})\s+(?P<dby_m>{_MONTH})\s+(?P<dby_y>{year}))'
+    ])
+
+# Dates as they appear in running text: 21st-century years only
+DATE_PATTERN = _date_pattern(r'20\d{2}')
+
+# Month name or abbreviation (lowercase) -> month number
+MONTH_NUMBERS = {name.lower(): number for number, name in enumerate(MONTHS, 1)}
+MONTH_NUMBERS.update({name[:3].lower(): number for number, name in enumerate(MONTHS, 1)})
+
+DATE_RE = re.compile(DATE_PATTERN)
+TOKEN_RE = re.compile(rf'(?P<url>{URL_PATTERN})|{DATE_PATTERN}')
+
+# A whole date string handed to parse_date_string: any year, any case
+DATE_STRING_RE = re.compile(_date_pattern(r'\d{4}'), re.IGNORECASE)
+
+# Distinct date strings remembered by parse_date_string
+DATE_CACHE_SIZE = 4096
+
+def _match_date(match):
+    """Build the date for a DATE_PATTERN match, or None if it isn't a real day"""
+    layout = match.lastgroup
+    month = match.group(f'{layout}_m')
+    try:
+        return date(
+            int(match.group(f'{layout}_y')),
+            MONTH_NUMBERS[month.lower()] if month[0].isalpha() else int(month),
+            int(match.group(f'{layout}_d'))
+        )
+    except ValueError:
+        # e.g. 02-30-2025
+        return None
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date_string(date_str):
+    """
+    Parse a date string in various formats and return a datetime.date object.
+
+    Accepts MM-DD-YYYY, YYYY-MM-DD (either with '/'), "Month DD, YYYY" and
+    "DD Month YYYY" with full or abbreviated month names. One regex picks
+    the layout, so there is no trial-and-error over formats, and results
+    are memoized. Needs no app context.
+
+    Args:
+        date_str (str): The date string to parse
+
+    Returns:
+        datetime.date or None: The parsed date or None if parsing fails
+    """
+    match = DATE_STRING_RE.fullmatch(date_str.strip())
+    parsed = _match_date(match) if match else None
+    if parsed is None:
+        logger.warning(f"Could not parse date: {date_str}")
+    return parsed
+
+def _valid_url(url):
+    try:
+        parsed = urllib.parse.urlparse(url)
+        return bool(parsed.scheme and parsed.netloc)
+    except ValueError as e:
+        logger.warning(f"Invalid URL format: {url}, error: {e}")
+        return False
+
+def extract_urls_and_dates(text):
+    """
+    Extract URLs and associated dates from unstructured text.
+
+    Scans the text once with a combined URL/date pattern, recording the
+    position of every URL and parsed date (including dates inside URLs,
+    such as /2025/01/31/), then pairs each URL with the date nearest to
+    it by binary search.
+
+    Args:
+        text (str): The unstructured text to parse
+
+    Returns:
+        list: A list of dictionaries with 'url' and 'date_of_article' keys,
+        one per URL occurrence in text order
+    """
+    urls = []
+    date_positions = []
+    dates = []
+
+    for match in TOKEN_RE.finditer(text):
+        if match.lastgroup == 'url':
+            url = match.group('url').strip()
+            if url and _valid_url(url):
+                urls.append((url, match.start()))
+            # Dates embedded in the URL count too; positions come out in order
+            for date_match in DATE_RE.finditer(text, match.start(), match.end()):
+                parsed = _match_date(date_match)
+                if parsed is not None:
+                    date_positions.append(date_match.start())
+                    dates.append(parsed)
+        else:
+            parsed = _match_date(match)
+            if parsed is not None:
+                date_positions.append(match.start())
+                dates.append(parsed)
+
+    results = []
+    for url, position in urls:
+        closest = None
+        if dates:
+            # Nearest date before or after the URL; ties go to the earlier one
+            index = bisect.bisect_left(date_positions, position)
+            candidates = [i for i in (index - 1, index) if 0 <= i < len(dates)]
+            nearest = min(candidates, key=lambda i: abs(date_positions[i] - position))
+            closest = dates[nearest]
+        results.append({
+            'url': url,
+            'date_of_article': closest
+        })
+
+    return results
@@ -0,0 +1,143 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from src.metrics import observe_llm_request
+
+# Status codes worth retrying: the upstream refused the request without
+# generating anything. A 500/502/504 may come from a gateway while the model
+# is still generating (and billing for) the first attempt, so it isn't retried
+RETRY_STATUSES = {429, 503}
+
+class LLMAPIError(requests.exceptions.RequestException):
+    """The upstream API answered with a non-success status after all retries"""
+    def __init__(self, provider, status_code, body):
+        super(LLMAPIError, self).__init__(f"{provider} API error: {status_code} - {body}")
+        self.provider = provider
+        self.status_code = status_code
+        self.body = body
+
+def _never_sent(error):
+    """True for transport errors raised before any of the request reached the upstream"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or not error.args:
+        return False
+    # requests wraps urllib3's MaxRetryError, whose reason is the underlying
+    # failure; NewConnectionError covers refused connections and DNS failures
+    reason = getattr(error.args[0], 'reason', error.args[0])
+    return isinstance(reason, NewConnectionError)
+
+class LLMClient:
+    """
+    Shared HTTP client for the OpenAI and Perplexity chat completion APIs.
+
+    One keep-alive connection pool per process, explicit connect/read
+    timeouts, and exponential backoff with jitter on 429/503 and on
+    failures to connect. Anything that can happen after the request was
+    sent (read timeouts, dropped connections, gateway errors) is not
+    retried, since the upstream may still be generating (and billing for)
+    the first attempt.
+    """
+
+    # provider -> (base URL config key, API key environment variable, read timeout config key)
+    PROVIDERS = {
+        'openai': ('OPENAI_API_BASE', 'OPENAI_API_KEY', 'OPENAI_REQUEST_TIMEOUT'),
+        'perplexity': ('PERPLEXITY_API_BASE', 'PERPLEXITY_API_KEY', 'PERPLEXITY_REQUEST_TIMEOUT')
+    }
+
+    def __init__(self):
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # One session per process; a session inherited across fork would share sockets
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4,
+                                      pool_maxsize=current_app.config['LLM_POOL_SIZE'])
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def api_key(self, provider):
+        return os.environ.get(self.PROVIDERS[provider][1])
+
+    def _backoff(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt (full jitter, capped)"""
+        config = current_app.config
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), config['LLM_BACKOFF_MAX'])
+            except ValueError:
+                pass
+        ceiling = min(config['LLM_BACKOFF_MAX'], config['LLM_BACKOFF_BASE'] * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def chat_completion(self, provider, payload, api_key=None):
+        """
+        POST payload to the provider's /chat/completions endpoint.
+
+        Returns the decoded JSON response; raises LLMAPIError for a final
+        non-200 answer and requests exceptions for transport failures.
+        """
+        base_key, _, timeout_key = self.PROVIDERS[provider]
+        config = current_app.config
+        url = f"{config[base_key].rstrip('/')}/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {api_key or self.api_key(provider)}",
+            "Content-Type": "application/json"
+        }
+        timeout = (config['LLM_CONNECT_TIMEOUT'], config[timeout_key])
+        attempts = config['LLM_MAX_RETRIES'] + 1
+
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=timeout)
+            except requests.exceptions.RequestException as e:
+                elapsed = (time.perf_counter() - started) * 1000
+                observe_llm_request(provider, 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'error',
+                                    elapsed / 1000)
+                if not _never_sent(e):
+                    # Read timeouts, dropped connections and other failures that aren't retried
+                    raise
+                if attempt == attempts - 1:
+                    current_app.logger.error(f"{provider} request failed after {elapsed:.0f} ms "
+                                             f"(attempt {attempt + 1}/{attempts}): {e}")
+                    raise
+                delay = self._backoff(attempt)
+                current_app.logger.warning(f"{provider} could not connect after {elapsed:.0f} ms "
+                                           f"(attempt {attempt + 1}/{attempts}), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                continue
+
+            elapsed = (time.perf_counter() - started) * 1000
+            observe_llm_request(provider, response.status_code, elapsed / 1000)
+            current_app.logger.info(f"{provider} chat completion: HTTP {response.status_code} in {elapsed:.0f} ms "
+                                    f"(attempt {attempt + 1}/{attempts})")
+
+            if response.status_code == 200:
+                return response.json()
+
+            if response.status_code in RETRY_STATUSES and attempt < attempts - 1:
+                delay = self._backoff(attempt, response.headers.get('Retry-After'))
+                current_app.logger.warning(f"{provider} returned HTTP {response.status_code}, "
+                                           f"retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            raise LLMAPIError(provider, response.status_code, response.text)
+
+llm_client = LLMClient()
@@ -0,0 +1,154 @@
+"""
+Prometheus metrics, served at /metrics in the text exposition format.
+
+Each gunicorn worker counts its own requests. With PROMETHEUS_MULTIPROC_DIR
+set (gunicorn.conf.py does this), prometheus_client keeps every worker's
+values in files in that directory and /metrics adds them all up, so the
+worker that answers a scrape reports for the whole service. Without the
+variable (flask run, manage.py) the process's own values are served.
+"""
+import hmac
+import os
+import time
+
+from flask import Response, abort, current_app, g, request
+from sqlalchemy import event
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge,
+                                   Histogram, REGISTRY, generate_latest, multiprocess)
+except ImportError:  # prometheus_client is optional; without it nothing is recorded
+    Counter = None
+
+from src.models import db
+
+# Request latency buckets in seconds; article generation runs on the job queue,
+# so requests themselves stay well under a minute
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Waiting for a pooled connection should take well under a millisecond
+POOL_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+# Chat completions take seconds to minutes
+LLM_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+# Where /metrics may be scraped from when no METRICS_TOKEN is configured
+LOCAL_ADDRESSES = {'127.0.0.1', '::1'}
+
+if Counter is not None:
+    REQUESTS = Counter('http_requests', 'HTTP responses by endpoint and status',
+                       ['endpoint', 'method', 'status'])
+    REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Time to produce a response',
+                                ['endpoint', 'method'], buckets=REQUEST_BUCKETS)
+
+    DB_CHECKOUTS = Counter('db_pool_checkouts', 'Connections taken from the SQLAlchemy pool')
+    DB_CHECKOUT_WAIT = Histogram('db_pool_checkout_wait_seconds',
+                                 'Time to get a connection: waiting for a free one or opening a new one',
+                                 buckets=POOL_BUCKETS)
+    DB_CHECKOUT_ERRORS = Counter('db_pool_checkout_errors', 'Connection checkouts that failed or timed out')
+    # livesum: add up the workers that are still running
+    DB_POOL_SIZE = Gauge('db_pool_size', 'Connections the pool keeps open', multiprocess_mode='livesum')
+    DB_CHECKED_OUT = Gauge('db_pool_checked_out', 'Connections in use', multiprocess_mode='livesum')
+    DB_OVERFLOW = Gauge('db_pool_overflow', 'Connections open beyond the pool size', multiprocess_mode='livesum')
+
+    LLM_REQUESTS = Counter('llm_requests', 'Upstream LLM API attempts by outcome (HTTP status, timeout or error)',
+                           ['provider', 'outcome'])
+    LLM_LATENCY = Histogram('llm_request_duration_seconds', 'Time per upstream LLM API attempt',
+                            ['provider'], buckets=LLM_BUCKETS)
+
+def init_metrics(app):
+    if Counter is None or not app.config['METRICS_ENABLED']:
+        return
+
+    with app.app_context():
+        _instrument_pool(db.engine)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        if request.endpoint == 'metrics':
+            return response
+        # Requests that matched no route share one label rather than one per URL
+        endpoint = request.endpoint or 'unmatched'
+        REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        started = g.get('metrics_started')
+        if started is not None:
+            REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+
+def metrics():
+    """
+    Every metric, summed over all workers when running multiprocess.
+
+    Hidden unless METRICS_TOKEN is set and the scrape sends it as a Bearer
+    token; without a token only requests from this host are answered.
+    """
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        if request.remote_addr not in LOCAL_ADDRESSES:
+            abort(404)
+    else:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+            abort(401)
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    response = Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def _instrument_pool(engine):
+    """Count checkouts and time how long each one waits"""
+    # create_app may run more than once against the same engine (e.g. manage.py)
+    if getattr(engine.raw_connection, 'metrics_timed', False):
+        return
+
+    def update_gauges():
+        pool = engine.pool
+        # Only QueuePool has a size limit to report on
+        if hasattr(pool, 'checkedout'):
+            DB_POOL_SIZE.set(pool.size())
+            DB_CHECKED_OUT.set(pool.checkedout())
+            DB_OVERFLOW.set(max(pool.overflow(), 0))
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_CHECKOUTS.inc()
+        update_gauges()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        update_gauges()
+
+    # Pool events fire once a connection is handed out, so the wait is timed
+    # around the engine's checkout instead
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        started = time.perf_counter()
+        try:
+            return raw_connection()
+        except Exception:
+            DB_CHECKOUT_ERRORS.inc()
+            raise
+        finally:
+            DB_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+    timed_raw_connection.metrics_timed = True
+    engine.raw_connection = timed_raw_connection
+
+def observe_llm_request(provider, outcome, seconds):
+    """Record one upstream API attempt; outcome is the HTTP status, 'timeout' or 'error'"""
+    if Counter is None:
+        return
+    LLM_REQUESTS.labels(provider, str(outcome)).inc()
+    LLM_LATENCY.labels(provider).observe(seconds)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Table, Index, PrimaryKeyConstraint, func, update, bindparam
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import re
@@ -9,14 +9,24 @@ from src.models import db
 post_tags = Table(
     'post_tags',
     db.metadata,
-    Column('post_id', Integer, ForeignKey('posts.id')),
-    Column('tag_id', Integer, ForeignKey('tags.id')),
+    Column('post_id', Integer, ForeignKey('posts.id'), nullable=False),
+    Column('tag_id', Integer, ForeignKey('tags.id'), nullable=False),
+    # Each pair once; the primary key serves post -> tags lookups
+    PrimaryKeyConstraint('post_id', 'tag_id', name='pk_post_tags'),
+    # Tag pages look posts up by tag
+    Index('ix_post_tags_tag_id', 'tag_id'),
     extend_existing=True
 )
 
 class Post(db.Model):
     __tablename__ = 'posts'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Public listings: published posts newest first, keyset on (created_at, id)
+        Index('ix_posts_published_created_at', 'published', 'created_at', 'id'),
+        # Category pages: the same, within one category
+        Index('ix_posts_category_published_created_at', 'category_id', 'published', 'created_at', 'id'),
+        {'extend_existing': True}
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(String(255), nullable=False)
@@ -28,6 +38,8 @@ class Post(db.Model):
     published = Column(Boolean, default=False)
     comments_enabled = Column(Boolean, default=True)
     views = Column(Integer, default=0)
+    rendered_html = Column(Text, nullable=True)  # Cached, sanitized HTML for markdown posts
+    rendered_fingerprint = Column(String(64), nullable=True)  # Renderer version + content hash
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -45,11 +57,31 @@ class Post(db.Model):
     def __repr__(self):
         return f'<Post {self.title}>'
 
+    def render_html(self):
+        """Render markdown content and store the result with its fingerprint"""
+        from src.utils import markdown_to_html, render_fingerprint
+        if self.content_format != 'markdown':
+            # HTML posts are served as is, so there is nothing to cache
+            self.rendered_html = None
+            self.rendered_fingerprint = None
+            return self.content
+
+        self.rendered_html = markdown_to_html(self.content)
+        self.rendered_fingerprint = render_fingerprint(self.content, self.content_format)
+        return self.rendered_html
+
     @property
     def html_content(self):
-        from src.utils import markdown_to_html
+        from src.utils import render_fingerprint
         # Only convert to HTML if format is markdown
         if self.content_format == 'markdown':
+            # Serve the stored HTML unless content, format or renderer changed
+            if (self.rendered_html is not None and
+                    self.rendered_fingerprint == render_fingerprint(self.content, self.content_format)):
+                return self.rendered_html
+            # Stale or missing: render for this request only, so reading a post
+            # never writes; `python manage.py render-posts` stores it
+            from src.utils import markdown_to_html
             return markdown_to_html(self.content)
         # Otherwise return the content as is (it's already HTML)
         return self.content
@@ -83,6 +115,7 @@ class Category(db.Model):
 
     @property
     def post_count(self):
+        # For listings use post_counts_by_category() to avoid one query per row
         return Post.query.filter_by(category_id=self.id, published=True).count()
 
 class Tag(db.Model):
@@ -106,11 +139,57 @@ class Tag(db.Model):
 
     @property
     def post_count(self):
-        return len([post for post in self.posts if post.published])
+        # Count in SQL rather than loading every post of the tag;
+        # for listings use post_counts_by_tag()
+        return db.session.query(func.count(Post.id)).join(
+            post_tags, post_tags.c.post_id == Post.id
+        ).filter(post_tags.c.tag_id == self.id, Post.published == True).scalar()
+
+def post_counts_by_category(published_only=True):
+    """Return {category_id: post count} for all categories in a single grouped query"""
+    query = db.session.query(Post.category_id, func.count(Post.id))
+    if published_only:
+        query = query.filter(Post.published == True)
+    return dict(query.group_by(Post.category_id).all())
+
+def post_counts_by_tag(published_only=True):
+    """Return {tag_id: post count} for all tags in a single grouped query"""
+    query = db.session.query(post_tags.c.tag_id, func.count(Post.id)).join(
+        Post, Post.id == post_tags.c.post_id
+    )
+    if published_only:
+        query = query.filter(Post.published == True)
+    return dict(query.group_by(post_tags.c.tag_id).all())
+
+def dashboard_counts():
+    """Return the admin dashboard's totals from one query of scalar subqueries"""
+    def count(model, *criteria):
+        query = db.select(func.count()).select_from(model)
+        if criteria:
+            query = query.where(*criteria)
+        return query.scalar_subquery()
+
+    row = db.session.execute(db.select(
+        count(Post).label('post_count'),
+        count(Post, Post.published == True).label('published_count'),
+        count(Category).label('category_count'),
+        count(Tag).label('tag_count'),
+        count(Comment).label('comment_count'),
+        count(Comment, Comment.approved == False).label('pending_comments')
+    )).one()
+    counts = dict(row._mapping)
+    counts['draft_count'] = counts['post_count'] - counts['published_count']
+    return counts
 
 class Comment(db.Model):
     __tablename__ = 'comments'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # A post's (approved) comments
+        Index('ix_comments_post_id_approved', 'post_id', 'approved'),
+        # Moderation queue and approved comment counts, newest first
+        Index('ix_comments_approved_created_at', 'approved', 'created_at'),
+        {'extend_existing': True}
+    )
 
     id = Column(Integer, primary_key=True)
     post_id = Column(Integer, ForeignKey('posts.id'), nullable=False)
@@ -125,3 +204,60 @@ class Comment(db.Model):
 
     def __repr__(self):
         return f'<Comment by {self.name} on {self.post.title}>'
+
+def approved_comment_count(post_id):
+    """Number of approved comments on a post; counted from ix_comments_post_id_approved alone"""
+    return db.session.query(func.count()).select_from(Comment).filter(
+        Comment.post_id == post_id, Comment.approved == True
+    ).scalar()
+
+def approved_comments(post_id, after_id=None, limit=20):
+    """
+    One chunk of a post's approved comments, oldest first.
+
+    after_id is the last comment id already shown. Unapproved comments are
+    never read, however many a post has. Returns (comments, has_more).
+    """
+    query = Comment.query.filter(Comment.post_id == post_id, Comment.approved == True)
+    if after_id is not None:
+        query = query.filter(Comment.id > after_id)
+    comments = query.order_by(Comment.id).limit(limit + 1).all()
+    return comments[:limit], len(comments) > limit
+
+def render_stale_posts(batch_size=100):
+    """
+    Store the rendered HTML of every markdown post whose stored render is
+    missing or out of date (e.g. after a RENDERER_VERSION bump).
+
+    Returns the number of posts rendered.
+    """
+    from src.utils import markdown_to_html, render_fingerprint
+    posts = Post.__table__
+    statement = update(posts).where(posts.c.id == bindparam('post_id')).values(
+        rendered_html=bindparam('html'),
+        rendered_fingerprint=bindparam('fingerprint'),
+        # Keep the onupdate hook from stamping updated_at, as the view counter does
+        updated_at=posts.c.updated_at
+    )
+
+    rendered = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(posts.c.id, posts.c.content, posts.c.content_format, posts.c.rendered_fingerprint)
+            .where(posts.c.id > last_id, posts.c.content_format == 'markdown')
+            .order_by(posts.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        params = []
+        for row in rows:
+            fingerprint = render_fingerprint(row.content, row.content_format)
+            if row.rendered_fingerprint != fingerprint:
+                params.append({'post_id': row.id, 'html': markdown_to_html(row.content), 'fingerprint': fingerprint})
+        if params:
+            db.session.execute(statement, params)
+            db.session.commit()
+            rendered += len(params)
+    return rendered
@@ -0,0 +1,34 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index
+from src.models import db
+
+class Document(db.Model):
+    """
+    Catalog entry for a file in the document manager, so listing it
+    doesn't touch the upload disk.
+    """
+    __tablename__ = 'documents'
+    __table_args__ = (
+        # Default listing: newest first
+        Index('ix_documents_modified_at', 'modified_at', 'id'),
+        {'extend_existing': True}
+    )
+
+    id = Column(Integer, primary_key=True)
+    filename = Column(String(255), unique=True, nullable=False)  # Name under UPLOAD_FOLDER/documents
+    original_name = Column(String(255), nullable=False)
+    extension = Column(String(20), nullable=False, default='', index=True)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+    modified_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    @property
+    def path(self):
+        """Stored upload path, as accepted by upload_url"""
+        return f"documents/{self.filename}"
+
+    @property
+    def size_kb(self):
+        return round(self.size_bytes / 1024, 2)
+
+    def __repr__(self):
+        return f'<Document {self.filename}>'
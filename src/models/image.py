@@ -0,0 +1,56 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy.orm import relationship
+from src.models import db
+
+class UploadedImage(db.Model):
+    """
+    An uploaded image and the state of its resized-variant job.
+    """
+    __tablename__ = 'uploaded_images'
+    __table_args__ = {'extend_existing': True}
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String(255), unique=True, nullable=False)  # As stored on posts, e.g. static/uploads/<name>
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    status = Column(String(20), nullable=False, default=QUEUED)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    variants = relationship('ImageVariant', back_populates='image', cascade='all, delete-orphan',
+                            order_by='ImageVariant.width')
+
+    @property
+    def is_active(self):
+        return self.status in (self.QUEUED, self.RUNNING)
+
+    def __repr__(self):
+        return f'<UploadedImage {self.path}>'
+
+class ImageVariant(db.Model):
+    """
+    A resized and/or re-encoded copy of an uploaded image.
+    """
+    __tablename__ = 'image_variants'
+    __table_args__ = {'extend_existing': True}
+
+    id = Column(Integer, primary_key=True)
+    image_id = Column(Integer, ForeignKey('uploaded_images.id', ondelete='CASCADE'), nullable=False, index=True)
+    path = Column(String(255), nullable=False)
+    format = Column(String(10), nullable=False)  # jpeg, png or webp
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=True)
+
+    image = relationship('UploadedImage', back_populates='variants')
+
+    def __repr__(self):
+        return f'<ImageVariant {self.path}>'
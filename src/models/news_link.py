@@ -1,14 +1,24 @@
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import validates
 from src import db
+from src.utils import url_hash
 
 class NewsLink(db.Model):
     """
     Model for news links to be tracked for article writing.
     """
     __tablename__ = 'news_links'
+    __table_args__ = (
+        db.UniqueConstraint('url_hash', name='uq_news_links_url_hash'),
+        # Admin list: newest first, keyset on (date_fetched, id)
+        db.Index('ix_news_links_date_fetched_id', 'date_fetched', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.Text, nullable=False)
+    # SHA-256 of the normalized URL, kept in sync by the url validator
+    url_hash = db.Column(db.String(64), nullable=True)
     date_of_article = db.Column(db.Date, nullable=True)
     date_fetched = db.Column(db.Date, nullable=True)
     article_written = db.Column(db.Boolean, default=False)
@@ -21,6 +31,11 @@ class NewsLink(db.Model):
         self.article_written = article_written
         self.focus_of_article = focus_of_article
     
+    @validates('url')
+    def _set_url_hash(self, key, url):
+        self.url_hash = url_hash(url)
+        return url
+    
     def to_dict(self):
         """
         Convert the model instance to a dictionary for JSON serialization.
@@ -33,3 +48,137 @@ class NewsLink(db.Model):
             'article_written': self.article_written,
             'focus_of_article': self.focus_of_article
         }
+
+def upsert_news_links(rows):
+    """
+    Insert news links, skipping any whose normalized URL is already stored.
+    
+    Args:
+        rows (list): dicts with url, date_of_article and date_fetched
+    
+    Runs as one multi-row statement in the current transaction; a stored
+    link only gains the incoming date_of_article if it had none.
+    """
+    if not rows:
+        return
+    table = NewsLink.__table__
+    values = [{
+        'url': row['url'],
+        'url_hash': url_hash(row['url']),
+        'date_of_article': row.get('date_of_article'),
+        'date_fetched': row.get('date_fetched') or datetime.now().date(),
+        'article_written': False
+    } for row in rows]
+    
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        statement = statement.on_duplicate_key_update(
+            date_of_article=func.coalesce(table.c.date_of_article, statement.inserted.date_of_article)
+        )
+    elif dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.url_hash],
+            set_={'date_of_article': func.coalesce(table.c.date_of_article, statement.excluded.date_of_article)}
+        )
+    else:
+        # No native upsert: drop the hashes that are already stored
+        stored = {h for (h,) in db.session.query(NewsLink.url_hash)
+                  .filter(NewsLink.url_hash.in_([v['url_hash'] for v in values])).all()}
+        values = [v for v in values if v['url_hash'] not in stored]
+        if not values:
+            return
+        statement = table.insert()
+    
+    db.session.execute(statement, values)
+
+def collapse_duplicate_links():
+    """
+    Merge news links that share a normalized URL into the oldest one.
+    
+    Backfills missing url_hash values first. The kept link inherits
+    article_written, focus_of_article and date_of_article from its
+    duplicates, and their article jobs are moved onto it.
+    
+    Returns:
+        int: the number of duplicate rows deleted
+    """
+    groups = {}
+    for link in NewsLink.query.order_by(NewsLink.id).all():
+        groups.setdefault(url_hash(link.url), []).append(link)
+    
+    removed = 0
+    for digest, links in groups.items():
+        keeper, duplicates = links[0], links[1:]
+        for duplicate in duplicates:
+            keeper.article_written = bool(keeper.article_written or duplicate.article_written)
+            keeper.focus_of_article = keeper.focus_of_article or duplicate.focus_of_article
+            keeper.date_of_article = keeper.date_of_article or duplicate.date_of_article
+            ArticleJob.query.filter_by(link_id=duplicate.id).update(
+                {'link_id': keeper.id}, synchronize_session=False
+            )
+            db.session.delete(duplicate)
+            removed += 1
+        
+        # Delete the duplicates before the keeper takes over their hash
+        db.session.flush()
+        keeper.url_hash = digest
+    
+    db.session.commit()
+    return removed
+
+class ArticleJob(db.Model):
+    """
+    A background article generation request for a news link.
+    """
+    __tablename__ = 'article_jobs'
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    link_id = db.Column(db.Integer, db.ForeignKey('news_links.id', ondelete='CASCADE'), nullable=False)
+    url = db.Column(db.Text, nullable=False)
+    focus_of_article = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=QUEUED)
+    error = db.Column(db.Text, nullable=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    post = db.relationship('Post')
+    
+    @property
+    def is_active(self):
+        return self.status in (self.QUEUED, self.RUNNING)
+    
+    def to_dict(self):
+        """
+        Convert the job to a dictionary for the status endpoint.
+        """
+        data = {
+            'id': self.id,
+            'link_id': self.link_id,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'post_id': self.post_id
+        }
+        if self.post is not None:
+            data.update({
+                'post_title': self.post.title,
+                'post_slug': self.post.slug,
+                'post_excerpt': self.post.excerpt
+            })
+        return data
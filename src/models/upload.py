@@ -0,0 +1,45 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey
+from sqlalchemy.orm import relationship
+from src.models import db
+
+class UploadBlob(db.Model):
+    """
+    Stored file content, named by its SHA-256 and shared by every upload of it.
+    """
+    __tablename__ = 'upload_blobs'
+    __table_args__ = {'extend_existing': True}
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    path = Column(String(255), nullable=False)  # Relative to UPLOAD_FOLDER, e.g. blobs/ab/<sha256>.png
+    size_bytes = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    references = relationship('UploadReference', back_populates='blob')
+
+    def __repr__(self):
+        return f'<UploadBlob {self.sha256}>'
+
+class UploadReference(db.Model):
+    """
+    A logical upload name, as stored on posts and documents, pointing at a blob.
+    """
+    __tablename__ = 'upload_references'
+    __table_args__ = {'extend_existing': True}
+
+    IMAGE = 'image'
+    DOCUMENT = 'document'
+    VARIANT = 'variant'  # Resized/re-encoded copy of an image, see src/images.py
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), unique=True, nullable=False)  # Relative to UPLOAD_FOLDER, e.g. documents/<name>
+    blob_id = Column(Integer, ForeignKey('upload_blobs.id'), nullable=False, index=True)
+    kind = Column(String(20), nullable=False)
+    original_filename = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    blob = relationship('UploadBlob', back_populates='references')
+
+    def __repr__(self):
+        return f'<UploadReference {self.name}>'
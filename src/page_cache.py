@@ -0,0 +1,139 @@
+import hashlib
+import os
+import tempfile
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, g, request, session, Response
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+
+from src.cache import ProcessCache
+
+# Rendered public pages for anonymous visitors, keyed by path + query string.
+# Each worker has its own copy; invalidate_pages() replaces the file at
+# PAGE_CACHE_STAMP_FILE so the other workers drop theirs on their next request
+page_cache = ProcessCache(ttl=300, max_entries=500)
+
+# (cache, stamp file path) -> the (inode, mtime) that cache last acted on
+_seen_stamps = {}
+
+# Stands in for the per-session CSRF token inside cached HTML
+CSRF_PLACEHOLDER = '__PAGE_CACHE_CSRF_TOKEN__'
+
+class CachedPage:
+    """A rendered response body plus the validators sent with it"""
+    def __init__(self, body, mimetype, etag, last_modified, view_post_id=None):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.last_modified = last_modified
+        self.view_post_id = view_post_id
+
+def init_page_cache(app):
+    page_cache.ttl = app.config['PAGE_CACHE_TTL']
+    os.makedirs(os.path.dirname(app.config['PAGE_CACHE_STAMP_FILE']), exist_ok=True)
+
+def _stamp(path):
+    try:
+        stats = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stats.st_ino, stats.st_mtime_ns
+
+def invalidate_pages():
+    """Call after any change that is visible on public pages; reaches every worker"""
+    page_cache.invalidate()
+    path = current_app.config['PAGE_CACHE_STAMP_FILE']
+    try:
+        # A new file each time, so the inode changes even where mtimes are coarse
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.page-cache-')
+        os.close(handle)
+        os.replace(temp_path, path)
+    except OSError as e:
+        current_app.logger.error(f"Error updating page cache stamp: {str(e)}")
+        return
+    _seen_stamps[(id(page_cache), path)] = _stamp(path)
+
+def sync_with_page_invalidations(cache):
+    """
+    Clear cache if any worker called invalidate_pages() since it last looked.
+
+    For other per-worker caches of things shown on public pages, which
+    their own changes invalidate through invalidate_pages() too.
+    """
+    path = current_app.config['PAGE_CACHE_STAMP_FILE']
+    stamp = _stamp(path)
+    key = (id(cache), path)
+    if stamp != _seen_stamps.get(key):
+        cache.invalidate()
+        _seen_stamps[key] = stamp
+
+def _sync_invalidations():
+    """Drop this worker's pages if another worker invalidated them since we last looked"""
+    sync_with_page_invalidations(page_cache)
+
+def _bypass():
+    # Logged-in admins see unpublished posts and edit buttons, and pending
+    # flash messages are per visitor, so neither may be served from or stored in the cache
+    return (not current_app.config['PAGE_CACHE_ENABLED'] or
+            request.method != 'GET' or
+            current_user.is_authenticated or
+            '_flashes' in session)
+
+def _serve(entry, status):
+    body = entry.body
+    if CSRF_PLACEHOLDER in body:
+        # Every visitor gets a token bound to their own session
+        body = body.replace(CSRF_PLACEHOLDER, generate_csrf())
+    response = Response(body, status=200, mimetype=entry.mimetype)
+    # Bodies differ by CSRF token, so the ETag is weak
+    response.set_etag(entry.etag, weak=True)
+    response.last_modified = entry.last_modified
+    # Browsers must revalidate, and shared caches must not store per-session tokens
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Vary'] = 'Cookie'
+    response.headers['X-Page-Cache'] = status
+    return response.make_conditional(request)
+
+def cached_page(view):
+    """Serve anonymous GETs of a public page from page_cache with ETag/Last-Modified"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if _bypass():
+            return view(*args, **kwargs)
+
+        _sync_invalidations()
+        key = request.full_path
+        entry = page_cache.get(key)
+        if entry is not None:
+            if entry.view_post_id is not None:
+                # The view function is skipped, so count the post view here
+                from src.view_counter import view_counter
+                view_counter.record(entry.view_post_id, request)
+            return _serve(entry, 'HIT')
+
+        generation = page_cache.generation
+        response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.direct_passthrough or _bypass():
+            return response
+
+        body = response.get_data(as_text=True)
+        token = g.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))
+        if token:
+            body = body.replace(token, CSRF_PLACEHOLDER)
+
+        entry = CachedPage(
+            body,
+            response.mimetype,
+            hashlib.sha1(body.encode('utf-8')).hexdigest(),
+            datetime.now(timezone.utc).replace(microsecond=0),
+            g.get('view_post_id')
+        )
+        # Don't store a page rendered from data that was invalidated meanwhile,
+        # here or in another worker
+        _sync_invalidations()
+        if page_cache.generation == generation:
+            page_cache.set(key, entry)
+        return _serve(entry, 'MISS')
+    return wrapper
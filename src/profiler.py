@@ -0,0 +1,281 @@
+"""
+On-demand sampling profiler for single requests.
+
+A logged-in admin triggers it by sending a signed token from the admin
+Profiles page in an X-Profile header, or by switching profiling on for
+their own session. The token only works in the session of the admin it
+was issued to, so a leaked token profiles nothing. While a profiled
+request runs, a background thread samples the request thread's stack
+every PROFILER_INTERVAL_MS. The result is saved under PROFILER_FOLDER as a
+speedscope file (https://www.speedscope.app) plus a summary that splits the
+time between SQL, templates, markdown/bleach, outbound HTTP and the rest.
+
+Requests without a session cookie pay for one cookie lookup.
+"""
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, request, session
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+PROFILE_HEADER = 'X-Profile'
+
+# Session key holding the time profiling of the admin's own requests ends
+SESSION_KEY = 'profile_until'
+
+# Endpoints never profiled: the profile pages themselves and things that
+# never do interesting work
+SKIP_ENDPOINTS = {'static', 'metrics', 'admin.profiles', 'admin.download_profile',
+                  'admin.remove_profile', 'admin.profile_session'}
+
+# Time is charged to the innermost frame whose file matches one of these
+CATEGORIES = [
+    ('sql', ('/sqlalchemy/', '/pymysql/', '/psycopg2/', '/sqlite3/')),
+    ('templates', ('/jinja2/', '.html')),
+    ('markdown', ('/markdown/', '/bleach/', '/html5lib/')),
+    ('http', ('/requests/', '/urllib3/', '/http/client.py'))
+]
+CATEGORY_NAMES = [name for name, _ in CATEGORIES] + ['other']
+
+_PROFILE_ID_RE = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+
+def _category(filename):
+    filename = filename.replace('\\', '/')
+    for name, patterns in CATEGORIES:
+        if any(pattern in filename for pattern in patterns):
+            return name
+    return None
+
+class SamplingProfiler:
+    """Samples one thread's Python stack from a background thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = []          # speedscope frames
+        self._frame_ids = {}      # code object -> (frame index, category)
+        self.samples = []         # frame index lists, root first
+        self.weights = []         # milliseconds per sample
+        self.categories = Counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = self._last = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _frame(self, code):
+        known = self._frame_ids.get(code)
+        if known is None:
+            self.frames.append({
+                'name': getattr(code, 'co_qualname', code.co_name),
+                'file': code.co_filename,
+                'line': code.co_firstlineno
+            })
+            known = self._frame_ids[code] = (len(self.frames) - 1, _category(code.co_filename))
+        return known
+
+    def _sample(self):
+        now = time.perf_counter()
+        weight = (now - self._last) * 1000
+        self._last = now
+
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        category = None
+        while frame is not None:
+            index, frame_category = self._frame(frame.f_code)
+            stack.append(index)
+            if category is None:
+                category = frame_category
+            frame = frame.f_back
+        if not stack:
+            return
+        stack.reverse()
+
+        self.categories[category or 'other'] += weight
+        # Consecutive identical stacks become one longer sample
+        if self.samples and self.samples[-1] == stack:
+            self.weights[-1] += weight
+        else:
+            self.samples.append(stack)
+            self.weights.append(weight)
+
+    def speedscope(self, name):
+        """The samples in speedscope's file format"""
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(self.weights), 3),
+                'samples': self.samples,
+                'weights': [round(weight, 3) for weight in self.weights]
+            }],
+            'name': name,
+            'activeProfileIndex': 0,
+            'exporter': 'DevLegalWeb request profiler'
+        }
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='request-profiler')
+
+def profile_token(user_id):
+    """Signed token that profiles user_id's requests carrying it, for PROFILER_TOKEN_MAX_AGE"""
+    return _serializer().dumps({'user': user_id})
+
+def _profile_requested():
+    if request.endpoint in SKIP_ENDPOINTS:
+        return False
+    # Only look inside sessions that exist, so anonymous visitors skip this
+    if request.cookies.get(current_app.config['SESSION_COOKIE_NAME']) is None:
+        return False
+    if not (current_user.is_authenticated and current_user.is_admin):
+        return False
+    token = request.headers.get(PROFILE_HEADER)
+    if token:
+        try:
+            payload = _serializer().loads(token, max_age=current_app.config['PROFILER_TOKEN_MAX_AGE'])
+        except BadSignature:
+            return False
+        # Bound to the admin it was issued to
+        return payload.get('user') == current_user.id
+    return session.get(SESSION_KEY, 0) > time.time()
+
+def init_profiler(app):
+    if not app.config['PROFILER_ENABLED']:
+        return
+
+    @app.before_request
+    def start_profiler():
+        if _profile_requested():
+            g.profiler = SamplingProfiler(threading.get_ident(), current_app.config['PROFILER_INTERVAL_MS'] / 1000)
+            g.profiler.start()
+
+    @app.after_request
+    def save_request_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.stop()
+        try:
+            profile_id = save_profile(profiler, response)
+        except OSError as e:
+            current_app.logger.error(f"Error saving request profile: {str(e)}")
+            return response
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # A request that failed before after_request still stops its sampler
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+
+def _profiled_path():
+    """The request path and its query string, if any"""
+    query = request.query_string.decode('utf-8', 'replace')
+    return f"{request.path}?{query}" if query else request.path
+
+def save_profile(profiler, response):
+    """Write the speedscope file and its summary; returns the profile id"""
+    folder = current_app.config['PROFILER_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{secrets.token_hex(4)}"
+    path = _profiled_path()
+
+    query_stats = g.get('query_stats')
+    summary = {
+        'id': profile_id,
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'method': request.method,
+        'path': path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'user': current_user.username if current_user.is_authenticated else None,
+        'duration_ms': round(profiler.duration * 1000, 1),
+        'samples': len(profiler.weights),
+        'interval_ms': current_app.config['PROFILER_INTERVAL_MS'],
+        'categories': {name: round(profiler.categories.get(name, 0), 1) for name in CATEGORY_NAMES},
+        # Counted by src.query_stats, independent of sampling
+        'queries': query_stats.count if query_stats is not None else None,
+        'db_ms': round(query_stats.db_seconds * 1000, 1) if query_stats is not None else None
+    }
+
+    with open(os.path.join(folder, f"{profile_id}.speedscope.json"), 'w') as f:
+        json.dump(profiler.speedscope(f"{request.method} {path}"), f, separators=(',', ':'))
+    with open(os.path.join(folder, f"{profile_id}.json"), 'w') as f:
+        json.dump(summary, f)
+
+    current_app.logger.info(f"Saved request profile {profile_id} for {request.method} {path} "
+                            f"({summary['duration_ms']} ms, {summary['samples']} samples)")
+    _prune(folder, current_app.config['PROFILER_MAX_PROFILES'])
+    return profile_id
+
+def _profile_ids(folder):
+    """Stored profile ids, newest first"""
+    if not os.path.isdir(folder):
+        return []
+    ids = [name[:-len('.json')] for name in os.listdir(folder)
+           if name.endswith('.json') and not name.endswith('.speedscope.json')]
+    return sorted((profile_id for profile_id in ids if _PROFILE_ID_RE.match(profile_id)), reverse=True)
+
+def _prune(folder, keep):
+    for profile_id in _profile_ids(folder)[keep:]:
+        delete_profile(profile_id)
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first"""
+    folder = current_app.config['PROFILER_FOLDER']
+    profiles = []
+    for profile_id in _profile_ids(folder):
+        try:
+            with open(os.path.join(folder, f"{profile_id}.json")) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            # Deleted or half-written by another worker
+            continue
+    return profiles
+
+def profile_path(profile_id):
+    """Path of a stored speedscope file, or None for an unknown id"""
+    if not _PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(current_app.config['PROFILER_FOLDER'], f"{profile_id}.speedscope.json")
+    return path if os.path.isfile(path) else None
+
+def delete_profile(profile_id):
+    if not _PROFILE_ID_RE.match(profile_id):
+        return
+    folder = current_app.config['PROFILER_FOLDER']
+    for name in (f"{profile_id}.json", f"{profile_id}.speedscope.json"):
+        try:
+            os.remove(os.path.join(folder, name))
+        except FileNotFoundError:
+            pass
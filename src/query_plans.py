@@ -0,0 +1,201 @@
+"""
+EXPLAIN-based check that the hot routes' queries use the indexes declared
+on the models. Runs against scratch data so it never touches the
+application database.
+"""
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+# (route, path, admin session needed, index some query on the page must use)
+INDEX_EXPECTATIONS = [
+    ('blog.index', '/blog/', False, 'ix_posts_published_created_at'),
+    ('blog.category', '/blog/category/category-1', False, 'ix_posts_category_published_created_at'),
+    ('blog.tag', '/blog/tag/tag-1', False, 'ix_post_tags_tag_id'),
+    ('blog.post', '/blog/post/post-1', False, 'ix_comments_post_id_approved'),
+    ('admin.dashboard', '/admin/', True, 'ix_comments_approved_created_at'),
+    ('news_links.get_links', '/admin/news-links/api/links', True, 'ix_news_links_date_fetched_id'),
+]
+
+def _seed(db, posts=2000, seed=7):
+    """Enough rows that the planners prefer an index to a scan"""
+    from werkzeug.security import generate_password_hash
+    from src.models.user import User
+    from src.models.blog import Post, Category, Tag, Comment, post_tags
+    from src.models.news_link import NewsLink
+
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    db.session.add(User(username='plans', password_hash=generate_password_hash('plans'), is_admin=True))
+    db.session.execute(Category.__table__.insert(), [
+        {'id': i, 'name': f"Category {i}", 'slug': f"category-{i}"} for i in range(1, 11)
+    ])
+    db.session.execute(Tag.__table__.insert(), [
+        {'id': i, 'name': f"Tag {i}", 'slug': f"tag-{i}"} for i in range(1, 51)
+    ])
+    db.session.execute(Post.__table__.insert(), [{
+        'id': i,
+        'title': f"Post {i}",
+        'slug': f"post-{i}",
+        'content': f"<p>Post {i}</p>",
+        'content_format': 'html',
+        # post-1 is the post page checked below
+        'published': rng.random() < 0.8 or i == 1,
+        'comments_enabled': True,
+        'views': 0,
+        'category_id': rng.randint(1, 10),
+        'created_at': base + timedelta(hours=i),
+        'updated_at': base + timedelta(hours=i)
+    } for i in range(1, posts + 1)])
+    db.session.execute(post_tags.insert(), [
+        {'post_id': i, 'tag_id': tag_id}
+        for i in range(1, posts + 1) for tag_id in rng.sample(range(1, 51), 3)
+    ])
+    db.session.execute(Comment.__table__.insert(), [{
+        'post_id': rng.randint(1, posts),
+        'name': 'Reader',
+        'email': 'reader@example.com',
+        'content': 'Comment',
+        'approved': rng.random() < 0.9,
+        'created_at': base + timedelta(minutes=i)
+    } for i in range(posts * 2)])
+    db.session.execute(NewsLink.__table__.insert(), [{
+        'url': f"https://example.com/{i}",
+        'url_hash': f"{i:064x}",
+        'date_fetched': (base + timedelta(days=i // 10)).date(),
+        'article_written': False
+    } for i in range(posts)])
+    db.session.commit()
+
+def _analyze(connection):
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        for table in ('posts', 'post_tags', 'comments', 'news_links'):
+            connection.exec_driver_sql(f"ANALYZE TABLE {table}")
+    else:
+        connection.exec_driver_sql("ANALYZE")
+
+def explain(connection, statement, parameters):
+    """Return the query plan for a captured statement as one string"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        return '\n'.join(str(row[-1]) for row in rows)
+    if dialect == 'mysql':
+        result = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return '\n'.join(f"{row['table']}: key={row['key']}" for row in result.mappings())
+    rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+    return '\n'.join(row[0] for row in rows)
+
+@contextmanager
+def _captured_selects(engine):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+@contextmanager
+def scratch_app(database_url=None):
+    """
+    An app on seeded scratch data, with an anonymous and a logged-in admin
+    test client. Yields (app, anonymous, admin).
+
+    Uses a temporary SQLite file unless database_url points at a scratch
+    PostgreSQL/MySQL database (its tables are dropped and recreated).
+    """
+    from src import create_app
+    from src.models import db
+
+    scratch_dir = None
+    url = database_url
+    if not url:
+        scratch_dir = tempfile.mkdtemp(prefix='query-plans-')
+        url = f"sqlite:///{os.path.join(scratch_dir, 'plans.db')}"
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': url,
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'PAGE_CACHE_ENABLED': False,
+        'SEARCH_BACKEND': 'ilike'
+    })
+    try:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            _seed(db)
+            with db.engine.begin() as connection:
+                _analyze(connection)
+            db.session.remove()
+
+        # Start cold: an earlier scratch app in this process (e.g. another
+        # check in the same test run) left its own rows in the caches
+        from src.cache import taxonomy_cache, post_count_cache, dashboard_cache
+        for cache in (taxonomy_cache, post_count_cache, dashboard_cache):
+            cache.invalidate()
+
+        anonymous = app.test_client()
+        admin = app.test_client()
+        admin.post('/admin/login', data={'username': 'plans', 'password': 'plans'})
+        yield app, anonymous, admin
+
+        # Write the post page's buffered views before their table goes away
+        from src.view_counter import view_counter
+        view_counter.flush()
+
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+    finally:
+        if scratch_dir:
+            os.remove(os.path.join(scratch_dir, 'plans.db'))
+            os.rmdir(scratch_dir)
+
+def check_index_usage(database_url=None, echo=print):
+    """
+    Request each route in INDEX_EXPECTATIONS and EXPLAIN the SELECTs it ran.
+
+    See scratch_app for the database used. Returns the list of
+    (route, index) pairs whose index no plan used.
+    """
+    from src.models import db
+
+    failures = []
+    with scratch_app(database_url) as (app, anonymous, admin):
+        with app.app_context():
+            engine = db.engine
+        echo(f"{'route':<22} {'index':<40} result ({engine.dialect.name})")
+        for route, path, needs_admin, index_name in INDEX_EXPECTATIONS:
+            with _captured_selects(engine) as statements:
+                response = (admin if needs_admin else anonymous).get(path)
+            if response.status_code != 200:
+                failures.append((route, index_name))
+                echo(f"{route:<22} {index_name:<40} FAIL (HTTP {response.status_code})")
+                continue
+
+            with engine.connect() as connection:
+                if connection.dialect.name == 'postgresql':
+                    # Judge whether an index is usable, not whether it is cheaper than a scan
+                    connection.exec_driver_sql("SET enable_seqscan = off")
+                plans = [explain(connection, statement, parameters) for statement, parameters in statements]
+
+            if any(index_name in plan for plan in plans):
+                echo(f"{route:<22} {index_name:<40} ok")
+            else:
+                failures.append((route, index_name))
+                echo(f"{route:<22} {index_name:<40} FAIL")
+                for plan in plans:
+                    echo('    ' + plan.replace('\n', '\n    '))
+    return failures
@@ -0,0 +1,186 @@
+"""
+Per-request SQL instrumentation.
+
+Engine events count every statement a request runs and time it. Each
+response carries a Server-Timing header (db time, query count, total
+time). Requests that are slow, run too many queries, or repeat one
+statement shape many times (the signature of a lazy-load N+1) are
+logged with their most repeated statements. assert_max_queries() and
+check_query_budgets() turn the same counts into failures for tests and CI.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from src.models import db
+
+# Literals that vary between otherwise identical statements
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+# Expanded IN lists: (?, ?, ?) or (%(p_1)s, %(p_2)s)
+_PARAM_LIST_RE = re.compile(r'\((?:\s*(?:\?|%\([^)]*\)s|:\w+)\s*,)+\s*(?:\?|%\([^)]*\)s|:\w+)\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+# (route, path, admin session needed, most queries the page may run). Routes
+# run in this order, so the first ones also load the cold taxonomy caches.
+# Budgets are two over the measured counts: an extra lookup doesn't fail the
+# check, a per-row lazy load over a seeded page of posts still does
+QUERY_BUDGETS = [
+    ('blog.index', '/blog/', False, 6),
+    ('blog.category', '/blog/category/category-1', False, 5),
+    ('blog.tag', '/blog/tag/tag-1', False, 6),
+    ('blog.post', '/blog/post/post-1', False, 7),
+    ('blog.search', '/blog/search?q=Post', False, 6),
+    ('admin.dashboard', '/admin/', True, 6),
+    ('admin.posts', '/admin/posts', True, 6),
+    ('admin.comments', '/admin/comments', True, 6),
+    ('admin.categories', '/admin/categories', True, 5),
+    ('admin.tags', '/admin/tags', True, 5),
+    ('news_links.get_links', '/admin/news-links/api/links', True, 4),
+]
+
+def fingerprint(statement):
+    """Statement shape with literals and IN-list lengths removed"""
+    statement = _STRING_RE.sub('?', statement)
+    statement = _NUMBER_RE.sub('N', statement)
+    statement = _PARAM_LIST_RE.sub('(...)', statement)
+    return _SPACE_RE.sub(' ', statement).strip()
+
+class QueryStats:
+    """Statements run while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_seconds = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.db_seconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        """(fingerprint, count) for shapes run at least threshold times, most frequent first"""
+        return [(shape, n) for shape, n in self.fingerprints.most_common() if n >= threshold]
+
+    def server_timing(self):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return (f'db;dur={self.db_seconds * 1000:.1f};desc="{self.count} queries", '
+                f'app;dur={total_ms:.1f}')
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    # Job queue and CLI threads have no request to charge the query to
+    if has_request_context():
+        stats = g.get('query_stats')
+        if stats is not None:
+            stats.record(statement, time.perf_counter() - started)
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    # so the pooled connection's stack doesn't grow
+    connection = context.connection
+    if connection is not None and connection.info.get('query_start'):
+        connection.info['query_start'].pop()
+
+def init_query_stats(app):
+    if not app.config['QUERY_STATS_ENABLED']:
+        return
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+        response.headers['Server-Timing'] = stats.server_timing()
+
+        elapsed_ms = (time.perf_counter() - stats.started) * 1000
+        repeated = stats.repeated(current_app.config['QUERY_REPEAT_THRESHOLD'])
+        if (elapsed_ms >= current_app.config['SLOW_REQUEST_MS'] or
+                stats.count >= current_app.config['SLOW_REQUEST_QUERIES'] or repeated):
+            lines = [f"{n}x {shape[:200]}" for shape, n in (repeated or stats.fingerprints.most_common(3))]
+            current_app.logger.warning(
+                f"Slow request {request.method} {request.full_path} ({request.endpoint}): "
+                f"{elapsed_ms:.0f} ms, {stats.count} queries, {stats.db_seconds * 1000:.0f} ms in the database"
+                + (" - repeated statements (possible N+1):" if repeated else " - most frequent statements:")
+                + ''.join(f"\n    {line}" for line in lines)
+            )
+        return response
+
+@contextmanager
+def assert_max_queries(n, engine=None):
+    """
+    Fail if the block runs more than n SQL statements on engine (db.engine
+    by default), listing the statements that repeated. Yields the list of
+    statements seen so far.
+
+        with assert_max_queries(5):
+            client.get('/blog/')
+    """
+    engine = engine if engine is not None else db.engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    if len(statements) > n:
+        shapes = Counter(fingerprint(statement) for statement in statements).most_common(5)
+        raise AssertionError(
+            f"{len(statements)} queries ran, expected at most {n}; most frequent:"
+            + ''.join(f"\n    {count}x {shape[:200]}" for shape, count in shapes)
+        )
+
+def check_query_budgets(database_url=None, echo=print):
+    """
+    Request each route in QUERY_BUDGETS against scratch data and compare
+    its query count with the budget.
+
+    Returns the list of (route, queries, budget) that went over.
+    """
+    from src.query_plans import scratch_app
+
+    failures = []
+    with scratch_app(database_url) as (app, anonymous, admin):
+        with app.app_context():
+            engine = db.engine
+        echo(f"{'route':<22} {'queries':>7} {'budget':>6} result")
+        for route, path, needs_admin, budget in QUERY_BUDGETS:
+            client = admin if needs_admin else anonymous
+            try:
+                with assert_max_queries(budget, engine) as statements:
+                    response = client.get(path)
+            except AssertionError as e:
+                failures.append((route, len(statements), budget))
+                echo(f"{route:<22} {len(statements):>7} {budget:>6} FAIL")
+                echo('    ' + str(e).replace('\n', '\n    '))
+                continue
+            if response.status_code != 200:
+                failures.append((route, len(statements), budget))
+                echo(f"{route:<22} {len(statements):>7} {budget:>6} FAIL (HTTP {response.status_code})")
+                continue
+            echo(f"{route:<22} {len(statements):>7} {budget:>6} ok")
+    return failures
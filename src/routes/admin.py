@@ -1,14 +1,24 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify,
+                   session, send_file, abort)
 from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy.orm import selectinload
 from werkzeug.security import check_password_hash, generate_password_hash
-from werkzeug.utils import secure_filename
 from src.models.user import User
-from src.models.blog import Post, Category, Tag, Comment
+from src.models.blog import Post, Category, Tag, Comment, post_counts_by_category, post_counts_by_tag
 from src.models import db
+from src.cache import (taxonomy_cache, invalidate_categories, invalidate_tags, invalidate_post_counts,
+                       invalidate_dashboard_stats, get_dashboard_stats)
+from src.page_cache import page_cache, invalidate_pages
+from src.images import queue_image_variants
+from src.uploads import upload_url
+from src.storage import store_upload, UploadTooLarge
+from src.models.upload import UploadReference
+from src.profiler import (list_profiles, profile_path, delete_profile, profile_token,
+                          SESSION_KEY as PROFILE_SESSION_KEY, PROFILE_HEADER, CATEGORY_NAMES)
 import os
 from datetime import datetime
-import uuid
 import re
+import time
 import traceback
 
 # Create blueprint
@@ -25,35 +35,22 @@ def save_image(file):
     current_app.logger.info(f"File: {file.filename if file else 'None'}")
     
     if file and allowed_file(file.filename):
-        # Generate a secure filename with a unique identifier
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        current_app.logger.info(f"Generated unique filename: {unique_filename}")
-        
-        # Use the app's configured upload folder (which will be the persistent disk on Render)
-        uploads_dir = current_app.config['UPLOAD_FOLDER']
-        current_app.logger.info(f"Upload directory: {uploads_dir}")
-        current_app.logger.info(f"Directory exists: {os.path.exists(uploads_dir)}")
-        
-        os.makedirs(uploads_dir, exist_ok=True)
-        current_app.logger.info(f"Directory created/verified")
-        
-        # Save the file to the configured upload folder
-        file_path = os.path.join(uploads_dir, unique_filename)
-        current_app.logger.info(f"Full file path: {file_path}")
-        
+        # Stored by content: re-uploading the same image reuses the existing copy
         try:
-            file.save(file_path)
-            current_app.logger.info(f"File saved successfully")
-            current_app.logger.info(f"File exists after save: {os.path.exists(file_path)}")
+            stored_name = store_upload(file, UploadReference.IMAGE, current_app.config['UPLOAD_MAX_IMAGE_BYTES'])
+        except UploadTooLarge:
+            raise
         except Exception as e:
             current_app.logger.error(f"Error saving file: {str(e)}")
             current_app.logger.error(traceback.format_exc())
             return None
         
         # Return the relative path using the configured URL path
-        relative_path = f"{current_app.config['UPLOADS_URL_PATH'].strip('/')}/{unique_filename}"
+        relative_path = f"{current_app.config['UPLOADS_URL_PATH'].strip('/')}/{stored_name}"
         current_app.logger.info(f"Returning relative path: {relative_path}")
+        
+        # Resized and WebP copies are made in the background
+        queue_image_variants(relative_path)
         return relative_path
     
     current_app.logger.error(f"File validation failed: {file.filename if file else 'None'}")
@@ -82,7 +79,7 @@ def upload_image():
         file_path = save_image(file)
         if file_path:
             # Return the URL for the uploaded image in Quill format
-            result_url = url_for('static', filename=file_path) if file_path.startswith('uploads/') else file_path
+            result_url = upload_url(file_path)
             current_app.logger.info(f"Returning URL: {result_url}")
             
             return jsonify({
@@ -112,8 +109,8 @@ def upload_content_image():
             # Return both the full URL and the filename for different insertion formats
             return jsonify({
                 'success': True,
-                'url': url_for('static', filename=file_path, _external=True),
-                'relative_url': url_for('static', filename=file_path),
+                'url': upload_url(file_path, _external=True),
+                'relative_url': upload_url(file_path),
                 'filename': os.path.basename(file_path)
             })
     
@@ -154,32 +151,13 @@ def logout():
 @login_required
 def dashboard():
     """Admin dashboard"""
-    # Get statistics
-    post_count = Post.query.count()
-    published_count = Post.query.filter_by(published=True).count()
-    draft_count = post_count - published_count
-    category_count = Category.query.count()
-    tag_count = Tag.query.count()
-    comment_count = Comment.query.count()
-    pending_comments = Comment.query.filter_by(approved=False).count()
-    
-    # Get recent posts
-    recent_posts = Post.query.order_by(Post.created_at.desc()).limit(5).all()
-    
-    # Get recent comments
-    recent_comments = Comment.query.order_by(Comment.created_at.desc()).limit(5).all()
+    # Counts come from one aggregate query, cached for DASHBOARD_STATS_TTL seconds
+    stats = get_dashboard_stats()
     
     return render_template('admin/index.html',
                           title="Admin Dashboard",
-                          post_count=post_count,
-                          published_count=published_count,
-                          draft_count=draft_count,
-                          category_count=category_count,
-                          tag_count=tag_count,
-                          comment_count=comment_count,
-                          pending_comments=pending_comments,
-                          recent_posts=recent_posts,
-                          recent_comments=recent_comments)
+                          user=current_user,
+                          **stats)
 
 @admin_bp.route('/posts')
 @login_required
@@ -188,7 +166,8 @@ def posts():
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
-    posts = Post.query.order_by(Post.created_at.desc()).paginate(page=page, per_page=per_page)
+    # Categories for the whole page in one query rather than one per row
+    posts = Post.query.options(selectinload(Post.category)).order_by(Post.created_at.desc()).paginate(page=page, per_page=per_page)
     
     return render_template('admin/posts.html', title="Manage Posts", posts=posts)
 
@@ -252,8 +231,13 @@ def new_post():
             if tag:
                 post.tags.append(tag)
         
+        # Render markdown once at save time rather than on every page view
+        post.render_html()
+        
         db.session.add(post)
         db.session.commit()
+        invalidate_post_counts()
+        invalidate_pages()
         
         flash('Post created successfully!', 'success')
         return redirect(url_for('admin.posts'))
@@ -309,7 +293,12 @@ def edit_post(post_id):
             if tag:
                 post.tags.append(tag)
         
+        # Re-render the stored HTML for the updated content
+        post.render_html()
+        
         db.session.commit()
+        invalidate_post_counts()
+        invalidate_pages()
         flash('Post updated successfully!', 'success')
         return redirect(url_for('admin.posts'))
     
@@ -323,6 +312,8 @@ def delete_post(post_id):
     
     db.session.delete(post)
     db.session.commit()
+    invalidate_post_counts()
+    invalidate_pages()
     
     flash('Post deleted successfully!', 'success')
     return redirect(url_for('admin.posts'))
@@ -332,7 +323,9 @@ def delete_post(post_id):
 def categories():
     """Manage categories"""
     categories = Category.query.all()
-    return render_template('admin/categories.html', title="Manage Categories", categories=categories)
+    # One grouped COUNT for all categories instead of one query per row
+    post_counts = post_counts_by_category()
+    return render_template('admin/categories.html', title="Manage Categories", categories=categories, post_counts=post_counts)
 
 @admin_bp.route('/category/new', methods=['GET', 'POST'])
 @login_required
@@ -350,6 +343,8 @@ def new_category():
         category = Category(name=name, slug=slug, description=description)
         db.session.add(category)
         db.session.commit()
+        invalidate_categories()
+        invalidate_pages()
         
         flash('Category created successfully!', 'success')
         return redirect(url_for('admin.categories'))
@@ -368,6 +363,8 @@ def edit_category(category_id):
         category.description = request.form.get('description')
         
         db.session.commit()
+        invalidate_categories()
+        invalidate_pages()
         flash('Category updated successfully!', 'success')
         return redirect(url_for('admin.categories'))
     
@@ -379,13 +376,15 @@ def delete_category(category_id):
     """Delete a category"""
     category = Category.query.get_or_404(category_id)
     
-    # Check if category has posts
-    if category.posts:
+    # Check if category has posts (without loading them all)
+    if Post.query.filter_by(category_id=category.id).first():
         flash('Cannot delete category with associated posts.', 'error')
         return redirect(url_for('admin.categories'))
     
     db.session.delete(category)
     db.session.commit()
+    invalidate_categories()
+    invalidate_pages()
     
     flash('Category deleted successfully!', 'success')
     return redirect(url_for('admin.categories'))
@@ -395,7 +394,8 @@ def delete_category(category_id):
 def tags():
     """Manage tags"""
     tags = Tag.query.all()
-    return render_template('admin/tags.html', title="Manage Tags", tags=tags)
+    post_counts = post_counts_by_tag()
+    return render_template('admin/tags.html', title="Manage Tags", tags=tags, post_counts=post_counts)
 
 @admin_bp.route('/tag/new', methods=['GET', 'POST'])
 @login_required
@@ -412,6 +412,8 @@ def new_tag():
         tag = Tag(name=name, slug=slug)
         db.session.add(tag)
         db.session.commit()
+        invalidate_tags()
+        invalidate_pages()
         
         flash('Tag created successfully!', 'success')
         return redirect(url_for('admin.tags'))
@@ -429,6 +431,8 @@ def edit_tag(tag_id):
         tag.slug = request.form.get('slug')
         
         db.session.commit()
+        invalidate_tags()
+        invalidate_pages()
         flash('Tag updated successfully!', 'success')
         return redirect(url_for('admin.tags'))
     
@@ -442,10 +446,18 @@ def delete_tag(tag_id):
     
     db.session.delete(tag)
     db.session.commit()
+    invalidate_tags()
+    invalidate_pages()
     
     flash('Tag deleted successfully!', 'success')
     return redirect(url_for('admin.tags'))
 
+@admin_bp.route('/cache-stats')
+@login_required
+def cache_stats():
+    """Hit/miss counters for this worker's category/tag and page caches"""
+    return jsonify({'taxonomy': taxonomy_cache.stats(), 'pages': page_cache.stats(), 'pid': os.getpid()})
+
 @admin_bp.route('/comments')
 @login_required
 def comments():
@@ -453,7 +465,10 @@ def comments():
     page = request.args.get('page', 1, type=int)
     per_page = 20
     
-    comments = Comment.query.order_by(Comment.created_at.desc()).paginate(page=page, per_page=per_page)
+    # The page's posts in one query, without their content
+    comments = Comment.query.options(
+        selectinload(Comment.post).load_only(Post.id, Post.title, Post.slug)
+    ).order_by(Comment.created_at.desc()).paginate(page=page, per_page=per_page)
     
     return render_template('admin/comments.html', title="Manage Comments", comments=comments)
 
@@ -465,6 +480,8 @@ def approve_comment(comment_id):
     
     comment.approved = True
     db.session.commit()
+    invalidate_pages()
+    invalidate_dashboard_stats()
     
     flash('Comment approved successfully!', 'success')
     return redirect(url_for('admin.comments'))
@@ -477,6 +494,53 @@ def delete_comment(comment_id):
     
     db.session.delete(comment)
     db.session.commit()
+    invalidate_pages()
+    invalidate_dashboard_stats()
     
     flash('Comment deleted successfully!', 'success')
     return redirect(url_for('admin.comments'))
+
+@admin_bp.route('/profiles')
+@login_required
+def profiles():
+    """Stored request profiles, newest first"""
+    seconds_left = session.get(PROFILE_SESSION_KEY, 0) - time.time()
+    return render_template('admin/profiles.html', title="Request Profiles",
+                           profiles=list_profiles(),
+                           categories=CATEGORY_NAMES,
+                           token=profile_token(current_user.id),
+                           token_minutes=current_app.config['PROFILER_TOKEN_MAX_AGE'] // 60,
+                           profile_header=PROFILE_HEADER,
+                           profiling_minutes_left=int(seconds_left // 60) + 1 if seconds_left > 0 else 0,
+                           enabled=current_app.config['PROFILER_ENABLED'])
+
+@admin_bp.route('/profiles/<profile_id>.speedscope.json')
+@login_required
+def download_profile(profile_id):
+    """A stored profile, to open at speedscope.app"""
+    path = profile_path(profile_id)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='application/json', as_attachment=True,
+                     download_name=f"{profile_id}.speedscope.json")
+
+@admin_bp.route('/profiles/<profile_id>/delete', methods=['POST'])
+@login_required
+def remove_profile(profile_id):
+    """Delete a stored profile"""
+    delete_profile(profile_id)
+    flash('Profile deleted successfully!', 'success')
+    return redirect(url_for('admin.profiles'))
+
+@admin_bp.route('/profiles/session', methods=['POST'])
+@login_required
+def profile_session():
+    """Profile every request of this admin session for a few minutes, or stop"""
+    minutes = min(request.form.get('minutes', 0, type=int), 60)
+    if minutes > 0:
+        session[PROFILE_SESSION_KEY] = time.time() + minutes * 60
+        flash(f'Your requests will be profiled for the next {minutes} minutes.', 'success')
+    else:
+        session.pop(PROFILE_SESSION_KEY, None)
+        flash('Profiling of your requests stopped.', 'success')
+    return redirect(url_for('admin.profiles'))
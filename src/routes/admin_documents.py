@@ -1,9 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, send_from_directory
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
+from src.uploads import upload_url, forget_upload, hashed_upload_url, stored_digests
+from src.storage import store_upload, delete_upload
+from src.models.upload import UploadReference
+from src.models.document import Document
+from src.documents import (record_stored_document, forget_document, reconcile_documents,
+                           list_documents, document_extensions, MAX_DOCUMENTS_PER_PAGE)
 import os
-import uuid
-from datetime import datetime
 
 # Create blueprint
 documents_bp = Blueprint('documents', __name__, url_prefix='/admin/documents')
@@ -17,28 +20,9 @@ def allowed_document(filename):
 def save_document(file):
     """Save an uploaded document and return the path"""
     if file and allowed_document(file.filename):
-        # Generate a secure filename with a unique identifier
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
-        
-        # Get the upload folder from app config
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        
-        # Create documents subdirectory if it doesn't exist
-        documents_dir = os.path.join(upload_folder, 'documents')
-        os.makedirs(documents_dir, exist_ok=True)
-        
-        # Save the file
-        file_path = os.path.join(documents_dir, unique_filename)
-        file.save(file_path)
-        
-        # Return the relative path for database storage
-        if 'UPLOADS_URL_PATH' in current_app.config:
-            # For persistent storage on Render
-            return f"documents/{unique_filename}"
-        else:
-            # For local development
-            return f"uploads/documents/{unique_filename}"
+        # Stored by content: re-uploading the same document reuses the existing copy
+        return store_upload(file, UploadReference.DOCUMENT,
+                            current_app.config['UPLOAD_MAX_DOCUMENT_BYTES'], prefix='documents/')
     
     return None
 
@@ -46,46 +30,29 @@ def save_document(file):
 @login_required
 def index():
     """Document management page"""
-    # Get list of uploaded documents
-    upload_folder = current_app.config['UPLOAD_FOLDER']
-    documents_dir = os.path.join(upload_folder, 'documents')
+    # The catalog is empty right after upgrading; build it from storage once
+    if Document.query.first() is None:
+        reconcile_documents()
     
-    # Create directory if it doesn't exist
-    os.makedirs(documents_dir, exist_ok=True)
+    per_page = min(request.args.get('per_page', current_app.config['DOCUMENTS_PER_PAGE'], type=int),
+                   MAX_DOCUMENTS_PER_PAGE)
+    documents, sort, order = list_documents(request.args, max(per_page, 1))
     
-    # Get all files in the documents directory
-    documents = []
-    for filename in os.listdir(documents_dir):
-        file_path = os.path.join(documents_dir, filename)
-        if os.path.isfile(file_path):
-            # Get file stats
-            stats = os.stat(file_path)
-            size_kb = stats.st_size / 1024
-            modified_time = datetime.fromtimestamp(stats.st_mtime)
-            
-            # Get file extension
-            _, extension = os.path.splitext(filename)
-            extension = extension.lstrip('.')
-            
-            # Create document info
-            document = {
-                'filename': filename,
-                'original_name': '_'.join(filename.split('_')[1:]) if '_' in filename else filename,
-                'size_kb': round(size_kb, 2),
-                'modified': modified_time,
-                'extension': extension,
-                'url': url_for('uploaded_file', filename=f"documents/{filename}") 
-                      if 'UPLOADS_URL_PATH' in current_app.config 
-                      else url_for('static', filename=f"uploads/documents/{filename}")
-            }
-            documents.append(document)
-    
-    # Sort documents by modified time (newest first)
-    documents.sort(key=lambda x: x['modified'], reverse=True)
+    # One query for the page's digests; documents saved before content-addressed
+    # storage get their plain URL rather than being read from disk and hashed
+    digests = stored_digests(document.path for document in documents.items)
+    document_urls = {document.id: hashed_upload_url(document.path, digests.get(document.path))
+                     for document in documents.items}
     
     return render_template('admin/documents/index.html',
                           title="Document Management",
-                          documents=documents)
+                          documents=documents,
+                          document_urls=document_urls,
+                          sort=sort,
+                          order=order,
+                          q=request.args.get('q', ''),
+                          type=request.args.get('type', ''),
+                          extensions=document_extensions())
 
 @documents_bp.route('/upload', methods=['POST'])
 @login_required
@@ -102,13 +69,10 @@ def upload_document():
     if file and allowed_document(file.filename):
         file_path = save_document(file)
         if file_path:
+            record_stored_document(file_path)
+            
             # Get the URL for the uploaded document
-            if 'UPLOADS_URL_PATH' in current_app.config:
-                # For persistent storage on Render
-                url = url_for('uploaded_file', filename=file_path)
-            else:
-                # For local development
-                url = url_for('static', filename=file_path)
+            url = upload_url(file_path)
                 
             # Return success response with document info
             return jsonify({
@@ -131,13 +95,19 @@ def delete_document(filename):
         # Construct the full path to the file
         file_path = os.path.join(upload_folder, 'documents', filename)
         
-        # Check if the file exists
-        if os.path.exists(file_path) and os.path.isfile(file_path):
+        # Documents stored by content drop their reference; older ones are plain files
+        if delete_upload(f"documents/{filename}"):
+            flash('Document deleted successfully!', 'success')
+        elif os.path.exists(file_path) and os.path.isfile(file_path):
             # Delete the file
             os.remove(file_path)
+            forget_upload(f"documents/{filename}")
             flash('Document deleted successfully!', 'success')
         else:
             flash('Document not found!', 'error')
+        
+        # Gone either way, so it shouldn't stay listed
+        forget_document(filename)
             
     except Exception as e:
         current_app.logger.error(f"Error deleting document: {e}")
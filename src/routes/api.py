@@ -1,10 +1,12 @@
-from flask import Blueprint, request, jsonify, url_for, current_app
+from flask import Blueprint, request, jsonify, current_app
 from src.models.blog import Post, Category, Tag, Comment
 from src.models import db
-from werkzeug.utils import secure_filename
-import os
+from src.page_cache import invalidate_pages
+from src.images import queue_image_variants
+from src.uploads import upload_url
+from src.storage import store_upload
+from src.models.upload import UploadReference
 from datetime import datetime
-import uuid
 
 # Create blueprint
 api_bp = Blueprint('api', __name__)
@@ -64,16 +66,14 @@ def upload_image():
                filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
     
     if file and allowed_file(file.filename):
-        # Generate unique filename
-        filename = secure_filename(file.filename)
-        filename = f"{uuid.uuid4().hex}_{filename}"
+        # Stored by content: re-uploading the same image reuses the existing copy
+        filename = store_upload(file, UploadReference.IMAGE, current_app.config['UPLOAD_MAX_IMAGE_BYTES'])
         
-        # Save file
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        # Resized and WebP copies are made in the background
+        queue_image_variants(f'uploads/{filename}')
         
         # Return the URL to the uploaded file
-        file_url = url_for('static', filename=f'uploads/{filename}', _external=True)
+        file_url = upload_url(f'uploads/{filename}', _external=True)
         return jsonify({
             'success': True,
             'file_url': file_url,
@@ -95,6 +95,7 @@ def toggle_comment():
     # Toggle comments
     post.comments_enabled = not post.comments_enabled
     db.session.commit()
+    invalidate_pages()
     
     return jsonify({
         'success': True,
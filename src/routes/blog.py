@@ -1,12 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, g
 from flask_login import current_user
-from src.models.blog import Post, Category, Tag, Comment
+from src.models.blog import Post, Category, Tag, Comment, post_tags, approved_comments, approved_comment_count
 from src.models import db
+from src.search import search_posts
+from src.cache import post_count_cache, invalidate_dashboard_stats
+from src.view_counter import view_counter
+from src.page_cache import cached_page
 from datetime import datetime
 from slugify import slugify
 import os
 import markdown
 import re
+import base64
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import selectinload
 from markdown.extensions.fenced_code import FencedCodeExtension
 from markdown.extensions.tables import TableExtension
 
@@ -100,16 +107,135 @@ class CustomPagination:
     def next_num(self):
         return self.page + 1
 
+    def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        """Yield page numbers for a pagination widget, with None marking gaps"""
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (num <= left_edge or
+                    self.page - left_current - 1 < num < self.page + right_current or
+                    num > self.pages - right_edge):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
+
+    def url_args(self, page_num, **extra):
+        """URL arguments for a link to page_num, merged with extra route args"""
+        return dict(extra, page=page_num)
+
+# Pagination over a (created_at, id) cursor; next/prev links seek past the
+# boundary row instead of using OFFSET, so deep pages cost the same as page 1
+class KeysetPagination(CustomPagination):
+    def __init__(self, items, page, per_page, total, has_prev, has_next):
+        super(KeysetPagination, self).__init__(items, page, per_page, total)
+        self._has_prev = has_prev
+        self._has_next = has_next
+
+    @property
+    def pages(self):
+        if self.total is None:
+            # Count skipped - only promise pages we know exist
+            return self.page + (1 if self._has_next else 0)
+        return max(super(KeysetPagination, self).pages, self.page)
+
+    @property
+    def has_prev(self):
+        return self._has_prev
+
+    @property
+    def has_next(self):
+        return self._has_next
+
+    @property
+    def next_cursor(self):
+        return encode_cursor('after', self.items[-1]) if self.items else None
+
+    @property
+    def prev_cursor(self):
+        return encode_cursor('before', self.items[0]) if self.items else None
+
+    def url_args(self, page_num, **extra):
+        args = super(KeysetPagination, self).url_args(page_num, **extra)
+        # Adjacent pages use the cursor; jumps to other page numbers fall back to OFFSET
+        if page_num == self.next_num and self.has_next:
+            args['cursor'] = self.next_cursor
+        elif page_num == self.prev_num and self.has_prev and page_num > 1:
+            args['cursor'] = self.prev_cursor
+        return args
+
+def encode_cursor(direction, post):
+    """Opaque cursor for the position just after/before a post"""
+    raw = f"{direction}|{post.created_at.isoformat()}|{post.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (direction, created_at, id), or None for a missing or malformed cursor"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, created_at, post_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        if direction not in ('after', 'before'):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(post_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
 # Helper function to create consistent pagination
-def paginate_query(query, page, per_page):
+def paginate_query(query, page, per_page, keyset=False, cursor=None, count=True, count_key=None):
+    """
+    Paginate a Post query newest first.
+
+    With keyset=True the query is ordered by (created_at, id) and a cursor
+    from a previous page's next/prev link replaces OFFSET. count=False skips
+    the COUNT entirely; count_key caches it in post_count_cache instead.
+    """
     # Get total count before pagination
-    total = query.count()
-    
-    # Get items for current page
-    items = query.limit(per_page).offset((page - 1) * per_page).all()
-    
-    # Return custom pagination object
-    return CustomPagination(items, page, per_page, total)
+    if not count:
+        total = None
+    elif count_key is not None:
+        total = post_count_cache.get_or_set(count_key, query.count)
+    else:
+        total = query.count()
+
+    if not keyset:
+        # Get items for current page
+        items = query.limit(per_page).offset((page - 1) * per_page).all()
+
+        # Return custom pagination object
+        return CustomPagination(items, page, per_page, total)
+
+    newest_first = (Post.created_at.desc(), Post.id.desc())
+    query = query.order_by(None)
+    position = decode_cursor(cursor)
+
+    if position is None:
+        # First page, or a direct jump to a page number
+        items = query.order_by(*newest_first).limit(per_page + 1).offset((page - 1) * per_page).all()
+        has_next = len(items) > per_page
+        return KeysetPagination(items[:per_page], page, per_page, total, page > 1, has_next)
+
+    direction, created_at, post_id = position
+    if direction == 'after':
+        # Rows older than the cursor, fetching one extra to detect a next page
+        items = query.filter(or_(
+            Post.created_at < created_at,
+            and_(Post.created_at == created_at, Post.id < post_id)
+        )).order_by(*newest_first).limit(per_page + 1).all()
+        has_next = len(items) > per_page
+        items = items[:per_page]
+        has_prev = True
+    else:
+        # Rows newer than the cursor, read oldest first and flipped back
+        items = query.filter(or_(
+            Post.created_at > created_at,
+            and_(Post.created_at == created_at, Post.id > post_id)
+        )).order_by(Post.created_at.asc(), Post.id.asc()).limit(per_page + 1).all()
+        has_prev = len(items) > per_page
+        items = list(reversed(items[:per_page]))
+        has_next = True
+
+    return KeysetPagination(items, page, per_page, total, has_prev, has_next)
 
 # Helper function to paginate a list
 def paginate_list(items, page, per_page):
@@ -125,6 +251,7 @@ def paginate_list(items, page, per_page):
     )
 
 @blog_bp.route('/')
+@cached_page
 def index():
     """Display blog index with latest posts"""
     page = request.args.get('page', 1, type=int)
@@ -133,17 +260,20 @@ def index():
     # Create query for posts - show unpublished posts only to admin users
     if current_user.is_authenticated:
         # Admin sees all posts
-        query = Post.query.order_by(Post.created_at.desc())
+        query = Post.query
     else:
         # Regular users only see published posts
-        query = Post.query.filter_by(published=True).order_by(Post.created_at.desc())
+        query = Post.query.filter_by(published=True)
     
-    # Use custom pagination
-    posts = paginate_query(query, page, per_page)
+    # Use cursor pagination with a cached total
+    posts = paginate_query(query, page, per_page, keyset=True,
+                           cursor=request.args.get('cursor'),
+                           count_key=('index', current_user.is_authenticated))
     
     return render_template('blog/index.html', posts=posts, title="Blog")
 
 @blog_bp.route('/post/<slug>')
+@cached_page
 def post(slug):
     """Display a single blog post"""
     post = Post.query.filter_by(slug=slug).first_or_404()
@@ -153,18 +283,53 @@ def post(slug):
         # Return 404 for unpublished posts for non-admin users
         return render_template('404.html'), 404
     
-    # Increment view count
-    post.views += 1
-    db.session.commit()
+    # Buffer the view; it's written later in a batched UPDATE, so reading
+    # a post no longer needs a write transaction
+    view_counter.record(post.id, request)
+    # Lets the page cache keep counting views when it serves this page
+    g.view_post_id = post.id
     
     # Use the html_content property directly - DO NOT try to set it
-    # The property already handles HTML vs markdown conversion
+    # The property serves the stored HTML and handles HTML vs markdown
+    
+    # Approved comments only, a chunk at a time; comments_after continues
+    # from the last one shown ("load more" without JavaScript)
+    comments, has_more_comments, comment_count = [], False, 0
+    if post.comments_enabled:
+        comments, has_more_comments = approved_comments(
+            post.id,
+            after_id=request.args.get('comments_after', type=int),
+            limit=current_app.config['COMMENTS_PER_PAGE']
+        )
+        comment_count = approved_comment_count(post.id)
     
     return render_template('blog/post.html', 
                           post=post, 
+                          comments=comments,
+                          has_more_comments=has_more_comments,
+                          comment_count=comment_count,
                           title=post.title)
 
+@blog_bp.route('/post/<slug>/comments')
+@cached_page
+def post_comments(slug):
+    """The next chunk of a post's approved comments, as HTML for the "load more" link"""
+    post = Post.query.filter_by(slug=slug).first_or_404()
+    if not post.comments_enabled or (not post.published and not current_user.is_authenticated):
+        return render_template('404.html'), 404
+    
+    comments, has_more_comments = approved_comments(
+        post.id,
+        after_id=request.args.get('after', type=int),
+        limit=current_app.config['COMMENTS_PER_PAGE']
+    )
+    return render_template('includes/comment_list.html',
+                          post=post,
+                          comments=comments,
+                          has_more_comments=has_more_comments)
+
 @blog_bp.route('/category/<slug>')
+@cached_page
 def category(slug):
     """Display posts by category"""
     category = Category.query.filter_by(slug=slug).first_or_404()
@@ -176,36 +341,44 @@ def category(slug):
         # Admin sees all posts in category
         query = Post.query.filter_by(
             category_id=category.id
-        ).order_by(Post.created_at.desc())
+        )
     else:
         # Regular users only see published posts in category
         query = Post.query.filter_by(
             category_id=category.id,
             published=True
-        ).order_by(Post.created_at.desc())
+        )
     
-    # Use custom pagination
-    posts = paginate_query(query, page, per_page)
+    # Use cursor pagination with a cached total
+    posts = paginate_query(query, page, per_page, keyset=True,
+                           cursor=request.args.get('cursor'),
+                           count_key=('category', category.id, current_user.is_authenticated))
     
     return render_template('blog/category.html', category=category, posts=posts, title=f"Category: {category.name}")
 
 @blog_bp.route('/tag/<slug>')
+@cached_page
 def tag(slug):
     """Display posts by tag"""
     tag = Tag.query.filter_by(slug=slug).first_or_404()
     page = request.args.get('page', 1, type=int)
     per_page = 6
     
-    # Filter posts with this tag - show unpublished posts only to admin users
-    if current_user.is_authenticated:
-        # Admin sees all posts with tag
-        posts_with_tag = tag.posts
-    else:
+    # Join through post_tags so filtering, ordering and LIMIT/OFFSET happen
+    # in SQL instead of loading every post with this tag
+    query = Post.query.options(selectinload(Post.category)).join(
+        post_tags, post_tags.c.post_id == Post.id
+    ).filter(post_tags.c.tag_id == tag.id)
+    
+    # Show unpublished posts only to admin users
+    if not current_user.is_authenticated:
         # Regular users only see published posts with tag
-        posts_with_tag = [post for post in tag.posts if post.published]
+        query = query.filter(Post.published == True)
     
-    # Use custom pagination for the filtered list
-    posts = paginate_list(posts_with_tag, page, per_page)
+    # Use cursor pagination with a cached total
+    posts = paginate_query(query, page, per_page, keyset=True,
+                           cursor=request.args.get('cursor'),
+                           count_key=('tag', tag.id, current_user.is_authenticated))
     
     return render_template('blog/tag.html', tag=tag, posts=posts, title=f"Tag: {tag.name}")
 
@@ -219,23 +392,19 @@ def search():
     if not query_text:
         return render_template('blog/search.html', posts=None, query='', title="Search")
     
-    # Create query for posts matching search - show unpublished posts only to admin users
-    if current_user.is_authenticated:
-        # Admin sees all matching posts
-        query = Post.query.filter(
-            (Post.title.ilike(f'%{query_text}%') | Post.content.ilike(f'%{query_text}%'))
-        ).order_by(Post.created_at.desc())
-    else:
-        # Regular users only see published matching posts
-        query = Post.query.filter(
-            Post.published == True,
-            (Post.title.ilike(f'%{query_text}%') | Post.content.ilike(f'%{query_text}%'))
-        ).order_by(Post.created_at.desc())
+    # Ranked full-text search - show unpublished posts only to admin users
+    result = search_posts(query_text, page, per_page,
+                          include_unpublished=current_user.is_authenticated)
+    
+    # Load the page's posts and put them back into relevance order
+    posts_by_id = {}
+    if result.ids:
+        posts_by_id = {post.id: post for post in Post.query.options(selectinload(Post.category)).filter(Post.id.in_(result.ids)).all()}
+    items = [posts_by_id[post_id] for post_id in result.ids if post_id in posts_by_id]
     
-    # Use custom pagination
-    posts = paginate_query(query, page, per_page)
+    posts = CustomPagination(items, page, per_page, result.total)
     
-    return render_template('blog/search.html', posts=posts, query=query_text, title=f"Search: {query_text}")
+    return render_template('blog/search.html', posts=posts, query=query_text, snippets=result.snippets, title=f"Search: {query_text}")
 
 @blog_bp.route('/post/<slug>/comment', methods=['POST'])
 def add_comment(slug):
@@ -264,6 +433,7 @@ def add_comment(slug):
     
     db.session.add(comment)
     db.session.commit()
+    invalidate_dashboard_stats()
     
     flash('Your comment has been submitted and is awaiting approval.', 'success')
     return redirect(url_for('blog.post', slug=slug))
@@ -2,11 +2,13 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from src.models.blog import Post, Category, Tag, Comment
 from datetime import datetime
 from src.utils import markdown_to_html
+from src.page_cache import cached_page
 
 # Create a blueprint for main routes instead of registering directly with app
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
+@cached_page
 def index():
     """Homepage route"""
     # Get latest blog posts for homepage
@@ -1,17 +1,26 @@
-from flask import Blueprint, jsonify, request, render_template, current_app
-from src.models.news_link import NewsLink
+from flask import Blueprint, jsonify, request, render_template, current_app, url_for, Response, stream_with_context
+from src.models.news_link import NewsLink, ArticleJob, upsert_news_links
 from src.models.blog import Post, Category
 from src import db
+from src.cache import invalidate_post_counts
+from src.page_cache import invalidate_pages
+from src.jobs import job_queue
+from src.llm_client import llm_client
+from src.utils import url_hash
+from src.link_extractor import extract_urls_and_dates, parse_date_string
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 from flask_login import login_required
 import requests
 import json
+import base64
 import os
-import re
 from slugify import slugify
 import random
 import string
-import urllib.parse
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 news_links_bp = Blueprint('news_links', __name__, url_prefix='/admin/news-links')
 
@@ -21,12 +30,140 @@ def index():
     """Render the admin interface for news links"""
     return render_template('admin/news_links/index.html')
 
+# Upper bound on the page size a client may ask for
+MAX_LINKS_PER_PAGE = 500
+
+def encode_link_cursor(link):
+    """Opaque cursor for the position just after a link in (date_fetched, id) order"""
+    fetched = link.date_fetched.isoformat() if link.date_fetched else ''
+    raw = f"{fetched}|{link.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_link_cursor(cursor):
+    """Return (date_fetched or None, id); raises ValueError for a malformed cursor"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        fetched, link_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+    except UnicodeDecodeError as e:
+        raise ValueError(str(e))
+    return (datetime.fromisoformat(fetched).date() if fetched else None), int(link_id)
+
+def _parse_bool(value):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"Invalid boolean: {value}")
+
+def _parse_date_arg(args, name):
+    if not args.get(name):
+        return None
+    try:
+        return datetime.fromisoformat(args[name]).date()
+    except ValueError:
+        raise ValueError(f"Invalid date for {name}: {args[name]}")
+
+def filter_links_query(args):
+    """
+    Apply the list filters in args to a NewsLink query.
+    
+    Supports article_written, fetched_from/fetched_to, article_from/article_to
+    (ISO dates, inclusive) and q (URL substring). Raises ValueError for bad values.
+    """
+    query = NewsLink.query
+    
+    if args.get('article_written'):
+        query = query.filter(NewsLink.article_written == _parse_bool(args['article_written']))
+    
+    fetched_from = _parse_date_arg(args, 'fetched_from')
+    if fetched_from:
+        query = query.filter(NewsLink.date_fetched >= fetched_from)
+    fetched_to = _parse_date_arg(args, 'fetched_to')
+    if fetched_to:
+        query = query.filter(NewsLink.date_fetched <= fetched_to)
+    article_from = _parse_date_arg(args, 'article_from')
+    if article_from:
+        query = query.filter(NewsLink.date_of_article >= article_from)
+    article_to = _parse_date_arg(args, 'article_to')
+    if article_to:
+        query = query.filter(NewsLink.date_of_article <= article_to)
+    
+    if args.get('q'):
+        # Escape LIKE wildcards so the text matches literally
+        term = args['q'].replace('/', '//').replace('%', '/%').replace('_', '/_')
+        query = query.filter(NewsLink.url.ilike(f"%{term}%", escape='/'))
+    
+    return query
+
+def _dated_links(query, cursor=None):
+    """Links with a date_fetched, newest first, after cursor (date_fetched, id)"""
+    query = query.filter(NewsLink.date_fetched.isnot(None))
+    if cursor:
+        fetched, link_id = cursor
+        query = query.filter(or_(
+            NewsLink.date_fetched < fetched,
+            and_(NewsLink.date_fetched == fetched, NewsLink.id < link_id)
+        ))
+    return query.order_by(NewsLink.date_fetched.desc(), NewsLink.id.desc())
+
+def _undated_links(query, link_id=None):
+    """Links without a date_fetched, which sort after all dated ones, by id"""
+    query = query.filter(NewsLink.date_fetched.is_(None))
+    if link_id is not None:
+        query = query.filter(NewsLink.id < link_id)
+    return query.order_by(NewsLink.id.desc())
+
+def stream_links_ndjson(query):
+    """Yield one JSON line per link, reading through a server-side cursor"""
+    for ordered in (_dated_links(query), _undated_links(query)):
+        for link in ordered.yield_per(500):
+            yield json.dumps(link.to_dict()) + '\n'
+
 @news_links_bp.route('/api/links', methods=['GET'])
 @login_required
 def get_links():
-    """Get all news links ordered by date_fetched"""
-    links = NewsLink.query.order_by(NewsLink.date_fetched.desc()).all()
-    return jsonify([link.to_dict() for link in links])
+    """
+    Get a page of news links, newest date_fetched first.
+    
+    Filters are described in filter_links_query. Pages are keyset-paginated
+    on (date_fetched, id): pass the previous page's next_cursor as cursor.
+    With format=ndjson every matching link is streamed instead, one JSON
+    object per line.
+    """
+    try:
+        query = filter_links_query(request.args)
+        cursor = request.args.get('cursor')
+        cursor = decode_link_cursor(cursor) if cursor else None
+        limit = request.args.get('limit', current_app.config['NEWS_LINKS_PER_PAGE'], type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if request.args.get('format') == 'ndjson':
+        filename = f"news-links-{datetime.now().date().isoformat()}.ndjson"
+        return Response(
+            stream_with_context(stream_links_ndjson(query)),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    
+    limit = max(1, min(limit, MAX_LINKS_PER_PAGE))
+    
+    # Fetch one extra row to learn whether another page follows
+    links = []
+    if cursor is None or cursor[0] is not None:
+        links = _dated_links(query, cursor).limit(limit + 1).all()
+    if len(links) <= limit:
+        undated_after = cursor[1] if cursor and cursor[0] is None else None
+        links += _undated_links(query, undated_after).limit(limit + 1 - len(links)).all()
+    
+    has_more = len(links) > limit
+    links = links[:limit]
+    
+    return jsonify({
+        'links': [link.to_dict() for link in links],
+        'next_cursor': encode_link_cursor(links[-1]) if has_more else None,
+        'has_more': has_more
+    })
 
 @news_links_bp.route('/api/links/<int:link_id>', methods=['PUT'])
 @login_required
@@ -65,6 +202,9 @@ def update_link(link_id):
         
         db.session.commit()
         return jsonify(link.to_dict())
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Another link already has this URL'}), 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error updating link: {e}")
@@ -112,6 +252,11 @@ def create_link():
         
         article_written = bool(data.get('article_written', False))
         
+        # Refuse a URL that is already stored in any spelling
+        duplicate = NewsLink.query.filter_by(url_hash=url_hash(data['url'])).first()
+        if duplicate:
+            return jsonify({'error': 'This URL is already in the list', 'link': duplicate.to_dict()}), 409
+        
         link = NewsLink(
             url=data['url'],
             date_of_article=date_of_article,
@@ -124,6 +269,9 @@ def create_link():
         db.session.commit()
         
         return jsonify(link.to_dict()), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'This URL is already in the list'}), 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error creating link: {e}")
@@ -132,7 +280,7 @@ def create_link():
 @news_links_bp.route('/api/generate-article', methods=['POST'])
 @login_required
 def generate_article():
-    """Generate an article using OpenAI API and create a post"""
+    """Queue article generation for a link and return the job id immediately"""
     try:
         data = request.json
         
@@ -154,150 +302,157 @@ def generate_article():
         link.focus_of_article = data['focus_of_article']
         db.session.commit()
         
-        # Get OpenAI API key from environment variable
-        api_key = os.environ.get('OPENAI_API_KEY')
-        if not api_key:
+        # Check the OpenAI API key up front so a misconfiguration fails fast
+        if not os.environ.get('OPENAI_API_KEY'):
             return jsonify({'error': 'OpenAI API key not found in environment variables'}), 500
         
-        # Prepare the OpenAI API request
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        
-        # Construct the user prompt
-        user_prompt = f"Write a short blog post commenting on this news story: {data['url']}. The focus of the article should be {data['focus_of_article']}. Compose the article in markdown format, and give it a title and a one sentence summary. If you link to the news story in the article, then do so in a way such that the link opens in a new tab. Return your response as a JSON object with the structure below. Do not return any other text or data other than the JSON object.\n\n{{\n\"title\": string,\n\"excerpt\": string,\n\"content\": string\n}}"
-        
-        # Construct the system prompt
-        system_prompt = "You are a helpful assistant that writes commentary on issues relating to technology, the law, intellectual property, and open source licensing and compliance"
-        
-        # Prepare the request payload
-        payload = {
-            "model": "o3",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-        }
-        
-        # Make the API request
-        current_app.logger.info(f"Sending request to OpenAI API: {payload}")
-        response = requests.post(url, headers=headers, json=payload)
-        
-        # Check if the request was successful
-        if response.status_code != 200:
-            current_app.logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
-            return jsonify({'error': f'OpenAI API error: {response.status_code} - {response.text}'}), 500
+        # Don't start a second (paid) generation while one is still in flight for this link
+        active_job = ArticleJob.query.filter(
+            ArticleJob.link_id == link.id,
+            ArticleJob.status.in_([ArticleJob.QUEUED, ArticleJob.RUNNING])
+        ).order_by(ArticleJob.id.desc()).first()
+        if active_job and not job_queue.expire_stale(active_job):
+            return jsonify(dict(active_job.to_dict(), job_id=active_job.id,
+                                status_url=url_for('news_links.get_job', job_id=active_job.id))), 202
+        
+        job = ArticleJob(
+            link_id=link.id,
+            url=data['url'],
+            focus_of_article=data['focus_of_article']
+        )
+        db.session.add(job)
+        db.session.commit()
         
-        # Parse the response
-        response_data = response.json()
-        current_app.logger.info(f"Received response from OpenAI API: {response_data}")
+        # The OpenAI call can take minutes, so it runs on the job queue
+        # rather than pinning this worker
+        job_queue.submit(ArticleJob, job.id, write_article)
         
-        # Extract the content from the response
-        try:
-            content = response_data['choices'][0]['message']['content']
-            
-            # Parse the JSON from the content
-            article_data = json.loads(content)
-            
-            # Validate the article data
-            if not article_data.get('title') or not article_data.get('excerpt') or not article_data.get('content'):
-                return jsonify({'error': 'Invalid article data received from OpenAI'}), 500
-            
-            # Get the Drafts category
-            drafts_category = Category.query.filter_by(name='Drafts').first()
-            if not drafts_category:
-                return jsonify({'error': 'Drafts category not found'}), 500
-            
-            # Generate a slug from the title
-            base_slug = slugify(article_data['title'])
-            
-            # Check if the slug already exists
-            existing_post = Post.query.filter_by(slug=base_slug).first()
-            if existing_post:
-                # Add a random string to make the slug unique
-                random_string = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
-                slug = f"{base_slug}-{random_string}"
-            else:
-                slug = base_slug
-            
-            # Create a new post
-            post = Post(
-                title=article_data['title'],
-                slug=slug,
-                content=article_data['content'],
-                excerpt=article_data['excerpt'],
-                created_at=datetime.now(),
-                updated_at=datetime.now(),
-                published=False,
-                comments_enabled=False,
-                category_id=drafts_category.id,
-                content_format='markdown'
-            )
-            
-            # Add the post to the database
-            db.session.add(post)
-            
-            # Update the link to mark article as written
-            link.article_written = True
-            
-            # Commit the changes
-            db.session.commit()
-            
-            # Return the post data
-            return jsonify({
-                'success': True,
-                'post_id': post.id,
-                'post_title': post.title,
-                'post_slug': post.slug,
-                'post_excerpt': post.excerpt
-            })
-            
-        except (json.JSONDecodeError, KeyError) as e:
-            current_app.logger.error(f"Error parsing OpenAI response: {e}")
-            return jsonify({'error': f'Error parsing OpenAI response: {e}'}), 500
+        return jsonify(dict(job.to_dict(), job_id=job.id,
+                            status_url=url_for('news_links.get_job', job_id=job.id))), 202
             
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Error generating article: {e}")
+        current_app.logger.error(f"Error queueing article generation: {e}")
         return jsonify({'error': str(e)}), 500
 
-@news_links_bp.route('/api/fetch-perplexity', methods=['POST'])
+@news_links_bp.route('/api/jobs/<int:job_id>', methods=['GET'])
 @login_required
-def fetch_perplexity_links():
+def get_job(job_id):
+    """Poll the status of an article generation job"""
+    job = ArticleJob.query.get_or_404(job_id)
+    job_queue.expire_stale(job)
+    return jsonify(job.to_dict())
+
+def write_article(job):
     """
-    Fetch news links from Perplexity AI based on selected topic,
-    extract URLs and dates from the response, and save them to the database.
+    Generate an article with the OpenAI API and save it as a draft post.
+    
+    Runs on the job queue inside an app context. Raises on any failure;
+    the queue records the message on the job.
+    
+    Args:
+        job (ArticleJob): The job to run
     """
-    # Check if Perplexity API key is configured
-    api_key = os.environ.get('PERPLEXITY_API_KEY')
-    if not api_key:
-        current_app.logger.error("Perplexity API key not found in environment variables")
-        return jsonify({'error': 'Perplexity API key not configured. Please set the PERPLEXITY_API_KEY environment variable.'}), 500
+    # Get OpenAI API key from environment variable
+    if not llm_client.api_key('openai'):
+        raise RuntimeError('OpenAI API key not found in environment variables')
     
-    try:
-        # Get the selected topic from the request
-        data = request.json
-        selected_topic = data.get('topic', 'intellectual property issues')
-        
-        # Validate the topic
-        valid_topics = [
-            'intellectual property issues',
-            'open source software licensing and compliance',
-            'data privacy',
-            'law, policy, and regulation about technology',
-            'lawsuits or regulatory actions involving technology companies'
+    # Construct the user prompt
+    user_prompt = f"Write a short blog post commenting on this news story: {job.url}. The focus of the article should be {job.focus_of_article}. Compose the article in markdown format, and give it a title and a one sentence summary. If you link to the news story in the article, then do so in a way such that the link opens in a new tab. Return your response as a JSON object with the structure below. Do not return any other text or data other than the JSON object.\n\n{{\n\"title\": string,\n\"excerpt\": string,\n\"content\": string\n}}"
+    
+    # Construct the system prompt
+    system_prompt = "You are a helpful assistant that writes commentary on issues relating to technology, the law, intellectual property, and open source licensing and compliance"
+    
+    # Prepare the request payload
+    payload = {
+        "model": "o3",
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
         ]
+    }
+    
+    # Make the API request through the shared pooled client (timeouts and retries)
+    current_app.logger.info(f"Sending request to OpenAI API: {payload}")
+    response_data = llm_client.chat_completion('openai', payload)
+    current_app.logger.info(f"Received response from OpenAI API: {response_data}")
+    
+    # Extract the content from the response
+    try:
+        content = response_data['choices'][0]['message']['content']
         
-        if selected_topic not in valid_topics:
-            current_app.logger.warning(f"Invalid topic received: {selected_topic}, defaulting to 'intellectual property issues'")
-            selected_topic = 'intellectual property issues'
-        
-        current_app.logger.info(f"Using selected topic: {selected_topic}")
-        
-        # Construct the prompt for Perplexity AI with the selected topic
-        prompt = f"""Give me five links to articles from the past week about legal issues involving the tech industry. Focus on articles about {selected_topic}. Be sure to search tech blogs and business news sites. For each article, give me the URL and the date of the article in MM-DD-YYYY format. Don't give me any text or commentary other than the URLs and the dates. Return the data as an array of JSON objects in the following format:
+        # Parse the JSON from the content
+        article_data = json.loads(content)
+    except (json.JSONDecodeError, KeyError) as e:
+        current_app.logger.error(f"Error parsing OpenAI response: {e}")
+        raise RuntimeError(f'Error parsing OpenAI response: {e}')
+    
+    # Validate the article data
+    if not article_data.get('title') or not article_data.get('excerpt') or not article_data.get('content'):
+        raise RuntimeError('Invalid article data received from OpenAI')
+    
+    # Get the Drafts category
+    drafts_category = Category.query.filter_by(name='Drafts').first()
+    if not drafts_category:
+        raise RuntimeError('Drafts category not found')
+    
+    # Generate a slug from the title
+    base_slug = slugify(article_data['title'])
+    
+    # Check if the slug already exists
+    existing_post = Post.query.filter_by(slug=base_slug).first()
+    if existing_post:
+        # Add a random string to make the slug unique
+        random_string = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+        slug = f"{base_slug}-{random_string}"
+    else:
+        slug = base_slug
+    
+    # Create a new post
+    post = Post(
+        title=article_data['title'],
+        slug=slug,
+        content=article_data['content'],
+        excerpt=article_data['excerpt'],
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+        published=False,
+        comments_enabled=False,
+        category_id=drafts_category.id,
+        content_format='markdown'
+    )
+    
+    # Render the markdown now so the first page view is served from storage
+    post.render_html()
+    
+    # Add the post to the database
+    db.session.add(post)
+    db.session.flush()
+    
+    # Update the link to mark article as written
+    link = NewsLink.query.get(job.link_id)
+    if link:
+        link.article_written = True
+    job.post_id = post.id
+    
+    # Commit the changes
+    db.session.commit()
+    invalidate_post_counts()
+    invalidate_pages()
+
+# Topics offered in the admin UI; the first is the default
+PERPLEXITY_TOPICS = [
+    'intellectual property issues',
+    'open source software licensing and compliance',
+    'data privacy',
+    'law, policy, and regulation about technology',
+    'lawsuits or regulatory actions involving technology companies'
+]
+
+def build_perplexity_payload(topic):
+    """Build the Perplexity chat completion request for one topic"""
+    # Construct the prompt for Perplexity AI with the selected topic
+    prompt = f"""Give me five links to articles from the past week about legal issues involving the tech industry. Focus on articles about {topic}. Be sure to search tech blogs and business news sites. For each article, give me the URL and the date of the article in MM-DD-YYYY format. Don't give me any text or commentary other than the URLs and the dates. Return the data as an array of JSON objects in the following format:
 
 {{
 "url": string
@@ -305,343 +460,240 @@ def fetch_perplexity_links():
 }}
 
 Only return the JSON object, nothing else."""
+    
+    return {
+        "model": "sonar-pro",
+        "temperature": 0.0,
+        "max_tokens": 4000,
+        "messages": [
+            {
+                "role": "system",
+                "content": "You are a helpful assistant that researches news stories about law, technology, and business."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]    
+    }
+
+def parse_perplexity_content(raw_content):
+    """
+    Extract links from the content of a Perplexity response.
+    
+    Returns:
+        tuple: (list of {'url', 'date_of_article'} dicts, 'json' or 'text')
+    """
+    # Try to parse the content as JSON
+    try:
+        links_data = json.loads(raw_content)
+        
+        if isinstance(links_data, dict):
+            # If it's a single object, wrap it in a list
+            links_data = [links_data]
+        elif not isinstance(links_data, list):
+            # If it's not a list or dict, fall back to text parsing
+            raise ValueError("Response is not a valid JSON array or object")
+        
+        items = []
+        for link_data in links_data:
+            # Validate required fields
+            if not isinstance(link_data, dict) or 'url' not in link_data:
+                current_app.logger.warning(f"Skipping invalid link data: {link_data}")
+                continue
+            
+            url = (link_data.get('url') or '').strip()
+            date_str = (link_data.get('date_of_article') or '').strip()
+            
+            # Skip if URL is empty
+            if not url:
+                current_app.logger.warning("Skipping link with empty URL")
+                continue
+            
+            items.append({
+                'url': url,
+                'date_of_article': parse_date_string(date_str) if date_str else None
+            })
+        return items, 'json'
         
-        payload = {
-            "model": "sonar-pro",
-            "temperature": 0.0,
-            "max_tokens": 4000,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that researches news stories about law, technology, and business."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]    
-        }
+    except (json.JSONDecodeError, ValueError) as e:
+        # JSON parsing failed, fall back to text parsing
+        current_app.logger.info(f"JSON parsing failed, falling back to text extraction: {e}")
+    
+    # Extract URLs and dates from unstructured text
+    return extract_urls_and_dates(raw_content), 'text'
 
-        # Prepare the request to Perplexity API
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
+def fetch_topic_links(app, topic, api_key):
+    """
+    Query Perplexity for one topic; safe to run on a worker thread.
+    
+    Never raises: failures are reported in the returned dict's 'error'.
+    """
+    with app.app_context():
+        result = {
+            'topic': topic,
+            'items': [],
+            'source': None,
+            'error': None,
+            'payload': build_perplexity_payload(topic),
+            'raw_content': None
         }
-        
-        # Log the request (without API key)
-        current_app.logger.info(f"Sending request to Perplexity API with prompt: {prompt}")
-        
-        # Make the request to Perplexity API
-        response = requests.request("POST",
-            "https://api.perplexity.ai/chat/completions",
-            json=payload,
-            headers=headers
-        )
-        
-        # Check if the request was successful
-        response.raise_for_status()
-        
-        # Parse the response
-        perplexity_response = response.json()
-        
-        # Extract the content from the response
-        if 'choices' not in perplexity_response or not perplexity_response['choices']:
-            raise ValueError("Invalid response format from Perplexity API")
-        
-        # Get the raw content
-        raw_content = perplexity_response['choices'][0]['message']['content']
-        
-        # Log the raw content
-        current_app.logger.info(f"Raw content from Perplexity API: {raw_content}")
-        
-        # Try to parse the content as JSON
+        started = time.perf_counter()
         try:
-            # Attempt to parse as JSON
-            links_data = json.loads(raw_content)
-            
-            # Validate that it's a list or object
-            if isinstance(links_data, list):
-                # It's already a list, use it as is
-                pass
-            elif isinstance(links_data, dict):
-                # If it's a single object, wrap it in a list
-                links_data = [links_data]
-            else:
-                # If it's not a list or dict, fall back to text parsing
-                raise ValueError("Response is not a valid JSON array or object")
+            current_app.logger.info(f"Sending request to Perplexity API for topic: {topic}")
             
-            # Process JSON data
-            processed_links = []
-            today = datetime.now().date()
+            # Make the request through the shared pooled client (timeouts and retries)
+            perplexity_response = llm_client.chat_completion('perplexity', result['payload'], api_key=api_key)
             
-            for link_data in links_data:
-                # Validate required fields
-                if not isinstance(link_data, dict) or 'url' not in link_data:
-                    current_app.logger.warning(f"Skipping invalid link data: {link_data}")
-                    continue
-                    
-                url = link_data.get('url', '').strip()
-                date_str = link_data.get('date_of_article', '').strip()
-                
-                # Skip if URL is empty
-                if not url:
-                    current_app.logger.warning("Skipping link with empty URL")
-                    continue
-                
-                # Parse date if available
-                date_of_article = None
-                if date_str:
-                    date_of_article = parse_date_string(date_str)
-                
-                # Create and save the news link
-                link = NewsLink(
-                    url=url,
-                    date_of_article=date_of_article,
-                    date_fetched=today,
-                    article_written=False
-                )
-                
-                db.session.add(link)
-                processed_links.append(link.to_dict())
+            # Extract the content from the response
+            if 'choices' not in perplexity_response or not perplexity_response['choices']:
+                raise ValueError("Invalid response format from Perplexity API")
             
-            # Commit all links to the database
-            db.session.commit()
+            result['raw_content'] = perplexity_response['choices'][0]['message']['content']
+            current_app.logger.info(f"Raw content from Perplexity API: {result['raw_content']}")
             
-            # Return success response with processed links and raw content for debugging
-            return jsonify({
-                'success': True,
-                'links': processed_links,
-                'count': len(processed_links),
-                'topic': selected_topic,
-                'source': 'json',
-                'debug': {
-                    'request_payload': payload,
-                    'raw_content': raw_content
-                }
-            })
-            
-        except (json.JSONDecodeError, ValueError) as e:
-            # JSON parsing failed, fall back to text parsing
-            current_app.logger.info(f"JSON parsing failed, falling back to text extraction: {e}")
-        
-        # Extract URLs and dates from unstructured text
-        extracted_data = extract_urls_and_dates(raw_content)
-        
-        if not extracted_data:
-            current_app.logger.warning("No URLs found in Perplexity response")
-            return jsonify({
-                'success': False,
-                'error': 'No valid URLs found in Perplexity response',
-                'topic': selected_topic,
-                'debug': {
-                    'request_payload': payload,
-                    'raw_content': raw_content
-                }
-            }), 500
+            result['items'], result['source'] = parse_perplexity_content(result['raw_content'])
+            if result['source'] == 'text' and not result['items']:
+                current_app.logger.warning(f"No URLs found in Perplexity response for topic: {topic}")
+                result['error'] = 'No valid URLs found in Perplexity response'
+        except requests.exceptions.RequestException as e:
+            current_app.logger.error(f"Request to Perplexity API failed: {str(e)}")
+            result['error'] = f'Failed to connect to Perplexity API: {str(e)}'
+        except Exception as e:
+            current_app.logger.error(f"Error fetching links from Perplexity: {str(e)}")
+            result['error'] = f'Error fetching links from Perplexity: {str(e)}'
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000)
+        return result
+
+def fetch_topics_concurrently(topics, api_key):
+    """Run fetch_topic_links for every topic on a bounded thread pool, in input order"""
+    app = current_app._get_current_object()
+    if len(topics) == 1:
+        return [fetch_topic_links(app, topics[0], api_key)]
+    
+    max_workers = min(len(topics), app.config['PERPLEXITY_FETCH_CONCURRENCY'])
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='perplexity') as executor:
+        return list(executor.map(lambda topic: fetch_topic_links(app, topic, api_key), topics))
+
+@news_links_bp.route('/api/fetch-perplexity', methods=['POST'])
+@login_required
+def fetch_perplexity_links():
+    """
+    Fetch news links from Perplexity AI for the selected topic (or for
+    several topics concurrently when 'topics' is given), extract URLs and
+    dates from the responses, and save the new ones in one transaction.
+    """
+    # Check if Perplexity API key is configured
+    api_key = os.environ.get('PERPLEXITY_API_KEY')
+    if not api_key:
+        current_app.logger.error("Perplexity API key not found in environment variables")
+        return jsonify({'error': 'Perplexity API key not configured. Please set the PERPLEXITY_API_KEY environment variable.'}), 500
+    
+    try:
+        # Get the selected topic(s) from the request
+        data = request.json or {}
+        requested = data.get('topics') or [data.get('topic', PERPLEXITY_TOPICS[0])]
+        if not isinstance(requested, list):
+            return jsonify({'error': "'topics' must be a list"}), 400
+        
+        # Validate the topics, keeping the first occurrence of each
+        topics = []
+        for topic in requested:
+            if topic not in PERPLEXITY_TOPICS:
+                current_app.logger.warning(f"Invalid topic received: {topic}, defaulting to '{PERPLEXITY_TOPICS[0]}'")
+                topic = PERPLEXITY_TOPICS[0]
+            if topic not in topics:
+                topics.append(topic)
+        
+        current_app.logger.info(f"Using selected topics: {topics}")
+        
+        started = time.perf_counter()
+        results = fetch_topics_concurrently(topics, api_key)
+        
+        # Merge the results, dropping URLs repeated across topics or already stored
+        candidates = {}
+        for result in results:
+            for item in result['items']:
+                candidates.setdefault(url_hash(item['url']), (item, result['topic']))
+        
+        existing = set()
+        if candidates:
+            existing = {digest for (digest,) in db.session.query(NewsLink.url_hash)
+                        .filter(NewsLink.url_hash.in_(list(candidates))).all()}
         
-        # Process extracted data
-        processed_links = []
         today = datetime.now().date()
-        
-        for item in extracted_data:
-            url = item['url']
-            date_of_article = item['date_of_article']
-            
-            # Create and save the news link
-            link = NewsLink(
-                url=url,
-                date_of_article=date_of_article,
-                date_fetched=today,
-                article_written=False
-            )
-            
-            db.session.add(link)
-            processed_links.append({
-                'url': url,
-                'date_of_article': date_of_article.isoformat() if date_of_article else None,
-                'date_fetched': today.isoformat(),
-                'article_written': False
+        rows = []
+        added_by_topic = {topic: 0 for topic in topics}
+        for digest, (item, topic) in candidates.items():
+            if digest in existing:
+                continue
+            rows.append({
+                'url': item['url'],
+                'date_of_article': item['date_of_article'],
+                'date_fetched': today
             })
+            added_by_topic[topic] += 1
         
-        # Commit all links to the database
-        db.session.commit()
+        # Upsert every new link in a single transaction; a link stored
+        # concurrently since the check above is skipped rather than duplicated
+        new_links = []
+        if rows:
+            upsert_news_links(rows)
+            db.session.commit()
+            new_links = NewsLink.query.filter(
+                NewsLink.url_hash.in_([url_hash(row['url']) for row in rows])
+            ).order_by(NewsLink.id).all()
+        
+        processed_links = [link.to_dict() for link in new_links]
+        returned = sum(len(result['items']) for result in results)
+        elapsed_ms = round((time.perf_counter() - started) * 1000)
+        current_app.logger.info(f"Fetched {returned} links for {len(topics)} topics in {elapsed_ms} ms, "
+                                f"{len(new_links)} new")
+        
+        if len(topics) == 1:
+            # Single-topic response, as before
+            result = results[0]
+            response = {
+                'topic': result['topic'],
+                'debug': {
+                    'request_payload': result['payload'],
+                    'raw_content': result['raw_content']
+                }
+            }
+            if result['error']:
+                response.update(success=False, error=result['error'])
+                return jsonify(response), 500
+            response.update(
+                success=True,
+                links=processed_links,
+                count=len(processed_links),
+                source=result['source'],
+                elapsed_ms=elapsed_ms
+            )
+            return jsonify(response)
         
-        # Return success response with processed links and raw content for debugging
-        return jsonify({
-            'success': True,
+        failed = [result for result in results if result['error']]
+        response = {
+            'success': len(failed) < len(results),
             'links': processed_links,
             'count': len(processed_links),
-            'topic': selected_topic,
-            'source': 'text',
-            'debug': {
-                'request_payload': payload,
-                'raw_content': raw_content
-            }
-        })
+            'duplicates': returned - len(processed_links),
+            'elapsed_ms': elapsed_ms,
+            'topics': [{
+                'topic': result['topic'],
+                'elapsed_ms': result['elapsed_ms'],
+                'returned': len(result['items']),
+                'added': added_by_topic[result['topic']],
+                'source': result['source'],
+                'error': result['error']
+            } for result in results]
+        }
+        if not response['success']:
+            response['error'] = 'All Perplexity topic requests failed'
+            return jsonify(response), 500
+        return jsonify(response)
         
-    except requests.exceptions.RequestException as e:
-        current_app.logger.error(f"Request to Perplexity API failed: {str(e)}")
-        return jsonify({'error': f'Failed to connect to Perplexity API: {str(e)}'}), 500
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error fetching links from Perplexity: {str(e)}")
         return jsonify({'error': f'Error fetching links from Perplexity: {str(e)}'}), 500
-
-def extract_urls_and_dates(text):
-    """
-    Extract URLs and associated dates from unstructured text.
-    
-    This function uses regex to find URLs and dates in any format, then
-    associates each URL with the closest date that appears near it.
-    
-    Args:
-        text (str): The unstructured text to parse
-    
-    Returns:
-        list: A list of dictionaries with 'url' and 'date_of_article' keys
-    """
-    # Regex for finding URLs
-    # This pattern matches common URL formats including http, https, www prefixes
-    url_pattern = r'https?://(?:[-\w.]|(?:%[\da-fA-F]{2}))+(?:/[-\w%!.~\'*,;:=+$/?#[\]@&]+)*'
-    
-    # Regex patterns for finding dates in various formats
-    date_patterns = [
-        # MM-DD-YYYY or MM/DD/YYYY
-        r'(0?[1-9]|1[0-2])[-/](0?[1-9]|[12]\d|3[01])[-/](20\d{2})',
-        # YYYY-MM-DD or YYYY/MM/DD
-        r'(20\d{2})[-/](0?[1-9]|1[0-2])[-/](0?[1-9]|[12]\d|3[01])',
-        # Month DD, YYYY (e.g., January 1, 2023)
-        r'(January|February|March|April|May|June|July|August|September|October|November|December)\s+(0?[1-9]|[12]\d|3[01]),?\s+(20\d{2})',
-        # Abbreviated month (e.g., Jan 1, 2023)
-        r'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+(0?[1-9]|[12]\d|3[01]),?\s+(20\d{2})',
-        # DD Month YYYY (e.g., 1 January 2023)
-        r'(0?[1-9]|[12]\d|3[01])\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s+(20\d{2})',
-        # DD abbreviated month YYYY (e.g., 1 Jan 2023)
-        r'(0?[1-9]|[12]\d|3[01])\s+(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+(20\d{2})'
-    ]
-    
-    # Find all URLs in the text
-    urls = re.findall(url_pattern, text)
-    
-    # Clean and validate URLs
-    valid_urls = []
-    for url in urls:
-        # Normalize URL
-        url = url.strip()
-        
-        # Skip empty URLs
-        if not url:
-            continue
-            
-        # Ensure URL has a scheme
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-            
-        # Validate URL format
-        try:
-            parsed = urllib.parse.urlparse(url)
-            if all([parsed.scheme, parsed.netloc]):
-                valid_urls.append(url)
-        except Exception as e:
-            current_app.logger.warning(f"Invalid URL format: {url}, error: {e}")
-            continue
-    
-    # Find all dates in the text
-    all_dates = []
-    for pattern in date_patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
-            date_str = match.group(0)
-            position = match.start()
-            all_dates.append((date_str, position))
-    
-    # Sort dates by their position in the text
-    all_dates.sort(key=lambda x: x[1])
-    
-    # Find positions of all URLs in the text
-    url_positions = []
-    for url in valid_urls:
-        # Find all occurrences of this URL in the text
-        for match in re.finditer(re.escape(url), text):
-            url_positions.append((url, match.start()))
-    
-    # Sort URLs by their position in the text
-    url_positions.sort(key=lambda x: x[1])
-    
-    # Associate each URL with the nearest date
-    results = []
-    
-    # If we have URLs but no dates, add URLs with None dates
-    if url_positions and not all_dates:
-        for url, _ in url_positions:
-            results.append({
-                'url': url,
-                'date_of_article': None
-            })
-        return results
-    
-    # If we have dates but no URLs, return empty list
-    if not url_positions:
-        return []
-    
-    # Process URLs and associate with dates
-    for i, (url, url_pos) in enumerate(url_positions):
-        # Find the closest date before or after this URL
-        closest_date = None
-        min_distance = float('inf')
-        
-        for date_str, date_pos in all_dates:
-            distance = abs(url_pos - date_pos)
-            
-            # If this is the closest date so far, use it
-            if distance < min_distance:
-                min_distance = distance
-                closest_date = date_str
-        
-        # Parse the date if we found one
-        parsed_date = None
-        if closest_date:
-            parsed_date = parse_date_string(closest_date)
-        
-        # Add the URL and date to results
-        results.append({
-            'url': url,
-            'date_of_article': parsed_date
-        })
-    
-    return results
-
-def parse_date_string(date_str):
-    """
-    Parse a date string in various formats and return a datetime.date object.
-    
-    Args:
-        date_str (str): The date string to parse
-    
-    Returns:
-        datetime.date or None: The parsed date or None if parsing fails
-    """
-    # List of date formats to try
-    formats = [
-        '%m-%d-%Y',  # MM-DD-YYYY
-        '%m/%d/%Y',  # MM/DD/YYYY
-        '%Y-%m-%d',  # YYYY-MM-DD
-        '%Y/%m/%d',  # YYYY/MM/DD
-        '%B %d, %Y',  # Month DD, YYYY
-        '%B %d %Y',   # Month DD YYYY
-        '%b %d, %Y',  # Abbreviated month DD, YYYY
-        '%b %d %Y',   # Abbreviated month DD YYYY
-        '%d %B %Y',   # DD Month YYYY
-        '%d %b %Y',   # DD Abbreviated month YYYY
-    ]
-    
-    # Try each format
-    for fmt in formats:
-        try:
-            return datetime.strptime(date_str, fmt).date()
-        except ValueError:
-            continue
-    
-    # If all formats fail, log warning and return None
-    current_app.logger.warning(f"Could not parse date: {date_str}")
-    return None
@@ -0,0 +1,517 @@
+"""
+Full-text search for blog posts.
+
+The backend is chosen from the database dialect (or the SEARCH_BACKEND
+setting):
+
+- sqlite_fts: an FTS5 virtual table created by `flask db upgrade` and kept
+              in sync from the Post mapper events
+- postgres:   a GIN expression index over to_tsvector(title || content),
+              created by `flask db upgrade`
+- memory:     a pure-Python inverted index, used for MySQL and tests
+- ilike:      the original LIKE '%q%' scan, kept as a baseline for benchmarks
+
+All backends return post ids in relevance order plus highlighted snippets.
+"""
+import bisect
+import html
+from abc import ABC, abstractmethod
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from src.models import db
+from src.models.blog import Post
+
+# Sentinels wrapped around matched terms by the database, swapped for
+# <mark> tags after the snippet text has been HTML-escaped
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TAG_RE = re.compile(r'<[^>]+>')
+
+def plain_text(content):
+    """Strip HTML tags and entities so only readable text is indexed"""
+    return html.unescape(TAG_RE.sub(' ', content or ''))
+
+def tokenize(value):
+    """Lowercased word tokens"""
+    return [token.lower() for token in TOKEN_RE.findall(value or '')]
+
+def render_snippet(raw):
+    """Escape a snippet and turn the highlight sentinels into <mark> tags"""
+    escaped = html.escape(raw or '')
+    return escaped.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+
+def highlight_terms(content, terms, words=30):
+    """Build a highlighted snippet around the first matching term in Python"""
+    words_list = plain_text(content).split()
+    if not words_list:
+        return ''
+
+    # Find the first word that starts with any query term
+    start = 0
+    for i, word in enumerate(words_list):
+        lowered = word.lower()
+        if any(lowered.strip('.,;:!?()"\'').startswith(term) for term in terms):
+            start = max(0, i - words // 3)
+            break
+
+    window = words_list[start:start + words]
+    marked = []
+    for word in window:
+        core = word.lower().strip('.,;:!?()"\'')
+        if any(core.startswith(term) for term in terms):
+            marked.append(f"{HIGHLIGHT_START}{word}{HIGHLIGHT_STOP}")
+        else:
+            marked.append(word)
+
+    snippet = ' '.join(marked)
+    if start > 0:
+        snippet = '…' + snippet
+    if start + words < len(words_list):
+        snippet += '…'
+    return render_snippet(snippet)
+
+class SearchResult:
+    """One page of search hits"""
+    def __init__(self, ids, total, snippets):
+        self.ids = ids            # Post ids in relevance order
+        self.total = total        # Total number of matches
+        self.snippets = snippets  # {post_id: highlighted HTML}
+
+class SearchBackend(ABC):
+    """Base class for search backends"""
+    name = None
+
+    def ensure_schema(self, connection):
+        """Create any tables or indexes the backend needs"""
+
+    def index_post(self, connection, post):
+        """Add or refresh a post in the index"""
+
+    def remove_post(self, connection, post_id):
+        """Remove a post from the index"""
+
+    def rebuild(self, connection):
+        """Rebuild the whole index from the posts table"""
+
+    @abstractmethod
+    def search(self, query_text, page, per_page, include_unpublished=False):
+        """Return a SearchResult for one page of matches"""
+
+class IlikeBackend(SearchBackend):
+    """The original LIKE '%q%' scan with no ranking"""
+    name = 'ilike'
+
+    def search(self, query_text, page, per_page, include_unpublished=False):
+        query = Post.query.filter(
+            (Post.title.ilike(f'%{query_text}%') | Post.content.ilike(f'%{query_text}%'))
+        )
+        if not include_unpublished:
+            query = query.filter(Post.published == True)
+        total = query.count()
+        posts = query.order_by(Post.created_at.desc()).limit(per_page).offset((page - 1) * per_page).all()
+
+        terms = tokenize(query_text)
+        snippets = {post.id: highlight_terms(post.content, terms) for post in posts}
+        return SearchResult([post.id for post in posts], total, snippets)
+
+class SQLiteFTSBackend(SearchBackend):
+    """SQLite FTS5 virtual table ranked with bm25()"""
+    name = 'sqlite_fts'
+    table = 'posts_fts'
+
+    def __init__(self):
+        self._ready = False
+
+    @staticmethod
+    def available():
+        """Check that the linked SQLite library was compiled with FTS5"""
+        try:
+            sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE fts_probe USING fts5(x)')
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def _table_exists(self, connection):
+        return connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {'name': self.table}).first() is not None
+
+    def ensure_schema(self, connection):
+        if self._ready:
+            return
+        if not self._table_exists(connection):
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE {self.table} USING fts5(title, body, tokenize = 'porter unicode61')"
+            ))
+            self._backfill(connection)
+        self._ready = True
+
+    def _backfill(self, connection):
+        rows = connection.execute(text("SELECT id, title, content FROM posts")).fetchall()
+        if rows:
+            connection.execute(
+                text(f"INSERT INTO {self.table} (rowid, title, body) VALUES (:id, :title, :body)"),
+                [{'id': row[0], 'title': row[1], 'body': plain_text(row[2])} for row in rows]
+            )
+
+    def _writable(self, connection):
+        # The table comes from migration b83e5d2f9c14 or reindex-search; if it
+        # doesn't exist yet, the backfill on creation covers this post
+        if not self._ready:
+            self._ready = self._table_exists(connection)
+        return self._ready
+
+    def index_post(self, connection, post):
+        if not self._writable(connection):
+            return
+        connection.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), {'id': post.id})
+        connection.execute(
+            text(f"INSERT INTO {self.table} (rowid, title, body) VALUES (:id, :title, :body)"),
+            {'id': post.id, 'title': post.title, 'body': plain_text(post.content)}
+        )
+
+    def remove_post(self, connection, post_id):
+        if not self._writable(connection):
+            return
+        connection.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), {'id': post_id})
+
+    def rebuild(self, connection):
+        self.ensure_schema(connection)
+        connection.execute(text(f"DELETE FROM {self.table}"))
+        self._backfill(connection)
+
+    @staticmethod
+    def match_expression(query_text):
+        """Quote each term so user input can't inject FTS5 query syntax"""
+        return ' '.join(f'"{token}"*' for token in tokenize(query_text))
+
+    def search(self, query_text, page, per_page, include_unpublished=False):
+        match = self.match_expression(query_text)
+        if not match:
+            return SearchResult([], 0, {})
+
+        connection = db.session.connection()
+        if not self._writable(connection):
+            # Never build the index inside a request: fall back to the LIKE
+            # scan until `flask db upgrade` or reindex-search creates it
+            current_app.logger.warning(
+                "Search table %s is missing; run `python manage.py reindex-search`", self.table
+            )
+            return IlikeBackend().search(query_text, page, per_page, include_unpublished)
+
+        published_clause = '' if include_unpublished else 'AND posts.published = :published'
+        params = {'match': match, 'published': True}
+
+        total = connection.execute(text(
+            f"SELECT count(*) FROM {self.table} JOIN posts ON posts.id = {self.table}.rowid "
+            f"WHERE {self.table} MATCH :match {published_clause}"
+        ), params).scalar()
+
+        rows = connection.execute(text(
+            f"SELECT {self.table}.rowid, "
+            f"snippet({self.table}, 1, :start, :stop, '…', 24) "
+            f"FROM {self.table} JOIN posts ON posts.id = {self.table}.rowid "
+            f"WHERE {self.table} MATCH :match {published_clause} "
+            # Weight title matches above body matches
+            f"ORDER BY bm25({self.table}, 10.0, 1.0), posts.created_at DESC "
+            f"LIMIT :limit OFFSET :offset"
+        ), dict(params, start=HIGHLIGHT_START, stop=HIGHLIGHT_STOP,
+                limit=per_page, offset=(page - 1) * per_page)).fetchall()
+
+        return SearchResult(
+            [row[0] for row in rows],
+            total,
+            {row[0]: render_snippet(row[1]) for row in rows}
+        )
+
+class PostgresBackend(SearchBackend):
+    """PostgreSQL tsvector search backed by a GIN expression index"""
+    name = 'postgres'
+    index_name = 'ix_posts_fulltext'
+    # Must match the indexed expression exactly for the planner to use the index
+    vector = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(content, ''))"
+
+    def ensure_schema(self, connection):
+        # Only for scratch databases (bench-search) and databases stamped
+        # rather than migrated (reindex-search). Migrated databases get the
+        # index from migration e2b94c7a1f30, built CONCURRENTLY so posts
+        # stay writable; searches never create it
+        connection.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {self.index_name} ON posts USING GIN (({self.vector}))"
+        ))
+
+    # The expression index is maintained by PostgreSQL itself, so
+    # index_post/remove_post/rebuild have nothing to do
+
+    def search(self, query_text, page, per_page, include_unpublished=False):
+        if not tokenize(query_text):
+            return SearchResult([], 0, {})
+
+        connection = db.session.connection()
+
+        published_clause = '' if include_unpublished else 'AND published = :published'
+        params = {'q': query_text, 'published': True}
+
+        total = connection.execute(text(
+            f"SELECT count(*) FROM posts "
+            f"WHERE {self.vector} @@ plainto_tsquery('english', :q) {published_clause}"
+        ), params).scalar()
+
+        # Rank and limit first, then build headlines only for the page rows
+        rows = connection.execute(text(
+            f"SELECT hits.id, ts_headline('english', "
+            f"regexp_replace(hits.content, '<[^>]+>', ' ', 'g'), hits.query, :options) "
+            f"FROM (SELECT id, content, created_at, query, ts_rank({self.vector}, query) AS rank "
+            f"FROM posts, plainto_tsquery('english', :q) AS query "
+            f"WHERE {self.vector} @@ query {published_clause} "
+            f"ORDER BY rank DESC, created_at DESC LIMIT :limit OFFSET :offset) AS hits "
+            f"ORDER BY hits.rank DESC, hits.created_at DESC"
+        ), dict(params, limit=per_page, offset=(page - 1) * per_page,
+                options=f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, "
+                        f"MaxWords=35, MinWords=15")).fetchall()
+
+        return SearchResult(
+            [row[0] for row in rows],
+            total,
+            {row[0]: render_snippet(row[1]) for row in rows}
+        )
+
+class MemoryBackend(SearchBackend):
+    """
+    Pure-Python inverted index ranked with BM25.
+
+    The index lives in each worker process. Changes are applied from the
+    session's after_commit hook in the worker that made them; other
+    workers pick them up when the index is rebuilt after SEARCH_INDEX_TTL.
+    """
+    name = 'memory'
+    k1 = 1.2
+    b = 0.75
+    title_weight = 3
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._reset()
+
+    def _reset(self):
+        self._postings = defaultdict(dict)  # term -> {post_id: weighted term frequency}
+        self._lengths = {}                  # post_id -> weighted document length
+        self._terms = {}                    # post_id -> terms to unlink on removal
+        self._docs = {}                     # post_id -> (published, created_at, content)
+        self._vocabulary = None             # Sorted terms for prefix lookups, built lazily
+
+    def _add(self, post_id, title, content, published, created_at):
+        self._discard(post_id)
+        frequencies = defaultdict(int)
+        for token in tokenize(title):
+            frequencies[token] += self.title_weight
+        for token in tokenize(plain_text(content)):
+            frequencies[token] += 1
+        for token, count in frequencies.items():
+            self._postings[token][post_id] = count
+        self._lengths[post_id] = sum(frequencies.values())
+        self._terms[post_id] = list(frequencies)
+        self._docs[post_id] = (bool(published), created_at, content)
+        self._vocabulary = None
+
+    def _discard(self, post_id):
+        if post_id not in self._docs:
+            return
+        del self._docs[post_id]
+        del self._lengths[post_id]
+        for token in self._terms.pop(post_id):
+            postings = self._postings[token]
+            postings.pop(post_id, None)
+            if not postings:
+                del self._postings[token]
+        self._vocabulary = None
+
+    def _expired(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.ttl
+
+    def rebuild(self, connection=None):
+        connection = connection or db.session.connection()
+        # Select typed columns so created_at comes back as a datetime on SQLite
+        rows = connection.execute(select(
+            Post.id, Post.title, Post.content, Post.published, Post.created_at
+        )).fetchall()
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(*row)
+            self._built_at = time.monotonic()
+
+    def apply_changes(self, changes):
+        """Apply committed (post_id, fields) changes; fields is None for deletes"""
+        with self._lock:
+            # Nothing to patch until the first search builds the index
+            if self._built_at is None:
+                return
+            for post_id, fields in changes:
+                if fields is None:
+                    self._discard(post_id)
+                else:
+                    self._add(post_id, *fields)
+
+    def index_post(self, connection, post):
+        self.apply_changes([(post.id, (post.title, post.content, post.published, post.created_at))])
+
+    def remove_post(self, connection, post_id):
+        self.apply_changes([(post_id, None)])
+
+    def _expand(self, term, last):
+        """Exact match, or prefix match for the last term as the user types"""
+        if not last:
+            return [term] if term in self._postings else []
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect.bisect_left(self._vocabulary, term)
+        matches = []
+        for candidate in self._vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, query_text, page, per_page, include_unpublished=False):
+        terms = tokenize(query_text)
+        if not terms:
+            return SearchResult([], 0, {})
+
+        if self._expired():
+            self.rebuild()
+
+        with self._lock:
+            doc_count = len(self._docs) or 1
+            average_length = (sum(self._lengths.values()) / doc_count) or 1
+            scores = None
+
+            # Every query term must match (AND semantics, like the SQL backends)
+            for i, term in enumerate(terms):
+                term_scores = defaultdict(float)
+                for candidate in self._expand(term, last=(i == len(terms) - 1)):
+                    postings = self._postings[candidate]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for post_id, frequency in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._lengths[post_id] / average_length)
+                        term_scores[post_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {post_id: score + term_scores[post_id]
+                              for post_id, score in scores.items() if post_id in term_scores}
+                if not scores:
+                    return SearchResult([], 0, {})
+
+            if not include_unpublished:
+                scores = {post_id: score for post_id, score in scores.items() if self._docs[post_id][0]}
+
+            ranked = sorted(
+                scores,
+                key=lambda post_id: (-scores[post_id], -(self._docs[post_id][1].timestamp()
+                                                         if self._docs[post_id][1] else 0))
+            )
+            page_ids = ranked[(page - 1) * per_page:page * per_page]
+            snippets = {post_id: highlight_terms(self._docs[post_id][2], terms) for post_id in page_ids}
+
+        return SearchResult(page_ids, len(ranked), snippets)
+
+BACKENDS = {
+    'ilike': IlikeBackend,
+    'sqlite_fts': SQLiteFTSBackend,
+    'postgres': PostgresBackend,
+    'memory': MemoryBackend
+}
+
+def create_backend(app, engine):
+    """Pick a backend from SEARCH_BACKEND or the database dialect"""
+    name = app.config.get('SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        dialect = engine.dialect.name
+        if dialect == 'sqlite' and SQLiteFTSBackend.available():
+            name = 'sqlite_fts'
+        elif dialect == 'postgresql':
+            name = 'postgres'
+        else:
+            name = 'memory'
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown SEARCH_BACKEND: {name}")
+    if name == 'memory':
+        return MemoryBackend(ttl=app.config.get('SEARCH_INDEX_TTL', 300))
+    return BACKENDS[name]()
+
+def get_search_backend():
+    """Return the search backend for the current app, creating it on first use"""
+    app = current_app._get_current_object()
+    backend = app.extensions.get('search')
+    if backend is None:
+        backend = create_backend(app, db.engine)
+        app.extensions['search'] = backend
+    return backend
+
+def search_posts(query_text, page, per_page, include_unpublished=False):
+    """Run a ranked search and return a SearchResult"""
+    return get_search_backend().search(query_text, page, per_page, include_unpublished)
+
+# Keep the index in step with post saves and deletes. SQL backends write in
+# the same transaction during flush; the memory backend applies changes only
+# once the transaction commits.
+
+def _content_changed(post):
+    state = inspect(post)
+    return any(state.attrs[name].history.has_changes()
+               for name in ('title', 'content', 'published', 'created_at'))
+
+def _record_change(connection, post, deleted):
+    if not has_app_context():
+        return
+    backend = get_search_backend()
+    if isinstance(backend, MemoryBackend):
+        session = Session.object_session(post)
+        if session is not None:
+            session.info.setdefault('search_changes', []).append(
+                (post.id, None if deleted else (post.title, post.content, post.published, post.created_at))
+            )
+    elif deleted:
+        backend.remove_post(connection, post.id)
+    else:
+        backend.index_post(connection, post)
+
+@event.listens_for(Post, 'after_insert')
+def _post_inserted(mapper, connection, post):
+    _record_change(connection, post, deleted=False)
+
+@event.listens_for(Post, 'after_update')
+def _post_updated(mapper, connection, post):
+    # Skip flushes that only touch views or other non-indexed columns
+    if _content_changed(post):
+        _record_change(connection, post, deleted=False)
+
+@event.listens_for(Post, 'after_delete')
+def _post_deleted(mapper, connection, post):
+    _record_change(connection, post, deleted=True)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_memory_changes(session):
+    changes = session.info.pop('search_changes', None)
+    if not changes or not has_app_context():
+        return
+    get_search_backend().apply_changes(changes)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_memory_changes(session):
+    session.info.pop('search_changes', None)
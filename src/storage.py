@@ -0,0 +1,202 @@
+"""
+Content-addressed storage for uploads.
+
+Each upload is streamed to disk in chunks while its SHA-256 is computed,
+then kept once under blobs/<aa>/<sha256><ext> in UPLOAD_FOLDER. Posts and
+documents keep storing a logical name. upload_references maps that name
+to its blob, so uploading the same file again writes nothing new.
+"""
+import hashlib
+import os
+import tempfile
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+from src.models import db
+from src.models.upload import UploadBlob, UploadReference
+from src.uploads import forget_upload
+
+# Directory under UPLOAD_FOLDER that holds blobs
+BLOB_DIR = 'blobs'
+
+# Bytes read from the upload stream at a time
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Hex characters of the SHA-256 that prefix logical names
+NAME_DIGEST_LENGTH = 16
+
+# Tries at recording an upload that races a store or delete of the same content
+STORE_ATTEMPTS = 3
+
+class UploadTooLarge(RequestEntityTooLarge):
+    """Raised while streaming an upload that passes its size limit"""
+
+    def __init__(self, limit):
+        super(UploadTooLarge, self).__init__(f"File is larger than the {limit / (1024 * 1024):.1f} MB limit")
+        self.limit = limit
+
+def _stream_to_temp(stream, directory, limit):
+    """Copy stream to a temporary file in chunks; returns (temp path, sha256, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(limit)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
+
+class _BlobGone(Exception):
+    """The blob a new reference points at was deleted before it committed"""
+
+def _lock_blob(connection, sha256, size, extension):
+    """(id, path) of the blob row for this content, locked until the transaction ends; inserted if new"""
+    blobs = UploadBlob.__table__
+    row = connection.execute(
+        select(blobs.c.id, blobs.c.path).where(blobs.c.sha256 == sha256).with_for_update()
+    ).first()
+    if row is not None:
+        return row.id, row.path
+    path = f"{BLOB_DIR}/{sha256[:2]}/{sha256}{extension}"
+    # A concurrent insert of the same content raises IntegrityError; _store retries
+    blob_id = connection.execute(
+        blobs.insert().values(sha256=sha256, path=path, size_bytes=size)
+    ).inserted_primary_key[0]
+    return blob_id, path
+
+def _place_blob(temp_path, disk_path):
+    """Make disk_path hold temp_path's content, keeping temp_path for a retry"""
+    os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+    try:
+        os.link(temp_path, disk_path)
+    except FileExistsError:
+        # Written by a concurrent upload of the same content
+        pass
+
+def _blob_root():
+    blob_root = os.path.join(current_app.config['UPLOAD_FOLDER'], BLOB_DIR)
+    os.makedirs(blob_root, exist_ok=True)
+    return blob_root
+
+def temp_file(suffix=''):
+    """(handle, path) of a new temporary file that store_file can move into place"""
+    return tempfile.mkstemp(dir=_blob_root(), prefix='.upload-', suffix=suffix)
+
+def store_upload(file, kind, max_bytes, prefix=''):
+    """
+    Store an uploaded file by content and return its logical name.
+
+    The name is prefix + <digest>_<secure filename>, relative to
+    UPLOAD_FOLDER, so the same file uploaded under the same name always
+    gets the same name. Uses its own connection, so the caller's session
+    and pending changes are untouched.
+
+    Raises:
+        UploadTooLarge: the file is bigger than max_bytes (nothing is kept)
+    """
+    temp_path, sha256, size = _stream_to_temp(file.stream, _blob_root(), max_bytes)
+    return _store(temp_path, sha256, size, secure_filename(file.filename), kind, prefix, file.filename)
+
+def store_file(temp_path, filename, kind, prefix=''):
+    """
+    Store a file the app wrote itself (from temp_file()) by content and
+    return its logical name, named like store_upload's. temp_path is moved
+    into place or removed.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+                size += len(chunk)
+                digest.update(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return _store(temp_path, digest.hexdigest(), size, secure_filename(filename), kind, prefix, filename)
+
+def _store(temp_path, sha256, size, filename, kind, prefix, original_filename):
+    name = f"{prefix}{sha256[:NAME_DIGEST_LENGTH]}_{filename}"
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    blobs = UploadBlob.__table__
+    references = UploadReference.__table__
+    try:
+        for attempt in range(STORE_ATTEMPTS):
+            try:
+                # One transaction with the blob row locked, so delete_upload
+                # can't remove the blob or its file while a reference is added
+                with db.engine.begin() as connection:
+                    blob_id, path = _lock_blob(connection, sha256, size, os.path.splitext(filename)[1].lower())
+                    disk_path = os.path.join(upload_folder, path)
+                    if not os.path.isfile(disk_path):
+                        # New content, or a row that outlived its file
+                        _place_blob(temp_path, disk_path)
+
+                    exists = connection.execute(
+                        select(references.c.id).where(references.c.name == name)
+                    ).first()
+                    if exists is None:
+                        connection.execute(references.insert().values(
+                            name=name, blob_id=blob_id, kind=kind, original_filename=original_filename
+                        ))
+                    # SQLite has no row locks: check again now that this
+                    # transaction has written and holds the database's write lock
+                    if connection.execute(select(blobs.c.id).where(blobs.c.id == blob_id)).first() is None:
+                        raise _BlobGone()
+                break
+            except (IntegrityError, _BlobGone):
+                # The same content or name was stored, or deleted, at the same time
+                if attempt == STORE_ATTEMPTS - 1:
+                    raise
+    finally:
+        os.remove(temp_path)
+
+    # A request for this name may have been memoized as missing
+    forget_upload(name)
+    current_app.logger.info(f"Stored upload {name} ({size} bytes, blob {sha256[:12]})")
+    return name
+
+def delete_upload(name):
+    """
+    Remove a logical upload, and its blob once nothing else references it.
+
+    Returns False if name isn't stored by content (e.g. a file saved before
+    content-addressed storage).
+    """
+    reference = UploadReference.query.filter_by(name=name).first()
+    if reference is None:
+        return False
+
+    # Lock the blob row: a concurrent _store of the same content waits for
+    # this transaction, then finds the row gone and writes the blob again
+    blob = UploadBlob.query.filter_by(id=reference.blob_id).with_for_update().first()
+    db.session.delete(reference)
+    db.session.flush()
+    orphaned = blob is not None and UploadReference.query.filter_by(blob_id=blob.id).count() == 0
+    if orphaned:
+        db.session.delete(blob)
+        db.session.flush()
+        # Removed while the lock is held; if the commit fails, the next
+        # upload of this content finds the row without its file and rewrites it
+        blob_path = os.path.join(current_app.config['UPLOAD_FOLDER'], blob.path)
+        if os.path.exists(blob_path):
+            os.remove(blob_path)
+    db.session.commit()
+    forget_upload(name)
+
+    if reference.kind == UploadReference.IMAGE:
+        # Its resized copies go with it
+        from src.images import delete_image
+        delete_image(name)
+    return True
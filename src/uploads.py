@@ -0,0 +1,245 @@
+"""
+Serving for uploaded files.
+
+Pages link to uploads through upload_url(), which builds a
+/uploads/h/<digest>/<name> URL from a short hash of the file's content.
+That URL never changes meaning, so it is served with a year-long
+`immutable` Cache-Control. The older /uploads/ and /static/uploads/ URLs
+still work but revalidate after UPLOADS_MAX_AGE. Where each name lives
+on disk is memoized, so a request doesn't probe the persistent disk and
+then the static folder every time.
+"""
+import hashlib
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import abort, current_app, redirect, send_file, url_for
+from werkzeug.security import safe_join
+
+from src.cache import ProcessCache
+from src.models import db
+from src.models.upload import UploadBlob, UploadReference
+
+# Disk path each upload name resolved to; '' marks a name that wasn't found
+resolved_uploads = ProcessCache(ttl=86400, max_entries=10000)
+
+# Content digest of each upload, keyed by its name under UPLOAD_FOLDER
+upload_digests = ProcessCache(ttl=86400, max_entries=10000)
+
+# Hex characters of the SHA-256 kept in hashed URLs
+DIGEST_LENGTH = 16
+
+# Seconds a miss is remembered, so a file uploaded just after a 404 shows up quickly
+MISSING_TTL = 30
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Stored path shapes that always refer to an upload rather than a static asset
+UPLOAD_PATH_PREFIXES = ('static/uploads/', 'uploads/', 'documents/')
+
+def init_uploads(app):
+    app.add_url_rule('/uploads/h/<digest>/<path:filename>', 'hashed_upload', hashed_upload)
+    app.add_url_rule('/uploads/<path:filename>', 'uploaded_file', uploaded_file)
+    # Handle legacy paths that might be in the database
+    app.add_url_rule('/static/uploads/<path:filename>', 'legacy_uploaded_file', legacy_uploaded_file)
+    app.add_template_global(upload_url)
+
+def upload_name(path):
+    """
+    Name under UPLOAD_FOLDER for a stored upload path, or None for external URLs.
+
+    Paths are stored in several shapes (static/uploads/<name>, uploads/<name>,
+    documents/<name>); all of them map to the same name.
+    """
+    if not path or '://' in path:
+        return None
+    name = path.lstrip('/')
+    for prefix in ('static/', 'uploads/'):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    return name or None
+
+def _upload_roots():
+    """UPLOAD_FOLDER, then the static folder older uploads were saved to"""
+    roots = [current_app.config['UPLOAD_FOLDER']]
+    legacy = os.path.join(current_app.static_folder, 'uploads')
+    if os.path.abspath(legacy) != os.path.abspath(roots[0]):
+        roots.append(legacy)
+    return roots
+
+def _servable_from_disk(name):
+    """
+    Whether a name not stored by content may be looked up on disk: blobs are
+    only reachable through a reference, and dotfiles (such as storage's
+    in-progress .upload-* files) never are.
+    """
+    from src.storage import BLOB_DIR
+    parts = name.replace('\\', '/').split('/')
+    return parts[0] != BLOB_DIR and not any(part.startswith('.') for part in parts)
+
+def resolve_upload(name):
+    """
+    Disk path of an uploaded file, or None; memoized in resolved_uploads.
+
+    Names stored by content resolve through their blob, which also supplies
+    the digest without reading the file. Older uploads are looked for on disk.
+    """
+    disk_path = resolved_uploads.get(name)
+    if disk_path is not None:
+        return disk_path or None
+
+    blob = db.session.execute(
+        db.select(UploadBlob.path, UploadBlob.sha256)
+        .join(UploadReference, UploadReference.blob_id == UploadBlob.id)
+        .where(UploadReference.name == name)
+    ).first()
+    if blob is not None:
+        candidate = safe_join(current_app.config['UPLOAD_FOLDER'], blob.path)
+        if candidate and os.path.isfile(candidate):
+            resolved_uploads.set(name, candidate)
+            upload_digests.set(name, blob.sha256[:DIGEST_LENGTH])
+            return candidate
+
+    if not _servable_from_disk(name):
+        resolved_uploads.set(name, '', ttl=MISSING_TTL)
+        return None
+    for root in _upload_roots():
+        candidate = safe_join(root, name)
+        if candidate and os.path.isfile(candidate):
+            resolved_uploads.set(name, candidate)
+            return candidate
+    resolved_uploads.set(name, '', ttl=MISSING_TTL)
+    return None
+
+def forget_upload(name):
+    """Drop memoized lookups for a file that was deleted or replaced"""
+    resolved_uploads.invalidate(name)
+    upload_digests.invalidate(name)
+
+def file_digest(disk_path):
+    """Truncated SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(disk_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:DIGEST_LENGTH]
+
+def upload_digest(name):
+    """Memoized content digest of an upload, or None if it doesn't exist"""
+    disk_path = resolve_upload(name)
+    if disk_path is None:
+        return None
+    try:
+        return upload_digests.get_or_set(name, lambda: file_digest(disk_path))
+    except OSError:
+        forget_upload(name)
+        return None
+
+def stored_digests(names):
+    """
+    Digests of the names stored by content, looked up in one query.
+
+    Names that aren't in upload_references are left out. The results seed
+    upload_digests for later upload_url calls.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    rows = db.session.execute(
+        db.select(UploadReference.name, UploadBlob.sha256)
+        .join(UploadBlob, UploadReference.blob_id == UploadBlob.id)
+        .where(UploadReference.name.in_(names))
+    ).all()
+    digests = {row.name: row.sha256[:DIGEST_LENGTH] for row in rows}
+    for name, digest in digests.items():
+        upload_digests.set(name, digest)
+    return digests
+
+def hashed_upload_url(path, digest, _external=False):
+    """
+    upload_url for a path whose digest is already known, without touching the disk.
+
+    With no digest it falls back the way upload_url does for a missing upload.
+    """
+    name = upload_name(path)
+    if digest is None or name is None:
+        if path and '://' in path:
+            return path
+        if path and path.lstrip('/').startswith(UPLOAD_PATH_PREFIXES):
+            return url_for('uploaded_file', filename=name, _external=_external)
+        return url_for('static', filename=path, _external=_external)
+    return url_for('hashed_upload', digest=digest, filename=name, _external=_external)
+
+def upload_url(path, _external=False):
+    """
+    Immutable, content-hashed URL for a stored upload path.
+
+    External URLs are returned unchanged. A missing upload gets its plain
+    /uploads/ URL, and other paths fall back to url_for('static', filename=path).
+    """
+    name = upload_name(path)
+    return hashed_upload_url(path, upload_digest(name) if name else None, _external=_external)
+
+def send_upload(disk_path, max_age, immutable=False):
+    """
+    Response for an uploaded file with public caching for max_age seconds.
+
+    With UPLOADS_SENDFILE set, the front server sends the body (and answers
+    range and conditional requests itself). Otherwise send_file streams it
+    and handles Range, If-Range, If-None-Match and If-Modified-Since.
+    """
+    mode = current_app.config['UPLOADS_SENDFILE']
+    upload_folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    relative = os.path.relpath(os.path.abspath(disk_path), upload_folder)
+
+    if mode == 'x-accel-redirect' and not relative.startswith('..'):
+        # nginx: an internal location at UPLOADS_ACCEL_PREFIX aliased to UPLOAD_FOLDER
+        response = current_app.response_class(mimetype=mimetypes.guess_type(disk_path)[0] or 'application/octet-stream')
+        prefix = current_app.config['UPLOADS_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{quote(relative.replace(os.sep, '/'))}"
+    elif mode == 'x-sendfile':
+        # Apache mod_xsendfile / lighttpd
+        response = current_app.response_class(mimetype=mimetypes.guess_type(disk_path)[0] or 'application/octet-stream')
+        response.headers['X-Sendfile'] = disk_path
+    else:
+        response = send_file(disk_path, conditional=True, max_age=max_age)
+
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+    # Uploaded documents include html/js; don't let browsers guess a different type
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+def _send_named(name, max_age, immutable=False):
+    disk_path = resolve_upload(name)
+    if disk_path is None:
+        abort(404)
+    try:
+        return send_upload(disk_path, max_age, immutable)
+    except FileNotFoundError:
+        # Deleted since the lookup was memoized
+        forget_upload(name)
+        abort(404)
+
+def hashed_upload(digest, filename):
+    """Serve an upload by content-hashed URL, cacheable forever"""
+    current = upload_digest(filename)
+    if current is not None and current != digest:
+        # The file may have been rewritten since its digest was memoized
+        upload_digests.invalidate(filename)
+        current = upload_digest(filename)
+    if current is None:
+        abort(404)
+    if current != digest:
+        # An outdated URL: point at the current content, without long-lived caching
+        return redirect(url_for('hashed_upload', digest=current, filename=filename))
+    return _send_named(filename, current_app.config['UPLOADS_IMMUTABLE_MAX_AGE'], immutable=True)
+
+def uploaded_file(filename):
+    return _send_named(filename, current_app.config['UPLOADS_MAX_AGE'])
+
+def legacy_uploaded_file(filename):
+    return _send_named(filename, current_app.config['UPLOADS_MAX_AGE'])
@@ -1,7 +1,23 @@
 import markdown
 import bleach
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from bleach.sanitizer import ALLOWED_TAGS, ALLOWED_ATTRIBUTES
 
+# Bump this whenever markdown extensions or sanitizer rules change, then run
+# `python manage.py render-posts` to re-render the stored post HTML
+RENDERER_VERSION = '1'
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'ref', 'ref_src', 'ref_url', 'cmpid', 'smid', 'sr_share', 'ocid'
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+
+# Ports implied by the scheme
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
 def allowed_file(filename):
     """Check if a filename has an allowed extension"""
     from flask import current_app
@@ -41,3 +57,44 @@ def markdown_to_html(md_content):
     
     # Sanitize the HTML
     return sanitize_html(html)
+
+def render_fingerprint(content, content_format):
+    """Return a fingerprint of the renderer version, format and content"""
+    digest = hashlib.sha256()
+    digest.update(f"{RENDERER_VERSION}:{content_format}:".encode('utf-8'))
+    digest.update((content or '').encode('utf-8'))
+    return digest.hexdigest()
+
+def normalize_url(url):
+    """
+    Return the canonical form of a URL for duplicate detection: lowercase
+    scheme and host, no default port, tracking parameters or fragment,
+    sorted query parameters and no trailing slash on the path.
+    """
+    url = (url or '').strip()
+    if '://' not in url:
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if ':' in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    
+    path = parts.path.rstrip('/') or '/'
+    
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    
+    return urlunsplit((scheme, netloc, path, urlencode(query), ''))
+
+def url_hash(url):
+    """Return the SHA-256 hex digest of a URL's canonical form"""
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
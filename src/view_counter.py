@@ -0,0 +1,145 @@
+import atexit
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, func, update
+
+from src.models import db
+from src.models.blog import Post
+
+BOT_USER_AGENT_RE = re.compile(
+    r'bot|crawl|spider|slurp|preview|facebookexternalhit|embedly|monitor|curl|wget|python-requests',
+    re.IGNORECASE
+)
+
+class ViewCounter:
+    """
+    Buffers post view increments in memory and writes them in batches.
+
+    Each worker keeps its own buffer and flushes it with one executemany
+    UPDATE ... SET views = views + n when VIEW_COUNTER_FLUSH_INTERVAL seconds
+    have passed or VIEW_COUNTER_MAX_PENDING views are waiting, and again on
+    shutdown. A worker that is killed outright loses its unflushed views.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.flush_interval = 10
+        self.max_pending = 500
+        self.skip_bots = True
+        self.dedup_seconds = 0
+        self._pending = {}
+        self._pending_total = 0
+        self._recent = OrderedDict()  # (post_id, visitor) -> last counted time
+        self._recent_limit = 10000
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer_pid = None
+        self._exit_hook = False
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config['VIEW_COUNTER_FLUSH_INTERVAL']
+        self.max_pending = app.config['VIEW_COUNTER_MAX_PENDING']
+        self.skip_bots = app.config['VIEW_COUNTER_SKIP_BOTS']
+        self.dedup_seconds = app.config['VIEW_COUNTER_DEDUP_SECONDS']
+        if not self._exit_hook:
+            # Flush whatever is still buffered when the worker shuts down
+            atexit.register(self.flush)
+            self._exit_hook = True
+
+    def _visitor_key(self, request):
+        raw = f"{request.remote_addr}|{request.headers.get('User-Agent', '')}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _is_repeat(self, post_id, request, now):
+        """Whether this visitor already counted for this post within dedup_seconds"""
+        key = (post_id, self._visitor_key(request))
+        last_seen = self._recent.get(key)
+        if last_seen is not None and now - last_seen < self.dedup_seconds:
+            return True
+        self._recent[key] = now
+        self._recent.move_to_end(key)
+        while len(self._recent) > self._recent_limit:
+            self._recent.popitem(last=False)
+        return False
+
+    def record(self, post_id, request=None):
+        """Count one view of post_id; returns False if it was filtered out"""
+        if request is not None and self.skip_bots and \
+                BOT_USER_AGENT_RE.search(request.headers.get('User-Agent', '')):
+            return False
+
+        self._ensure_timer()
+        now = time.monotonic()
+        with self._lock:
+            if request is not None and self.dedup_seconds and self._is_repeat(post_id, request, now):
+                return False
+            self._pending[post_id] = self._pending.get(post_id, 0) + 1
+            self._pending_total += 1
+            over_threshold = self._pending_total >= self.max_pending
+
+        if over_threshold:
+            self.flush()
+        return True
+
+    def pending(self, post_id):
+        """Views buffered for post_id that are not yet in the database"""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def flush(self):
+        """Write all buffered increments in one batched UPDATE"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending, self._pending_total = self._pending, {}, 0
+
+        posts = Post.__table__
+        statement = update(posts).where(posts.c.id == bindparam('post_id')).values(
+            views=func.coalesce(posts.c.views, 0) + bindparam('increment'),
+            # Keep the onupdate hook from stamping updated_at for a view
+            updated_at=posts.c.updated_at
+        )
+        params = [{'post_id': post_id, 'increment': count} for post_id, count in batch.items()]
+
+        with self._flush_lock:
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(statement, params)
+            except Exception as e:
+                # Put the views back so the next flush retries them
+                with self._lock:
+                    for post_id, count in batch.items():
+                        self._pending[post_id] = self._pending.get(post_id, 0) + count
+                        self._pending_total += count
+                if self.app is not None:
+                    self.app.logger.error(f"Error flushing view counts: {e}")
+                return 0
+        return sum(batch.values())
+
+    def _ensure_timer(self):
+        # Start the flush thread lazily so each gunicorn worker gets its own
+        # (threads started before fork don't survive in the child)
+        if self._timer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._timer_pid == os.getpid():
+                return
+            self._timer_pid = os.getpid()
+            # Views buffered by the parent belong to the parent
+            self._pending, self._pending_total = {}, 0
+        thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+view_counter = ViewCounter()
@@ -0,0 +1,16 @@
+"""
+Query-count and index checks for the hot routes, on seeded scratch data.
+
+Run from the repository root with `python -m pytest tests`. Same checks as
+`python manage.py check-query-counts` and `check-indexes`.
+"""
+from src.query_plans import check_index_usage
+from src.query_stats import check_query_budgets
+
+def test_routes_stay_within_query_budgets():
+    failures = check_query_budgets()
+    assert not failures, f"Routes over their query budget: {failures}"
+
+def test_hot_queries_use_their_indexes():
+    failures = check_index_usage()
+    assert not failures, f"Indexes no query plan used: {failures}"